@@ -6,7 +6,7 @@
 # of patent rights can be found in the PATENTS file in the same directory.
 
 from __future__ import print_function
-import math, sys, random, argparse, json, os, tempfile
+import math, sys, random, argparse, json, os, tempfile, time
 from datetime import datetime as dt
 from collections import Counter
 
@@ -31,6 +31,10 @@ except ImportError as e:
 if INSIDE_BLENDER:
     try:
         import utils
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_generation'))
+        import catalog
+        import manifest
+        import shards
     except ImportError as e:
         print("\nERROR")
         print("Running render_images.py from Blender and cannot import utils.py.")
@@ -103,6 +107,27 @@ parser.add_argument('--output_scene_dir', default='../output/scenes/',
                          "It will be created if it does not exist.")
 parser.add_argument('--output_scene_file', default='../output/CLEVR_scenes.json',
                     help="Path to write a single JSON file containing all scene information")
+parser.add_argument('--extend', default=0, type=int,
+                    help="Setting --extend 1 adds --num_images images to an existing dataset: " +
+                         "numbering continues at the high-water mark recorded in manifest.json " +
+                         "of the scene or shard directory, and the new scenes are appended to " +
+                         "--output_scene_file instead of rewriting it.")
+parser.add_argument('--output_format', default='files', choices=['files', 'shards'],
+                    help="Write one PNG and one JSON file per image ('files'), or stream " +
+                         "images and scene annotations into tar shards ('shards') in the " +
+                         "--output_shard_dir directory, together with an index file for " +
+                         "random access.")
+parser.add_argument('--output_shard_dir', default='../output/shards/',
+                    help="The directory where tar shards will be stored when " +
+                         "--output_format is 'shards'. It will be created if it does not exist.")
+parser.add_argument('--shard_max_bytes', default=1 << 30, type=int,
+                    help="Maximum size in bytes of a single tar shard.")
+parser.add_argument('--indices_file', default=None,
+                    help="Optional JSON file with the list of output indices to render, in " +
+                         "order. This overrides --start_idx and --num_images and is used by " +
+                         "image_generation/supervisor.py to resume a worker.")
+parser.add_argument('--progress_file', default=None,
+                    help="If given, every finished output index is appended to this file.")
 parser.add_argument('--output_blend_dir', default='output/blendfiles',
                     help="The directory where blender scene files will be stored, if the " +
                          "user requested that these files be saved using the " +
@@ -146,6 +171,12 @@ parser.add_argument('--render_min_bounces', default=8, type=int,
                     help="The minimum number of bounces to use for rendering.")
 parser.add_argument('--render_max_bounces', default=8, type=int,
                     help="The maximum number of bounces to use for rendering.")
+parser.add_argument('--render_retries', default=3, type=int,
+                    help="The number of times a failed render is retried before the error " +
+                         "is raised.")
+parser.add_argument('--render_backoff', default=1.0, type=float,
+                    help="The initial wait in seconds between render retries; it doubles " +
+                         "after every failed attempt.")
 parser.add_argument('--render_tile_size', default=256, type=int,
                     help="The tile size to use for rendering. This should not affect the " +
                          "quality of the rendered image but may affect the speed; CPU-based " +
@@ -163,37 +194,65 @@ def main(args):
     scene_template = os.path.join(args.output_scene_dir, scene_template)
     blend_template = os.path.join(args.output_blend_dir, blend_template)
 
-    if not os.path.isdir(args.output_image_dir):
+    writer = None
+    if args.output_format == 'shards':
+        # Images are rendered into a scratch directory and moved into the shards
+        writer = shards.ShardWriter(args.output_shard_dir, max_shard_bytes=args.shard_max_bytes)
+        img_template = os.path.join(tempfile.mkdtemp(), os.path.basename(img_template))
+    elif not os.path.isdir(args.output_image_dir):
         os.makedirs(args.output_image_dir)
-    if not os.path.isdir(args.output_scene_dir):
+    if writer is None and not os.path.isdir(args.output_scene_dir):
         os.makedirs(args.output_scene_dir)
     if args.save_blendfiles == 1 and not os.path.isdir(args.output_blend_dir):
         os.makedirs(args.output_blend_dir)
 
+    # the manifest lives next to the per-image outputs
+    dataset_dir = args.output_shard_dir if writer is not None else args.output_scene_dir
+    if args.extend == 1:
+        args.start_idx = manifest.load_manifest(dataset_dir)['next_index']
+
     all_scene_paths = []
-    for i in range(args.num_images):
-        img_path = img_template % (i + args.start_idx)
-        scene_path = scene_template % (i + args.start_idx)
+    all_scenes = []
+    output_indices = [i + args.start_idx for i in range(args.num_images)]
+    if args.indices_file is not None:
+        with open(args.indices_file, 'r') as f:
+            output_indices = json.load(f)
+    for output_index in output_indices:
+        img_path = img_template % output_index
+        scene_path = scene_template % output_index
         all_scene_paths.append(scene_path)
         blend_path = None
         if args.save_blendfiles == 1:
-            blend_path = blend_template % (i + args.start_idx)
+            blend_path = blend_template % output_index
         num_objects = random.randint(args.min_objects, args.max_objects)
-        render_scene(args,
-                     num_objects=num_objects,
-                     output_index=(i + args.start_idx),
-                     output_split=args.split,
-                     output_image=img_path,
-                     output_scene=scene_path,
-                     output_blendfile=blend_path,
-                     )
+        scene_struct = render_scene(args,
+                                    num_objects=num_objects,
+                                    output_index=output_index,
+                                    output_split=args.split,
+                                    output_image=img_path,
+                                    output_scene=scene_path,
+                                    output_blendfile=blend_path,
+                                    writer=writer,
+                                    )
+        if writer is not None:
+            all_scenes.append(scene_struct)
+        if args.progress_file is not None:
+            with open(args.progress_file, 'a') as f:
+                f.write('%d\n' % output_index)
 
     # After rendering all images, combine the JSON files for each scene into a
     # single JSON file.
-    all_scenes = []
-    for scene_path in all_scene_paths:
-        with open(scene_path, 'r') as f:
-            all_scenes.append(json.load(f))
+    if writer is not None:
+        writer.close()
+    else:
+        for scene_path in all_scene_paths:
+            with open(scene_path, 'r') as f:
+                all_scenes.append(json.load(f))
+    if args.indices_file is None:
+        manifest.record_run(dataset_dir, args.start_idx, args.start_idx + args.num_images, None)
+    if args.extend == 1:
+        manifest.append_scene_file(args.output_scene_file, all_scenes)
+        return
     output = {
         'info': {
             'date': args.date,
@@ -214,6 +273,7 @@ def render_scene(args,
                  output_image='render.png',
                  output_scene='render_json',
                  output_blendfile=None,
+                 writer=None,
                  ):
     # Load the main blendfile
     bpy.ops.wm.open_mainfile(filepath=args.base_scene_blendfile)
@@ -312,47 +372,47 @@ def render_scene(args,
     # Render the scene and dump the scene data structure
     scene_struct['objects'] = objects
     scene_struct['relationships'] = compute_all_relationships(scene_struct)
-    while True:
+    for attempt in range(args.render_retries + 1):
         try:
             bpy.ops.render.render(write_still=True)
             break
         except Exception as e:
+            if attempt == args.render_retries:
+                raise
             print(e)
+            time.sleep(args.render_backoff * 2 ** attempt)
 
-    with open(output_scene, 'w') as f:
-        json.dump(scene_struct, f, indent=2)
+    if writer is None:
+        with open(output_scene, 'w') as f:
+            json.dump(scene_struct, f, indent=2)
+    else:
+        writer.write(output_index, output_image, scene_struct)
+        os.remove(output_image)
 
     if output_blendfile is not None:
         bpy.ops.wm.save_as_mainfile(filepath=output_blendfile)
 
+    return scene_struct
+
 
 def add_random_objects(scene_struct, num_objects, args, camera):
     """
     Add random objects to the current blender scene
     """
 
-    # Load the property file
-    with open(args.properties_json, 'r') as f:
-        properties = json.load(f)
-        color_name_to_rgba = {}
-        for name, rgb in properties['colors'].items():
-            rgba = [float(c) / 255.0 for c in rgb] + [1.0]
-            color_name_to_rgba[name] = rgba
-        material_mapping = [(v, k) for k, v in properties['materials'].items()]
-        object_mapping = [(v, k) for k, v in properties['shapes'].items()]
-        size_mapping = list(properties['sizes'].items())
-
+    # The compiled property catalog and combos are built once per process
+    props = catalog.load_catalog(args.properties_json)
     shape_color_combos = None
     if args.shape_color_combos_json is not None:
-        with open(args.shape_color_combos_json, 'r') as f:
-            shape_color_combos = list(json.load(f).items())
+        shape_color_combos = catalog.load_shape_color_combos(args.shape_color_combos_json)
 
     positions = []
     objects = []
     blender_objects = []
     for i in range(num_objects):
         # Choose a random size
-        size_name, r = random.choice(size_mapping)
+        size = random.randrange(len(props.sizes))
+        size_name, r = props.sizes[size], float(props.size_values[size])
 
         # Try to place the object, ensuring that we don't intersect any existing
         # objects and that we are more than the desired margin away from all existing
@@ -395,13 +455,14 @@ def add_random_objects(scene_struct, num_objects, args, camera):
 
         # Choose random color and shape
         if shape_color_combos is None:
-            obj_name, obj_name_out = random.choice(object_mapping)
-            color_name, rgba = random.choice(list(color_name_to_rgba.items()))
+            shape = random.randrange(len(props.shapes))
+            obj_name, obj_name_out = props.shape_files[shape], props.shapes[shape]
+            color = random.randrange(len(props.colors))
         else:
             obj_name_out, color_choices = random.choice(shape_color_combos)
-            color_name = random.choice(color_choices)
-            obj_name = [k for k, v in object_mapping if v == obj_name_out][0]
-            rgba = color_name_to_rgba[color_name]
+            obj_name = props.shape_file(obj_name_out)
+            color = props.code('color', random.choice(color_choices))
+        color_name, rgba = props.colors[color], props.rgba_list(color)
 
         # For cube, adjust the size a bit
         if obj_name == 'Cube':
@@ -417,7 +478,8 @@ def add_random_objects(scene_struct, num_objects, args, camera):
         positions.append((x, y, r))
 
         # Attach a random material
-        mat_name, mat_name_out = random.choice(material_mapping)
+        material = random.randrange(len(props.materials))
+        mat_name, mat_name_out = props.material_nodes[material], props.materials[material]
         utils.add_material(mat_name, Color=rgba)
 
         # Record data about the object in the scene data structure
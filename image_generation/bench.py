@@ -0,0 +1,54 @@
+import argparse, cProfile, io, pstats, sys, tempfile, time
+
+import fake_bpy
+
+"""
+Performance harness for the non-render stages of the pipeline. Runs the full
+create_scene.main flow on the fake Blender backend of fake_bpy.py, so that
+placement, relationships, annotations and output I/O can be timed and
+profiled without Blender:
+
+python bench.py --num_images 2000 [--profile] -- [arguments for create_scene.py]
+"""
+
+
+def main():
+    argv = sys.argv[1:]
+    script_args = []
+    if '--' in argv:
+        idx = argv.index('--')
+        argv, script_args = argv[:idx], argv[idx + 1:]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_images', default=1000, type=int)
+    parser.add_argument('--output_path', default=None,
+                        help="Output directory; a temporary directory by default")
+    parser.add_argument('--profile', action='store_true',
+                        help="Print the functions with the largest cumulative time")
+    args = parser.parse_args(argv)
+
+    output_path = args.output_path or tempfile.mkdtemp(prefix="hide_bench_")
+    backend = fake_bpy.install()
+    import create_scene
+
+    sys.argv = [sys.argv[0], '--', '--num_images', str(args.num_images),
+                '--output_path', output_path] + script_args
+    profiler = cProfile.Profile() if args.profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    create_scene.main()
+    if profiler is not None:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    print('==> %d scenes (%d renders) in %.2fs: %.1f scenes/s, output in "%s".'
+          % (args.num_images, backend.num_renders, elapsed, args.num_images / elapsed, output_path))
+    if profiler is not None:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        print(out.getvalue())
+
+
+if __name__ == "__main__":
+    main()
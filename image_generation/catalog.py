@@ -0,0 +1,178 @@
+import json, os, random
+
+import numpy as np
+
+"""
+Compiled property catalog. properties.json is parsed once per process and
+turned into integer-coded attribute tables with precomputed RGBA values and
+reverse indexes, so that placing an object needs no file access, no dict
+rebuilding and no linear searches.
+
+The code of a value is its position in the corresponding section of
+properties.json, the same coding as used by columnar.py.
+"""
+
+_catalogs = {}
+_combos = {}
+
+
+class PropertyCatalog:
+
+    def __init__(self, properties):
+        # shapes and materials map output names to .blend / node group names
+        self.shapes = list(properties['shapes'].keys())
+        self.shape_files = [properties['shapes'][k] for k in self.shapes]
+        self.materials = list(properties['materials'].keys())
+        self.material_nodes = [properties['materials'][k] for k in self.materials]
+        self.colors = list(properties['colors'].keys())
+        self.rgba = np.array([[float(c) / 255.0 for c in properties['colors'][k]] + [1.0]
+                              for k in self.colors], dtype=np.float64)
+        self.sizes = list(properties['sizes'].keys())
+        self.size_values = np.array([properties['sizes'][k] for k in self.sizes], dtype=np.float64)
+
+        self.codes = {
+            'shape': {name: i for i, name in enumerate(self.shapes)},
+            'color': {name: i for i, name in enumerate(self.colors)},
+            'material': {name: i for i, name in enumerate(self.materials)},
+            'size': {name: i for i, name in enumerate(self.sizes)},
+        }
+        self.names = {
+            'shape': self.shapes,
+            'color': self.colors,
+            'material': self.materials,
+            'size': self.sizes,
+        }
+        self.shape_file_code = {name: i for i, name in enumerate(self.shape_files)}
+
+    def code(self, attr, name):
+        return self.codes[attr][name]
+
+    def rgba_list(self, color):
+        """ RGBA of a color code as a list of floats, as expected by add_material """
+        return self.rgba[color].tolist()
+
+    def shape_file(self, shape_name):
+        """ .blend object name of an output shape name, e.g. "cube" -> "SmoothCube_v2" """
+        return self.shape_files[self.codes['shape'][shape_name]]
+
+    def random_codes(self, rng=random):
+        """
+        Draw uniform random codes for all attributes. Uses the same random calls
+        as random.choice over the property lists.
+        """
+        return {attr: rng.randrange(len(names)) for attr, names in self.names.items()}
+
+
+def load_catalog(file_name):
+    """ Compiled catalog of a properties.json file, built once per process """
+    path = os.path.abspath(str(file_name))
+    if path not in _catalogs:
+        with open(path, 'r') as f:
+            _catalogs[path] = PropertyCatalog(json.load(f))
+    return _catalogs[path]
+
+
+def load_shape_color_combos(file_name):
+    """ Parsed shape_color_combos_json as a list of (shape, colors), cached per process """
+    path = os.path.abspath(str(file_name))
+    if path not in _combos:
+        with open(path, 'r') as f:
+            _combos[path] = list(json.load(f).items())
+    return _combos[path]
+
+
+def quotas(weights, total):
+    """
+    Split total draws over categories proportionally to weights, using the
+    largest remainder method so that the counts sum to total exactly.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if np.any(weights < 0) or not weights.sum() > 0:
+        raise ValueError("Target weights must be non-negative with a positive sum, got %s"
+                         % weights.tolist())
+    exact = weights / weights.sum() * total
+    counts = np.floor(exact).astype(np.int64)
+    remainder = total - counts.sum()
+    counts[np.argsort(-(exact - counts), kind='stable')[:remainder]] += 1
+    return counts
+
+
+class BalancedSampler:
+    """
+    Stratified attribute sampler. For the num_images images of a run starting
+    at first_index, the exact number of draws of every attribute value is
+    fixed up front from the target distributions and the draws are shuffled,
+    so the dataset hits the targets without any rejection sampling. The codes
+    of an image only depend on the seed and its image index, so a restarted
+    worker or a repair run draws the same attributes for the same image.
+    Indices outside the run are served from further blocks of num_images
+    images, each balanced on its own. Attributes are drawn independently of
+    each other; with shape_color_combos, colors are balanced within the colors
+    that are allowed for each shape.
+
+    - distributions: optional {attr: {name: weight}}; missing attributes are uniform
+    """
+
+    def __init__(self, catalog, num_images, objects_per_image, distributions=None,
+                 shape_color_combos=None, seed=None, first_index=0):
+        self.catalog = catalog
+        self.num_images = num_images
+        self.objects_per_image = objects_per_image
+        self.distributions = distributions or {}
+        self.shape_color_combos = shape_color_combos
+        # without a seed, the blocks of this process are still consistent
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.first_index = first_index
+        self.block = None
+        self.streams = None
+
+    def _streams(self, block):
+        """ Shuffled codes of every attribute for all objects of a block of images """
+        rng = np.random.default_rng([self.seed, block])
+        catalog, distributions = self.catalog, self.distributions
+        num_objects = self.num_images * self.objects_per_image
+        streams = {}
+        for attr, names in catalog.names.items():
+            if attr == 'color' and self.shape_color_combos is not None:
+                continue
+            target = distributions.get(attr, {})
+            weights = [target.get(name, 0.0) if target else 1.0 for name in names]
+            if attr == 'shape' and self.shape_color_combos is not None:
+                allowed = {shape for shape, _ in self.shape_color_combos}
+                weights = [w if name in allowed else 0.0 for w, name in zip(weights, names)]
+            streams[attr] = shuffled_stream(rng, weights, num_objects)
+
+        if self.shape_color_combos is not None:
+            # balance colors separately among the objects of every shape
+            color_choices = dict(self.shape_color_combos)
+            shape_counts = np.bincount(streams['shape'], minlength=len(catalog.shapes))
+            per_shape = {}
+            for shape, count in enumerate(shape_counts):
+                if count == 0:
+                    continue
+                colors = [catalog.code('color', c) for c in color_choices[catalog.shapes[shape]]]
+                target = distributions.get('color', {})
+                weights = [target.get(catalog.colors[c], 0.0) if target else 1.0 for c in colors]
+                per_shape[shape] = list(np.asarray(colors)[shuffled_stream(rng, weights, count)])
+            streams['color'] = np.array([per_shape[shape].pop() for shape in streams['shape']],
+                                        dtype=np.int64)
+        return streams
+
+    def __len__(self):
+        return self.num_images * self.objects_per_image
+
+    def image_codes(self, index):
+        """ Codes of the objects of image index """
+        block, position = divmod(index - self.first_index, self.num_images)
+        if block != self.block:
+            self.block, self.streams = block, self._streams(block)
+        start = position * self.objects_per_image
+        return [{attr: int(stream[k]) for attr, stream in self.streams.items()}
+                for k in range(start, start + self.objects_per_image)]
+
+
+def shuffled_stream(rng, weights, total):
+    """ The codes of total draws with exact quotas, in random order """
+    stream = np.repeat(np.arange(len(weights)), quotas(weights, total))
+    rng.shuffle(stream)
+    return stream
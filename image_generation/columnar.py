@@ -0,0 +1,434 @@
+import argparse, json, os
+from pathlib import Path
+
+import numpy as np
+
+import manifest
+import rle
+import shards
+
+"""
+Compact columnar export of scene annotations. All objects of a dataset are
+stored in a single NumPy structured array with small integer codes for the
+categorical attributes (the code of a value is its position in the
+corresponding section of properties.json) and float32 coordinates. Scenes and
+relationships are stored CSR-style:
+
+    objects.npy                 one row per object, see OBJECT_DTYPE
+    scene_indptr.npy            objects of scene s are rows [indptr[s], indptr[s + 1])
+    image_index.npy             image_index of every scene
+    rel_<name>_indptr.npy       relationships[name][i] of object row r is
+    rel_<name>_indices.npy      indices[indptr[r]:indptr[r + 1]] (scene-local indices)
+    masks.npy                   pixel counts, occlusion ratio and mask size per object, see MASK_DTYPE
+    rle_<field>_indptr.npy      COCO RLE string of the mask field ("mask", "amodal_mask")
+    rle_<field>_chars.npy       of object row r is chars[indptr[r]:indptr[r + 1]]
+    meta.json                   vocabularies, relationship names, mask fields and counts
+
+The mask files only exist for datasets rendered with --amodal_masks 1; they
+are decoded in batches with the vectorized decoders of rle.py.
+
+Every array can be memory-mapped, so loaders can query millions of objects
+without parsing any JSON. New scenes can be appended to an existing store
+(--append), which writes the new rows at the end of the files.
+"""
+
+ATTRIBUTES = {
+    "shape": "shapes",
+    "color": "colors",
+    "material": "materials",
+    "size": "sizes",
+}
+
+OBJECT_DTYPE = np.dtype([
+    ("scene", np.int32),
+    ("shape", np.uint8),
+    ("color", np.uint8),
+    ("material", np.uint8),
+    ("size", np.uint8),
+    ("coords", np.float32, (3,)),
+    ("rotation", np.float32),
+    ("pixel_coords", np.float32, (3,)),
+])
+
+
+MASK_FIELDS = ["mask", "amodal_mask"]
+
+MASK_DTYPE = np.dtype([
+    ("visible_pixels", np.int32),
+    ("amodal_pixels", np.int32),
+    ("occlusion_ratio", np.float32),
+    ("mask_size", np.int32, (2,)),
+])
+
+
+def empty_mask_rows(n):
+    """ Mask rows of objects without masks: -1 pixel counts and a NaN ratio """
+    rows = np.zeros(n, dtype=MASK_DTYPE)
+    rows["visible_pixels"] = rows["amodal_pixels"] = -1
+    rows["occlusion_ratio"] = np.nan
+    return rows
+
+
+def load_vocabularies(properties_json):
+    """ Value names of every categorical attribute, ordered as in properties.json """
+    with open(str(properties_json), "r") as f:
+        properties = json.load(f)
+    return {attr: list(properties[section].keys()) for attr, section in ATTRIBUTES.items()}
+
+
+def iter_scenes(source, min_index=0):
+    """
+    Iterate over the scene annotations of a dataset. source can be an aggregated
+    scenes JSON file (as written by copy.py), a shard directory or a directory
+    of per-image JSON files. Scenes with an image_index below min_index are
+    skipped; for shards and directories they are not read at all.
+    """
+    source = Path(source)
+    if source.is_file():
+        with open(str(source), "r") as f:
+            for scene in json.load(f)["scenes"]:
+                if scene.get("image_index", 0) >= min_index:
+                    yield scene
+    elif shards.is_shard_dir(source):
+        with shards.ShardReader(source) as reader:
+            for index in reader.indices():
+                if index >= min_index:
+                    yield reader.read_scene(index)
+    else:
+        for fn in sorted(os.listdir(str(source))):
+            if not fn.endswith(".json") or fn == manifest.MANIFEST_FILENAME: continue
+            if min_index > 0 and fn.split(".")[0].isdigit() and int(fn.split(".")[0]) < min_index:
+                continue
+            with open(str(source / fn), "r") as f:
+                yield json.load(f)
+
+
+def build_columns(scenes, vocabularies, first_scene=0):
+    """
+    Columns of the store for an iterable of scene structs: a dict of arrays
+    named like the store files (without .npy), the relationship names and the
+    mask fields. first_scene is the scene number of the first scene.
+    """
+    codes = {attr: {name: i for i, name in enumerate(names)}
+             for attr, names in vocabularies.items()}
+    rows = []
+    scene_indptr = [0]
+    image_index = []
+    relations = {}
+    mask_rows = []
+    rles = {field: ([0], bytearray()) for field in MASK_FIELDS}
+    for s, scene in enumerate(scenes, start=first_scene):
+        for obj in scene["objects"]:
+            try:
+                attr_codes = tuple(codes[attr][obj[attr]] for attr in ATTRIBUTES)
+            except KeyError as e:
+                raise ValueError("Scene %d uses %s which is not in properties.json"
+                                 % (scene.get("image_index", s), e))
+            rows.append((s,) + attr_codes + (obj["3d_coords"], obj["rotation"],
+                                             obj["pixel_coords"]))
+            ratio = obj.get("occlusion_ratio")
+            size = obj["mask"]["size"] if "mask" in obj else [0, 0]
+            mask_rows.append((obj.get("visible_pixels", -1), obj.get("amodal_pixels", -1),
+                              np.nan if ratio is None else ratio, size))
+            for field, (indptr, chars) in rles.items():
+                if field in obj:
+                    chars.extend(obj[field]["counts"].encode("ascii"))
+                indptr.append(len(chars))
+        for name, related in scene.get("relationships", {}).items():
+            indptr, indices = relations.setdefault(name, ([0] * (scene_indptr[-1] + 1), []))
+            # scenes exported before this relation appeared have no entries for it
+            indptr.extend([indptr[-1]] * (scene_indptr[-1] + 1 - len(indptr)))
+            for js in related:
+                indices.extend(js)
+                indptr.append(len(indices))
+        scene_indptr.append(len(rows))
+        image_index.append(scene.get("image_index", s))
+
+    columns = {
+        "objects": np.array(rows, dtype=OBJECT_DTYPE),
+        "scene_indptr": np.array(scene_indptr, dtype=np.int64),
+        "image_index": np.array(image_index, dtype=np.int64),
+    }
+    for name, (indptr, indices) in relations.items():
+        indptr.extend([indptr[-1]] * (len(rows) + 1 - len(indptr)))
+        columns["rel_%s_indptr" % name] = np.array(indptr, dtype=np.int64)
+        columns["rel_%s_indices" % name] = np.array(indices, dtype=np.int32)
+    mask_fields = sorted(field for field, (_, chars) in rles.items() if chars)
+    if mask_fields or any(row[0] >= 0 for row in mask_rows):
+        columns["masks"] = np.array(mask_rows, dtype=MASK_DTYPE)
+        for field in mask_fields:
+            indptr, chars = rles[field]
+            columns["rle_%s_indptr" % field] = np.array(indptr, dtype=np.int64)
+            columns["rle_%s_chars" % field] = np.frombuffer(bytes(chars), dtype=np.uint8)
+    return columns, sorted(relations.keys()), mask_fields
+
+
+def export_scenes(scenes, out_dir, vocabularies):
+    """
+    Write the columnar store for an iterable of scene structs into out_dir.
+    Returns the number of exported scenes.
+    """
+    columns, relationships, mask_fields = build_columns(scenes, vocabularies)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, array in columns.items():
+        np.save(str(out_dir / (name + ".npy")), array)
+    meta = {
+        "vocabularies": vocabularies,
+        "relationships": relationships,
+        "masks": mask_fields,
+        "num_scenes": len(columns["image_index"]),
+        "num_objects": len(columns["objects"]),
+    }
+    with open(str(out_dir / "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta["num_scenes"]
+
+
+def append_npy(path, rows):
+    """
+    Append rows to the .npy file at path in place. Only the header is
+    rewritten, which works as long as the new shape fits into the header
+    padding; otherwise the whole file is rewritten.
+    """
+    with open(str(path), "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        data_offset = f.tell()
+        if dtype != rows.dtype or fortran_order or shape[1:] != rows.shape[1:]:
+            raise ValueError('Cannot append rows of %s %s to "%s"' % (rows.dtype, rows.shape, path))
+        new_shape = (shape[0] + len(rows),) + shape[1:]
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(dtype), new_shape)
+        prefix = len(np.lib.format.MAGIC_PREFIX) + 2 + (2 if version == (1, 0) else 4)
+        padding = data_offset - prefix - len(header) - 1
+        if padding >= 0:
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(rows).tobytes())
+            f.seek(prefix)
+            f.write((header + " " * padding + "\n").encode("latin1"))
+            return
+    np.save(str(path), np.concatenate([np.load(str(path)), rows]))
+
+
+def append_ragged(store_dir, indptr_name, values_name, columns, stored, num_objects, num_rows):
+    """
+    Append the new rows of a CSR-style per-object column (indptr_name and
+    values_name) to a store with num_objects objects. stored tells whether the
+    store already has the column; the new scenes may lack it.
+    """
+    indptr_path = store_dir / (indptr_name + ".npy")
+    values_path = store_dir / (values_name + ".npy")
+    if not stored:
+        # objects of the existing scenes have no entries for a new column
+        indptr = columns[indptr_name]
+        np.save(str(indptr_path), np.concatenate([np.zeros(num_objects, dtype=np.int64), indptr]))
+        np.save(str(values_path), columns[values_name])
+        return
+    num_values = int(np.load(str(indptr_path), mmap_mode="r")[-1])
+    if indptr_name in columns:
+        append_npy(indptr_path, columns[indptr_name][1:] + num_values)
+        append_npy(values_path, columns[values_name])
+    else:
+        append_npy(indptr_path, np.full(num_rows, num_values, dtype=np.int64))
+
+
+def append_scenes(scenes, store_dir):
+    """
+    Append scene structs to an existing columnar store. The cost depends on the
+    number of new scenes only. Returns the number of appended scenes.
+    """
+    store_dir = Path(store_dir)
+    with open(str(store_dir / "meta.json"), "r") as f:
+        meta = json.load(f)
+    num_scenes, num_objects = meta["num_scenes"], meta["num_objects"]
+    columns, relationships, mask_fields = build_columns(scenes, meta["vocabularies"],
+                                                        first_scene=num_scenes)
+    num_new = len(columns["image_index"])
+    if num_new == 0:
+        return 0
+    num_rows = len(columns["objects"])
+
+    append_npy(store_dir / "objects.npy", columns["objects"])
+    append_npy(store_dir / "scene_indptr.npy", columns["scene_indptr"][1:] + num_objects)
+    append_npy(store_dir / "image_index.npy", columns["image_index"])
+    for name in sorted(set(meta["relationships"]) | set(relationships)):
+        append_ragged(store_dir, "rel_%s_indptr" % name, "rel_%s_indices" % name, columns,
+                      name in meta["relationships"], num_objects, num_rows)
+
+    stored_masks = (store_dir / "masks.npy").is_file()
+    if "masks" in columns or stored_masks:
+        new_rows = columns.get("masks", empty_mask_rows(num_rows))
+        if stored_masks:
+            append_npy(store_dir / "masks.npy", new_rows)
+        else:
+            np.save(str(store_dir / "masks.npy"), np.concatenate([empty_mask_rows(num_objects), new_rows]))
+    stored_fields = meta.get("masks", [])
+    for field in sorted(set(stored_fields) | set(mask_fields)):
+        append_ragged(store_dir, "rle_%s_indptr" % field, "rle_%s_chars" % field, columns,
+                      field in stored_fields, num_objects, num_rows)
+
+    # the meta data is updated last, after all arrays are complete
+    meta["relationships"] = sorted(set(meta["relationships"]) | set(relationships))
+    meta["masks"] = sorted(set(stored_fields) | set(mask_fields))
+    meta["num_scenes"] = num_scenes + num_new
+    meta["num_objects"] = num_objects + num_rows
+    with open(str(store_dir / "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return num_new
+
+
+class ColumnarStore:
+    """
+    Read access to a columnar store. All arrays are memory-mapped by default
+    (mmap_mode=None loads them into memory instead).
+    """
+
+    def __init__(self, store_dir, mmap_mode="r"):
+        store_dir = Path(store_dir)
+        with open(str(store_dir / "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.vocabularies = self.meta["vocabularies"]
+        self.objects = np.load(str(store_dir / "objects.npy"), mmap_mode=mmap_mode)
+        self.scene_indptr = np.load(str(store_dir / "scene_indptr.npy"), mmap_mode=mmap_mode)
+        self.image_index = np.load(str(store_dir / "image_index.npy"), mmap_mode=mmap_mode)
+        self.relations = {}
+        for name in self.meta["relationships"]:
+            self.relations[name] = (
+                np.load(str(store_dir / ("rel_%s_indptr.npy" % name)), mmap_mode=mmap_mode),
+                np.load(str(store_dir / ("rel_%s_indices.npy" % name)), mmap_mode=mmap_mode),
+            )
+        self.masks = None
+        if (store_dir / "masks.npy").is_file():
+            self.masks = np.load(str(store_dir / "masks.npy"), mmap_mode=mmap_mode)
+        self.rles = {}
+        for field in self.meta.get("masks", []):
+            self.rles[field] = (
+                np.load(str(store_dir / ("rle_%s_indptr.npy" % field)), mmap_mode=mmap_mode),
+                np.load(str(store_dir / ("rle_%s_chars.npy" % field)), mmap_mode=mmap_mode),
+            )
+
+    def __len__(self):
+        return len(self.image_index)
+
+    def code(self, attr, name):
+        """ Integer code of an attribute value, e.g. code("shape", "cube") """
+        return self.vocabularies[attr].index(name)
+
+    def scene_objects(self, s):
+        """ Structured array view of the objects of scene s """
+        return self.objects[self.scene_indptr[s]:self.scene_indptr[s + 1]]
+
+    def related(self, name, row):
+        """ Scene-local indices that have relationship name with object row """
+        indptr, indices = self.relations[name]
+        return indices[indptr[row]:indptr[row + 1]]
+
+    def mask_rles(self, rows, field="mask"):
+        """ COCO RLE dicts of the mask field of object rows """
+        if field not in self.rles:
+            raise KeyError("The store has no %s column" % field)
+        indptr, chars = self.rles[field]
+        rles = []
+        for row in rows:
+            start, stop = int(indptr[row]), int(indptr[row + 1])
+            if start == stop:
+                raise ValueError("Object row %d has no %s" % (row, field))
+            rles.append({"size": self.masks[row]["mask_size"].tolist(),
+                         "counts": chars[start:stop].tobytes().decode("ascii")})
+        return rles
+
+    def decode_masks(self, rows, field="mask"):
+        """ Boolean masks of object rows, shape (N, H, W), decoded in one batch """
+        return rle.decode_masks(self.mask_rles(rows, field))
+
+    def scene_masks(self, s, field="mask"):
+        """ Boolean masks of the objects of scene s, shape (N, H, W) """
+        return self.decode_masks(range(int(self.scene_indptr[s]), int(self.scene_indptr[s + 1])), field)
+
+    def index_maps(self, scenes):
+        """
+        Object index maps (0 = background, k + 1 = object k) of several scenes
+        of the same resolution, shape (B, H, W), decoded in one batch from the
+        visible masks of all their objects
+        """
+        scenes = np.asarray(scenes, dtype=np.int64)
+        starts, stops = self.scene_indptr[scenes], self.scene_indptr[scenes + 1]
+        counts = stops - starts
+        # object rows of all scenes, and the number of every object within its scene
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = np.repeat(starts, counts) + local
+        rles = self.mask_rles(rows)
+        if not rles:
+            raise ValueError("The scenes have no objects with masks")
+        h, w = rles[0]["size"]
+        labels, run_starts, run_ends = rle.one_runs(rles)
+        # every run adds its label within the pixels of its own scene
+        label = local[labels] + 1
+        offset = np.repeat(np.arange(len(scenes)), counts)[labels] * h * w
+        edges = np.zeros(len(scenes) * h * w + 1, dtype=np.int32)
+        np.add.at(edges, run_starts + offset, label)
+        np.add.at(edges, run_ends + offset, -label)
+        return np.cumsum(edges[:-1], dtype=np.int32).reshape(len(scenes), w, h).transpose(0, 2, 1)
+
+    def decode_scene(self, s):
+        """ Rebuild the objects and relationships of scene s in the JSON layout """
+        start, stop = int(self.scene_indptr[s]), int(self.scene_indptr[s + 1])
+        objects = []
+        for row, obj in enumerate(self.objects[start:stop], start=start):
+            objects.append({
+                "shape": self.vocabularies["shape"][obj["shape"]],
+                "size": self.vocabularies["size"][obj["size"]],
+                "material": self.vocabularies["material"][obj["material"]],
+                "3d_coords": tuple(obj["coords"].tolist()),
+                "rotation": float(obj["rotation"]),
+                "pixel_coords": tuple(obj["pixel_coords"].tolist()),
+                "color": self.vocabularies["color"][obj["color"]],
+            })
+            if self.masks is not None and self.masks[row]["visible_pixels"] >= 0:
+                ratio = float(self.masks[row]["occlusion_ratio"])
+                objects[-1].update({
+                    "visible_pixels": int(self.masks[row]["visible_pixels"]),
+                    "amodal_pixels": int(self.masks[row]["amodal_pixels"]),
+                    "occlusion_ratio": None if np.isnan(ratio) else ratio,
+                })
+            for field, (indptr, chars) in self.rles.items():
+                if indptr[row + 1] > indptr[row]:
+                    objects[-1][field] = self.mask_rles([row], field)[0]
+        relationships = {name: [self.related(name, r).tolist() for r in range(start, stop)]
+                         for name in self.relations}
+        return {
+            "image_index": int(self.image_index[s]),
+            "objects": objects,
+            "relationships": relationships,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source',
+                        help="Aggregated scenes JSON file, shard directory or directory of " +
+                             "per-image scene JSON files.")
+    parser.add_argument('out_dir', help="Directory where the columnar store is written")
+    parser.add_argument('--properties_json', default=str(Path(__file__).parent / "properties.json"),
+                        help="JSON file defining the attribute vocabularies")
+    parser.add_argument('--append', default=0, type=int,
+                        help="Setting --append 1 adds the scenes of source with an image_index " +
+                             "above the last one in the existing store in out_dir.")
+    args = parser.parse_args()
+    if args.append == 1 and (Path(args.out_dir) / "meta.json").is_file():
+        image_index = ColumnarStore(args.out_dir).image_index
+        min_index = int(image_index.max()) + 1 if len(image_index) else 0
+        num_scenes = append_scenes(iter_scenes(args.source, min_index), args.out_dir)
+        print('==> Appended %d scenes to "%s".' % (num_scenes, args.out_dir))
+        return
+    num_scenes = export_scenes(iter_scenes(args.source), args.out_dir,
+                               load_vocabularies(args.properties_json))
+    print('==> Exported %d scenes to "%s".' % (num_scenes, args.out_dir))
+
+
+if __name__ == "__main__":
+    main()
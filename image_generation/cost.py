@@ -0,0 +1,192 @@
+import argparse, heapq, json
+from pathlib import Path
+
+import numpy as np
+
+import catalog
+import ordering
+
+"""
+Render cost model and cost-aware scheduling. The render time of a scene grows
+with the number of objects, the number of glossy (metal) objects that need
+many light bounces and the share of the image covered by objects. CostModel
+predicts render seconds from these features of a planned layout, with
+coefficients fitted by least squares to the timings recorded by
+create_scene.py --timings_file.
+
+With a seed, the layout of every index is known before rendering (it only
+depends on seed + index), so a run can be scheduled up front:
+
+python cost.py fit model.json timings_*.jsonl
+python cost.py plan model.json schedule.json --seed 7 --num_images 10000 --num_workers 8 \
+    --directions_from output/00000.scene.json
+python supervisor.py --schedule schedule.json ...
+"""
+
+# material node groups that are path traced with glossy bounces
+GLOSSY_MATERIALS = {"MyMetal"}
+FEATURES = ["constant", "num_objects", "num_glossy", "coverage"]
+
+
+def features(objects, camera_location):
+    """
+    Feature vector of a scene, for a list of (material node group, scale,
+    (x, y, z)) tuples of its objects. Coverage is approximated by the sum of
+    squared scale over distance to the camera.
+    """
+    camera = np.asarray(camera_location, dtype=np.float64)
+    num_glossy = sum(1 for material, _, _ in objects if material in GLOSSY_MATERIALS)
+    coverage = sum((scale / np.linalg.norm(np.asarray(location) - camera)) ** 2
+                   for _, scale, location in objects)
+    return np.array([1.0, len(objects), num_glossy, coverage])
+
+
+def scene_features(scene_struct, props, camera_location):
+    """ Features of a rendered scene annotation """
+    return features([(props.material_nodes[props.code('material', obj['material'])],
+                      obj['3d_coords'][2], obj['3d_coords']) for obj in scene_struct['objects']],
+                    camera_location)
+
+
+def layout_features(layout, props, camera_location):
+    """ Features of a layout planned by placement.sample_layout """
+    return features([(props.material_nodes[spec['material']], spec['r'],
+                      (spec['x'], spec['y'], spec['r'])) for spec in layout], camera_location)
+
+
+class CostModel:
+    """ Linear model of the render seconds of a scene """
+
+    def __init__(self, coefficients=None):
+        # uncalibrated: one unit of time per scene and per object
+        self.coefficients = np.asarray(coefficients if coefficients is not None else [1.0, 1.0, 0.0, 0.0],
+                                       dtype=np.float64)
+
+    @classmethod
+    def fit(cls, X, y):
+        coefficients, _, _, _ = np.linalg.lstsq(np.asarray(X, dtype=np.float64),
+                                                np.asarray(y, dtype=np.float64), rcond=None)
+        return cls(coefficients)
+
+    def predict(self, X):
+        # a scene never costs nothing, even where the linear fit says so
+        return np.maximum(np.asarray(X, dtype=np.float64) @ self.coefficients, 1e-3)
+
+    def save(self, path):
+        with open(str(path), "w") as f:
+            json.dump({"features": FEATURES, "coefficients": self.coefficients.tolist()}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(str(path), "r") as f:
+            return cls(json.load(f)["coefficients"])
+
+
+def lpt_schedule(indices, costs, num_workers):
+    """
+    Longest processing time first: jobs are handed out by decreasing cost, each
+    to the worker with the least total cost so far. Returns one list of
+    indices per worker, each ordered longest job first.
+    """
+    order = np.argsort(-np.asarray(costs, dtype=np.float64), kind="stable")
+    heap = [(0.0, k) for k in range(num_workers)]
+    workers = [[] for _ in range(num_workers)]
+    for j in order:
+        load, k = heapq.heappop(heap)
+        workers[k].append(indices[j])
+        heapq.heappush(heap, (load + float(costs[j]), k))
+    return workers
+
+
+def balanced_shards(indices, costs, num_shards):
+    """
+    Split indices into num_shards contiguous ranges of about equal total cost,
+    for shard-based outputs that must stay in index order.
+    """
+    cumulative = np.cumsum(np.asarray(costs, dtype=np.float64))
+    targets = cumulative[-1] * np.arange(1, num_shards) / num_shards
+    bounds = [0] + np.searchsorted(cumulative, targets, side="right").tolist() + [len(indices)]
+    return [list(indices[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def makespan(schedule, cost_of):
+    return max((sum(cost_of[i] for i in worker) for worker in schedule), default=0.0)
+
+
+def load_timings(paths):
+    X, y = [], []
+    for path in paths:
+        with open(str(path), "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    X.append(entry["features"])
+                    y.append(entry["seconds"])
+    return np.array(X), np.array(y)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fit_parser = subparsers.add_parser('fit', help="Fit a cost model to recorded timings")
+    fit_parser.add_argument('model', help="Path of the model JSON file to write")
+    fit_parser.add_argument('timings', nargs='+', help="Timings files of create_scene.py")
+    plan_parser = subparsers.add_parser('plan', help="Schedule a seeded run over workers")
+    plan_parser.add_argument('model')
+    plan_parser.add_argument('schedule', help="Path of the schedule JSON file to write")
+    plan_parser.add_argument('--seed', required=True, type=int)
+    plan_parser.add_argument('--start_idx', default=0, type=int)
+    plan_parser.add_argument('--num_images', required=True, type=int)
+    plan_parser.add_argument('--num_workers', default=1, type=int)
+    plan_parser.add_argument('--mode', default='lpt', choices=['lpt', 'shards'],
+                             help="'lpt' hands out the longest jobs first; 'shards' splits the " +
+                                  "indices into contiguous ranges of equal cost.")
+    plan_parser.add_argument('--directions_from', required=True,
+                             help="Any scene annotation of the same camera setup, for the " +
+                                  "directions used during placement.")
+    plan_parser.add_argument('--camera_location', default=[5.62, -5.77, 4.44], type=float, nargs=3,
+                             help="Location of Camera_1 in create_scene.py")
+    plan_parser.add_argument('--num_objects', default=3, type=int)
+    plan_parser.add_argument('--min_dist', default=0.25, type=float)
+    plan_parser.add_argument('--margin', default=0.4, type=float)
+    plan_parser.add_argument('--placement_extent', default=3.0, type=float)
+    plan_parser.add_argument('--neighbor_radius', default=0.0, type=float,
+                             help="Placement flags of the run, see create_scene.py")
+    plan_parser.add_argument('--properties_json', default=str(Path(__file__).parent / "properties.json"))
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        X, y = load_timings(args.timings)
+        model = CostModel.fit(X, y)
+        model.save(args.model)
+        error = np.abs(model.predict(X) - y).mean()
+        print('==> Fitted %s to %d timings, mean absolute error %.2fs.'
+              % (dict(zip(FEATURES, model.coefficients.round(3).tolist())), len(y), error))
+        return
+
+    model = CostModel.load(args.model)
+    props = catalog.load_catalog(args.properties_json)
+    with open(args.directions_from, "r") as f:
+        directions = json.load(f)["directions"]
+    indices = list(range(args.start_idx, args.start_idx + args.num_images))
+    options = {"min_dist": args.min_dist, "margin": args.margin, "extent": args.placement_extent,
+               "neighbor_radius": args.neighbor_radius if args.neighbor_radius > 0 else None}
+    X = [layout_features(layout, props, args.camera_location)
+         for layout in ordering.plan_layouts(directions, indices, args.seed, props, args.num_objects,
+                                             **options)]
+    costs = model.predict(X)
+    if args.mode == 'lpt':
+        workers = lpt_schedule(indices, costs, args.num_workers)
+    else:
+        workers = balanced_shards(indices, costs, args.num_workers)
+    cost_of = dict(zip(indices, costs.tolist()))
+    with open(args.schedule, "w") as f:
+        json.dump({"workers": workers, "predicted_seconds": [sum(cost_of[i] for i in w) for w in workers]},
+                  f)
+    naive = makespan([indices[k::args.num_workers] for k in range(args.num_workers)], cost_of)
+    print('==> Predicted finishing time %.1fs (round robin %.1fs, ideal %.1fs).'
+          % (makespan(workers, cost_of), naive, costs.sum() / args.num_workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,25 @@
+import json, math, os, random, shutil, sys, tempfile, time
 from pathlib import Path
 
 import bpy
+import numpy as np
 from mathutils import Vector
 import utils
+import catalog
+import cost
+import incremental
+import manifest
+import masks
+import multires
+import ordering
+import placement
+import resources
+import rle
+import shards
+import staging
+import stats
+import supervisor
+import tracing
 
 root = Path(__file__).parents[1]
 
@@ -14,12 +31,12 @@ def create_scene(args):
     bpy.context.scene.cycles.transparent_min_bounces = 8
     bpy.context.scene.cycles.transparent_max_bounces = 8
 
-    utils.load_materials(str(root / "materials"))
+    utils.load_materials(str(utils.root / "materials"))
 
     render_args = bpy.context.scene.render
-    render_args.engine = "CYCLES"
-    render_args.resolution_x = 320
-    render_args.resolution_y = 320
+    configure_engine(args)
+    render_args.resolution_x = max(args.resolutions)
+    render_args.resolution_y = max(args.resolutions)
     render_args.resolution_percentage = 100
     render_args.pixel_aspect_x = 4.6
     render_args.pixel_aspect_y = 4.6
@@ -101,29 +118,93 @@ def create_scene(args):
     }
 
     # calculate directions
-    cam_behind = cam_obj1.matrix_world.to_quaternion() @ Vector((0, 0, -1))
-    cam_left = cam_obj1.matrix_world.to_quaternion() @ Vector((-1, 0, 0))
-    cam_up = cam_obj1.matrix_world.to_quaternion() @ Vector((0, 1, 0))
+    scene_struct['directions'] = plane_directions(cam_obj1, plane_normal)
+
+    # additional viewpoints of the camera rig
+    rig = create_camera_rig(args, cam_obj1, plane_normal)
+
+    return scene_struct, cam_obj1, rig
+
+
+def configure_engine(args):
+    """
+    Select the render engine. CYCLES is used for the dataset itself; the
+    EEVEE and Workbench engines render cheap draft images for previews and
+    smoke runs. The engine only affects the pixels, all annotations are
+    computed from the scene geometry and are identical for every engine.
+    """
+    scene = bpy.context.scene
+    scene.render.engine = args.engine
+    if args.engine == "CYCLES":
+        return
+    if args.engine.startswith("BLENDER_EEVEE"):
+        scene.eevee.taa_render_samples = args.draft_samples
+    elif args.engine == "BLENDER_WORKBENCH":
+        # flat studio lighting with the object material colors
+        scene.display.shading.light = "STUDIO"
+        scene.display.shading.color_type = "MATERIAL"
+        scene.display.render_aa = "OFF" if args.draft_samples <= 1 else "FXAA"
+
+
+def plane_directions(cam_obj, plane_normal):
+    """
+    The six cardinal directions of the ground plane as seen from a camera
+    """
+    cam_behind = cam_obj.matrix_world.to_quaternion() @ Vector((0, 0, -1))
+    cam_left = cam_obj.matrix_world.to_quaternion() @ Vector((-1, 0, 0))
+    cam_up = cam_obj.matrix_world.to_quaternion() @ Vector((0, 1, 0))
     plane_behind = (cam_behind - cam_behind.project(plane_normal)).normalized()
     plane_left = (cam_left - cam_left.project(plane_normal)).normalized()
     plane_up = cam_up.project(plane_normal).normalized()
 
-    scene_struct['directions']['behind'] = tuple(plane_behind)
-    scene_struct['directions']['front'] = tuple(-plane_behind)
-    scene_struct['directions']['left'] = tuple(plane_left)
-    scene_struct['directions']['right'] = tuple(-plane_left)
-    scene_struct['directions']['above'] = tuple(plane_up)
-    scene_struct['directions']['below'] = tuple(-plane_up)
-
-    return scene_struct, cam_obj1
-
-
-def render_scene(args, scene_struct, cam_obj1, index=0):
-    output_path = root / args.output_path
+    directions = {}
+    directions['behind'] = tuple(plane_behind)
+    directions['front'] = tuple(-plane_behind)
+    directions['left'] = tuple(plane_left)
+    directions['right'] = tuple(-plane_left)
+    directions['above'] = tuple(plane_up)
+    directions['below'] = tuple(-plane_up)
+    return directions
+
+
+def create_camera_rig(args, cam_obj1, plane_normal):
+    """
+    Create num_views - 1 additional cameras, evenly spaced on the orbit of
+    Camera_1 around the z axis. Returns a list of (camera, directions) pairs.
+    """
+    rig = []
+    for k in range(1, args.num_views):
+        angle = 2 * math.pi * k / args.num_views
+        cam = bpy.data.cameras.new(f"Camera_{k + 1}")
+        cam.lens = cam_obj1.data.lens
+        cam.shift_y = cam_obj1.data.shift_y
+        cam_obj = bpy.data.objects.new(f"Camera_{k + 1}", cam)
+        bpy.context.collection.objects.link(cam_obj)
+        x, y, z = cam_obj1.location
+        cam_obj.location = (x * math.cos(angle) - y * math.sin(angle),
+                            x * math.sin(angle) + y * math.cos(angle), z)
+        cam_obj.rotation_euler = cam_obj1.rotation_euler
+        cam_obj.rotation_euler[2] += angle
+        rig.append(cam_obj)
+    bpy.context.view_layer.update()
+    return [(cam_obj, plane_directions(cam_obj, plane_normal)) for cam_obj in rig]
+
+
+def begin_scene(args, scene_struct, index, writer=None):
+    """
+    Name and seed image index and create the collection its objects are built
+    in. Returns the path the main image is rendered to and the collection.
+    """
     image_filename = f"{str(index).zfill(5)}.render.png"
+    scene_struct["image_index"] = index
     scene_struct["image_filename"] = image_filename
-    bpy.context.scene.render.filepath = str(output_path / image_filename)
-
+    if args.seed is not None:
+        random.seed(args.seed + index)
+    if writer is None:
+        image_path = root / args.output_path / image_filename
+    else:
+        # render into scratch space, the image is moved into a shard afterwards
+        image_path = Path(tempfile.gettempdir()) / image_filename
 
     # create a new collection for objects
     obj_collection = bpy.data.collections.new(name="obj_collection")
@@ -132,31 +213,422 @@ def render_scene(args, scene_struct, cam_obj1, index=0):
     # set parent collection to obj_collection
     bpy.context.view_layer.active_layer_collection = \
         bpy.context.view_layer.layer_collection.children['obj_collection']
+    return image_path, obj_collection
 
-    objects, blender_objects = utils.add_random_objects(scene_struct, 3, args, cam_obj1)
-    bpy.ops.render.render(write_still=True)
 
-    # delete the obj_collection
+def remove_collection(obj_collection):
+    """ Delete the objects of a scene and their collection """
     for obj in obj_collection.objects:
         bpy.data.objects.remove(obj, do_unlink=True)
     bpy.data.collections.remove(obj_collection)
 
-    # scene_struct["objects"] = objects
-    # scene_struct["relationships"] = utils.compute_all_relationships(scene_struct)
-    # with open("render.json", "w") as f:
-    #     json.dump(scene_struct, f, indent=2)
+
+def annotate_relationships(args, scene_struct):
+    """ Relationships of the objects, between neighbors only with --neighbor_radius """
+    if args.neighbor_radius > 0:
+        positions = [obj["3d_coords"] for obj in scene_struct["objects"]]
+        scene_struct["relationships"] = utils.scene_relationships(positions, scene_struct['directions'],
+                                                                  args)
+    else:
+        scene_struct["relationships"] = utils.compute_all_relationships(scene_struct)
+
+
+def write_scene(args, scene_struct, image_path, extra_paths, writer=None, dataset_stats=None):
+    """
+    Add a finished scene to the statistics and write its annotation, or move
+    it into a shard together with its main image and the extra images
+    """
+    index = scene_struct["image_index"]
+    if dataset_stats is not None:
+        dataset_stats.update(scene_struct)
+    with tracing.span("write"):
+        if writer is None:
+            with open(str(root / args.output_path / f"{str(index).zfill(5)}.scene.json"), "w") as f:
+                json.dump(scene_struct, f, indent=2)
+        else:
+            writer.write(index, image_path, scene_struct, extra_images=extra_paths)
+            os.remove(str(image_path))
+            for path in extra_paths.values():
+                os.remove(str(path))
+
+
+def render_scene(args, scene_struct, cam_obj1, index=0, writer=None, rig=(),
+                 level_writer=None, sampler=None, dataset_stats=None, pool=None):
+    image_path, obj_collection = begin_scene(args, scene_struct, index, writer)
+    bpy.context.scene.render.filepath = str(image_path)
+
+    with tracing.span("build", num_objects=args.num_objects):
+        objects, blender_objects = utils.add_random_objects(scene_struct, args.num_objects, args,
+                                                            cam_obj1, sampler=sampler, pool=pool)
+    utils.render_with_retries(args.render_retries, args.render_backoff)
+
+    # visible and amodal masks from flat ID color passes, a few milliseconds each
+    index_map = amodal = None
+    if args.amodal_masks == 1:
+        with tracing.span("masks"):
+            index_map, amodal = masks.render_masks(blender_objects, args.render_retries,
+                                                   args.render_backoff)
+            for obj, counts, mask, amodal_mask in zip(objects, masks.occlusion(index_map, amodal),
+                                                      rle.encode_index_map(index_map, len(objects)),
+                                                      rle.encode_masks(amodal)):
+                obj.update(counts)
+                obj["mask"] = mask
+                obj["amodal_mask"] = amodal_mask
+
+    # lower resolutions are downsampled from this render while the variants
+    # and views below are rendered
+    resolutions = []
+    extra_paths = {}
+    level_futures = []
+    full_resolution = max(args.resolutions)
+    levels = [r for r in sorted(args.resolutions, reverse=True) if r != full_resolution]
+    img = None
+    if levels or (args.variants == "hide_each" and args.incremental_variants == 1):
+        img = utils.load_image_array(image_path)
+    if levels:
+        level_paths = []
+        for r in levels:
+            factor = multires.level_factor(full_resolution, r)
+            level_filename = f"{str(index).zfill(5)}.r{r}.render.png"
+            extra_paths[f"r{r}.png"] = image_path.parent / level_filename
+            level_paths.append((factor, image_path.parent / level_filename))
+            level = {
+                "resolution": r,
+                "image_filename": level_filename,
+                "pixel_coords": multires.rescale_pixel_coords([obj["pixel_coords"] for obj in objects],
+                                                              factor),
+            }
+            # masks of the level, one per object like pixel_coords
+            if index_map is not None:
+                level["masks"] = rle.encode_index_map(multires.downsample_labels(index_map, factor),
+                                                      len(objects))
+                level["amodal_masks"] = rle.encode_masks(multires.downsample_labels(amodal, factor))
+            resolutions.append(level)
+        level_futures = level_writer.submit(img, level_paths)
+
+    # counterfactual variants: render the same scene again with single objects
+    # hidden, without rebuilding it; incrementally, only the region of the
+    # hidden object is rendered again
+    variants = []
+    if args.variants == "hide_each":
+        for k, obj in enumerate(blender_objects):
+            variant_filename = f"{str(index).zfill(5)}.v{k}.render.png"
+            extra_paths[f"v{k}.png"] = image_path.parent / variant_filename
+            obj.hide_render = True
+            variant = {
+                "image_filename": variant_filename,
+                "parent_image_index": index,
+                "hidden_objects": [k],
+            }
+            if args.incremental_variants == 1:
+                variant["incremental"] = incremental.rerender(
+                    cam_obj1, [objects[k]], img, image_path.parent / variant_filename, args,
+                    pad=args.incremental_pad, verify=args.verify_incremental == 1)
+            else:
+                bpy.context.scene.render.filepath = str(image_path.parent / variant_filename)
+                utils.render_with_retries(args.render_retries, args.render_backoff)
+            obj.hide_render = False
+            variants.append(variant)
+
+    # the other viewpoints of the camera rig, switching only the active camera
+    views = []
+    positions = [obj["3d_coords"] for obj in objects]
+    for k, (cam_obj, directions) in enumerate(rig, start=1):
+        view_filename = f"{str(index).zfill(5)}.c{k}.render.png"
+        extra_paths[f"c{k}.png"] = image_path.parent / view_filename
+        bpy.context.scene.camera = cam_obj
+        bpy.context.scene.render.filepath = str(image_path.parent / view_filename)
+        utils.render_with_retries(args.render_retries, args.render_backoff)
+        views.append({
+            "camera": cam_obj.name,
+            "image_filename": view_filename,
+            "directions": directions,
+            "pixel_coords": utils.get_camera_coords_batch(cam_obj, positions),
+            "relationships": utils.scene_relationships(positions, directions, args),
+        })
+    bpy.context.scene.camera = cam_obj1
+
+    remove_collection(obj_collection)
+
+    scene_struct["objects"] = objects
+    with tracing.span("annotate"):
+        annotate_relationships(args, scene_struct)
+    scene_struct["variants"] = variants
+    scene_struct["views"] = views
+    scene_struct["resolutions"] = resolutions
+    # time spent waiting for the background level encoding
+    with tracing.span("levels"):
+        for future in level_futures:
+            future.result()
+    write_scene(args, scene_struct, image_path, extra_paths, writer, dataset_stats)
+
+
+def render_sequence(args, scene_struct, cam_obj1, index=0, writer=None, sampler=None,
+                    dataset_stats=None):
+    """
+    Render a clip of args.num_frames frames in which the objects move on
+    collision-free straight lines. The objects are built once, their motion is
+    keyframed and all frames are rendered as one animation job. The first
+    frame is also the main image of the scene; the per-frame annotations are
+    listed in the "frames" field.
+    """
+    image_path, obj_collection = begin_scene(args, scene_struct, index, writer)
+    frame_paths = [image_path.parent / f"{str(index).zfill(5)}.f{str(f).zfill(4)}.render.png"
+                   for f in range(1, args.num_frames + 1)]
+
+    # plan the first frame like a still scene, then the motion
+    props = catalog.load_catalog(utils.root / "properties.json")
+    object_codes = None
+    if sampler is not None:
+        object_codes = sampler.image_codes(index)
+    with tracing.span("build", num_objects=args.num_objects):
+        layout = placement.sample_layout(scene_struct['directions'], args.num_objects, props,
+                                         object_codes, **utils.layout_options(args))
+        tracks = placement.sample_trajectories(layout, args.num_frames, max_travel=args.max_travel)
+        objects, blender_objects = utils.add_objects(layout, props, cam_obj1)
+
+    # two linear keyframes per object describe the whole motion
+    bpy.context.preferences.edit.keyframe_new_interpolation_type = 'LINEAR'
+    for obj, track in zip(blender_objects, tracks.transpose(1, 0, 2)):
+        obj.keyframe_insert("location", frame=1)
+        obj.location = (track[-1][0], track[-1][1], obj.location[2])
+        obj.keyframe_insert("location", frame=args.num_frames)
+    scene = bpy.context.scene
+    scene.frame_start, scene.frame_end = 1, args.num_frames
+    scene.render.filepath = str(image_path.parent / f"{str(index).zfill(5)}.f####.render.png")
+    utils.render_with_retries(args.render_retries, args.render_backoff, animation=True)
+    scene.frame_set(1)
+    shutil.copyfile(str(frame_paths[0]), str(image_path))
+
+    heights = np.array([obj["3d_coords"][2] for obj in objects])
+    positions = np.concatenate([tracks, np.broadcast_to(heights[None, :, None], tracks.shape[:2] + (1,))],
+                               axis=2)
+    frames = utils.get_sequence_annotations(cam_obj1, positions, scene_struct['directions'])
+    for frame, path in zip(frames, frame_paths):
+        frame["image_filename"] = path.name
+
+    remove_collection(obj_collection)
+
+    scene_struct["objects"] = objects
+    with tracing.span("annotate"):
+        annotate_relationships(args, scene_struct)
+    scene_struct["frames"] = frames
+    write_scene(args, scene_struct, image_path,
+                {f"f{str(f).zfill(4)}.png": path for f, path in enumerate(frame_paths, start=1)},
+                writer, dataset_stats)
+
+
+def recycle_reason(args, num_done, start_time, rss):
+    """
+    Reason to replace this process by a fresh one according to the recycling
+    policy, or None to keep going
+    """
+    if args.recycle_images > 0 and num_done >= args.recycle_images:
+        return f"{num_done} images"
+    if args.recycle_minutes > 0 and time.time() - start_time >= 60 * args.recycle_minutes:
+        return f"{args.recycle_minutes} minutes"
+    if args.recycle_rss > 0 and rss >= args.recycle_rss << 20:
+        return f"RSS {rss >> 20} MB"
+    return None
+
+
+def report_progress(args):
+    """ Callback appending finished image indices to the progress file, if any """
+    def report(indices):
+        if args.progress_file is not None:
+            with open(args.progress_file, "a") as f:
+                f.write("".join(f"{i}\n" for i in indices))
+    return report
+
+
+def report_heartbeat(args, index):
+    """ Append a heartbeat line for a rendered image that is not reported as finished yet """
+    if args.progress_file is not None:
+        with open(args.progress_file, "a") as f:
+            f.write(f"{supervisor.HEARTBEAT} {index}\n")
 
 
 def main():
+    start_time = time.time()
+
     # pass args
     args = utils.args_parser()
+    if args.trace_dir is not None:
+        tracing.start(root / args.trace_dir, "create_scene")
 
     # scene setting up
-    scene_struct, cam_obj1 = create_scene(args)
+    with tracing.span("setup"):
+        scene_struct, cam_obj1, rig = create_scene(args)
+
+    # partial dataset statistics of this process
+    dataset_stats = None
+    if args.stats_dir is not None:
+        dataset_stats = stats.DatasetStats(catalog.load_catalog(utils.root / "properties.json"),
+                                           resolution=max(args.resolutions))
+        stats_path = root / args.stats_dir / f"stats_{os.getpid()}.npz"
+
+    # statistics of staged images that are not published yet; they are added to
+    # the partial on publication, so a crash never counts an image that is
+    # rendered again
+    staged_stats = {}
+
+    def published(indices):
+        """ Save the statistics of published images, then report them as finished """
+        if dataset_stats is not None:
+            for i in indices:
+                dataset_stats.merge(staged_stats.pop(i))
+            with tracing.span("stats"):
+                dataset_stats.save(stats_path)
+        report_progress(args)(indices)
+
+    # output backend; with a scratch directory, images are rendered as files
+    # into it and published to the output directory in the background
+    output_dir = root / args.output_path
+    writer = None
+    stager = None
+    if args.scratch_dir is not None:
+        stager = staging.Stager(output_dir, args.scratch_dir, batch_size=args.staging_batch,
+                                pack=args.output_format == "shards", retries=args.render_retries,
+                                backoff=args.render_backoff, on_published=published)
+        args.output_path = str(stager.scratch_dir)
+    elif args.output_format == "shards":
+        writer = shards.ShardWriter(output_dir, max_shard_bytes=args.shard_max_bytes,
+                                    prefix=args.shard_prefix)
+
+    level_writer = multires.LevelWriter()
+
+    # indices to render: all of them, the ones after the existing images of an
+    # extended dataset, the broken ones of a validation report, or the ones
+    # handed over by the supervisor
+    indices = range(args.start_idx, args.start_idx + args.num_images)
+    if args.extend == 1:
+        dataset = manifest.load_manifest(output_dir)
+        if args.seed is None:
+            args.seed = dataset["seed"]
+        indices = range(dataset["next_index"], dataset["next_index"] + args.num_images)
+    # the images of the whole run, also when this process renders a part of them
+    planned = indices
+    if args.repair_report is not None:
+        with open(args.repair_report, "r") as f:
+            indices = json.load(f)["repair_indices"]
+    elif args.indices_file is not None:
+        with open(args.indices_file, "r") as f:
+            indices = json.load(f)
+
+    # stratified attribute sampling over all objects of the run; the objects
+    # of an image only depend on its index, whichever process renders it
+    sampler = None
+    if args.balanced_sampling == 1:
+        distributions = None
+        if args.attribute_distributions is not None:
+            with open(args.attribute_distributions, "r") as f:
+                distributions = json.load(f)
+        sampler = catalog.BalancedSampler(catalog.load_catalog(utils.root / "properties.json"),
+                                          len(planned), args.num_objects, distributions,
+                                          seed=args.seed, first_index=planned.start)
+
+    # keep objects between scenes, and render scenes sharing shapes and
+    # materials one after the other
+    pool = None
+    if args.object_pool == 1:
+        pool = utils.ObjectPool()
+    run = indices if isinstance(indices, range) else None
+    if pool is not None and args.reorder_window > 0 and args.seed is not None and sampler is None:
+        props = catalog.load_catalog(utils.root / "properties.json")
+        layouts = ordering.plan_layouts(scene_struct['directions'], indices, args.seed, props,
+                                        args.num_objects, **utils.layout_options(args))
+        order = ordering.order_layouts(layouts, props, args.reorder_window)
+        print('==> Reordered %d scenes: %d instead of %d object rebuilds.'
+              % (len(order), ordering.total_edits(layouts, props, order),
+                 ordering.total_edits(layouts, props, list(range(len(layouts))))))
+        indices = [indices[k] for k in order]
+
+    # resource usage of the session
+    tracker = resources.ResourceTracker(args.resource_log, args.resource_warn_blocks,
+                                        args.resource_warn_rss << 20, args.purge_orphans)
+
+    def finish(done):
+        """ Hand over finished indices: staged and reported once published, or reported now """
+        if stager is not None:
+            for i in done:
+                stager.stage(i)
+        elif done:
+            report_progress(args)(done)
 
     # scene rendering
-    for i in range(args.num_images):
-        render_scene(args, scene_struct, cam_obj1, index=i)
+    recycle = None
+    num_done = 0
+    unsaved = []
+    for k, i in enumerate(indices):
+        image_start = time.time()
+        image_stats = dataset_stats
+        if stager is not None and dataset_stats is not None:
+            # owned by the flusher thread, which merges the image statistics on publication
+            image_stats = staged_stats[i] = stats.DatasetStats(
+                catalog.load_catalog(utils.root / "properties.json"), resolution=dataset_stats.resolution)
+        with tracing.span("image", cat="image", index=i):
+            if args.num_frames > 1:
+                render_sequence(args, scene_struct, cam_obj1, index=i, writer=writer, sampler=sampler,
+                                dataset_stats=image_stats)
+            else:
+                render_scene(args, scene_struct, cam_obj1, index=i, writer=writer, rig=rig,
+                             level_writer=level_writer, sampler=sampler, dataset_stats=image_stats,
+                             pool=pool)
+        tracker.record(i)
+        # observed cost of the image, to calibrate the cost model of cost.py
+        if args.timings_file is not None:
+            scene_features = cost.scene_features(scene_struct, catalog.load_catalog(utils.root / "properties.json"),
+                                                 tuple(cam_obj1.location))
+            with open(args.timings_file, "a") as f:
+                f.write(json.dumps({"index": i, "seconds": time.time() - image_start,
+                                    "features": scene_features.tolist()}) + "\n")
+        # indices are only reported as finished once their statistics are saved
+        # and, when staging, once they are published; until then the heartbeat
+        # tells the supervisor that the worker is alive
+        unsaved.append(i)
+        report_heartbeat(args, i)
+        if stager is not None or dataset_stats is None or (k + 1) % args.stats_interval == 0:
+            if stager is None and dataset_stats is not None:
+                with tracing.span("stats"):
+                    dataset_stats.save(stats_path)
+            finish(unsaved)
+            unsaved = []
+        num_done = k + 1
+        # hand over to a fresh process only between images, so that every index
+        # is either finished and reported or left to the next process
+        if k + 1 < len(indices):
+            recycle = recycle_reason(args, k + 1, start_time, tracker.last["rss"])
+            if recycle is not None:
+                break
+
+    level_writer.close()
+    if pool is not None:
+        print('==> Object pool: %d objects reused, %d built.' % (pool.num_reused, pool.num_built))
+    growth = {name: value for name, value in tracker.summary().items() if value != 0}
+    if growth:
+        print('==> Growth per image: ' + ', '.join('%s %.2f' % item for item in growth.items()))
+    if stager is None and dataset_stats is not None:
+        dataset_stats.save(stats_path)
+    finish(unsaved)
+    if writer is not None:
+        writer.close()
+    if stager is not None:
+        # waiting for the last batches to be published
+        with tracing.span("drain"):
+            stager.close()
+        print('==> Published %d images to "%s" in %d batches.'
+              % (stager.num_published, output_dir, stager.num_batches))
+
+    # move the high-water mark of the dataset past a contiguous run
+    if run is not None and num_done > 0 and (num_done == len(run) or indices is run):
+        manifest.record_run(output_dir, run.start, run.start + num_done, args.seed)
+
+    if recycle is not None:
+        print(f'==> Recycling the worker after {recycle}.')
+        tracing.instant("recycle", reason=recycle)
+        tracing.stop()
+        sys.exit(supervisor.RECYCLE_EXIT_CODE)
+    tracing.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,794 @@
+import math, os, struct, sys, types, zlib
+from collections import deque
+
+import numpy as np
+
+import multires
+import validate
+
+"""
+Lightweight in-process stand-in for Blender. install() registers fake "bpy",
+"bpy_extras" and "mathutils" modules that implement the small part of the
+Blender API used by create_scene.py and utils.py: data-blocks and collections,
+appending objects and node groups, materials, transforms, cameras and
+world_to_camera_view. Renders do not path-trace anything; they write a blank
+PNG of the configured resolution and record the placed objects.
+
+This allows the full create_scene.main flow (placement, relationships,
+annotations and I/O) to run, be profiled and be benchmarked without Blender:
+
+    import fake_bpy
+    fake_bpy.install()
+    import create_scene
+    create_scene.main()
+"""
+
+
+class Vector:
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._v = [float(c) for c in seq]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._v, dtype=dtype)
+
+    def __setitem__(self, i, value):
+        self._v[i] = float(value)
+
+    def __repr__(self):
+        return "Vector(%s)" % (tuple(self._v),)
+
+    x = property(lambda self: self._v[0])
+    y = property(lambda self: self._v[1])
+    z = property(lambda self: self._v[2])
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    def __neg__(self):
+        return Vector(-a for a in self)
+
+    def __mul__(self, scalar):
+        return Vector(a * scalar for a in self)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector(a / scalar for a in self)
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self, other))
+
+    @property
+    def length(self):
+        return math.sqrt(self.dot(self))
+
+    def normalized(self):
+        length = self.length
+        return Vector(self) if length == 0 else self / length
+
+    def project(self, other):
+        other = Vector(other)
+        return other * (self.dot(other) / other.dot(other))
+
+    def copy(self):
+        return Vector(self)
+
+
+class Matrix:
+    """ 4x4 matrix; to_quaternion() returns the rotation as a 3x3 Matrix """
+
+    def __init__(self, rows):
+        self.m = np.array(rows, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.m)
+
+    def __getitem__(self, i):
+        return Vector(self.m[i])
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.m, dtype=dtype)
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix(self.m @ other.m)
+        v = np.asarray(list(other), dtype=np.float64)
+        if len(self.m) == 4:
+            return Vector(self.m[:3, :3] @ v + self.m[:3, 3])
+        return Vector(self.m @ v)
+
+    def inverted(self):
+        return Matrix(np.linalg.inv(self.m))
+
+    def normalized(self):
+        m = self.m.copy()
+        m[:3, :3] /= np.linalg.norm(m[:3, :3], axis=0)
+        return Matrix(m)
+
+    def to_quaternion(self):
+        return Matrix(self.normalized().m[:3, :3])
+
+
+def euler_matrix(rotation):
+    """ Rotation matrix of XYZ euler angles """
+    (cx, cy, cz), (sx, sy, sz) = np.cos(rotation), np.sin(rotation)
+    rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+class Namespace:
+    """ Container for arbitrary settings such as scene.render or scene.cycles """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class ID:
+    """ Base of all data-blocks """
+
+    def __init__(self, name):
+        self._name = name
+        self.owner = None
+        self.users = 0
+        self.use_fake_user = False
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        if self.owner is not None:
+            name = self.owner.rename(self, name)
+        self._name = name
+
+    def release(self):
+        """ Drop the users this data-block holds on other data-blocks """
+
+
+class DataCollection:
+    """ bpy.data.<collection>: data-blocks with unique names, looked up by name """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.by_name = {}
+        self.next_suffix = {}
+
+    @property
+    def items(self):
+        return list(self.by_name.values())
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __iter__(self):
+        return iter(list(self.by_name.values()))
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.items[key]
+        return self.by_name[key]
+
+    def get(self, name, default=None):
+        return self.by_name.get(name, default)
+
+    def unique_name(self, name):
+        """ name, or name.001, name.002, ... if it is taken """
+        if name not in self.by_name:
+            return name
+        k = self.next_suffix.get(name, 1)
+        while "%s.%s" % (name, str(k).zfill(3)) in self.by_name:
+            k += 1
+        self.next_suffix[name] = k + 1
+        return "%s.%s" % (name, str(k).zfill(3))
+
+    def rename(self, item, name):
+        del self.by_name[item.name]
+        name = self.unique_name(name)
+        self.by_name[name] = item
+        return name
+
+    def new(self, name, *args, **kwargs):
+        item = self.factory(self.unique_name(name), *args, **kwargs)
+        item.owner = self
+        self.by_name[item.name] = item
+        return item
+
+    def remove(self, item, do_unlink=True):
+        del self.by_name[item.name]
+        item.owner = None
+        item.release()
+        if do_unlink and isinstance(item, Object):
+            for coll in list(item.users_collection):
+                coll.objects.unlink(item)
+        if do_unlink and isinstance(item, Collection):
+            for coll in _data().collections.items + [_context().scene.collection]:
+                if item in coll.children.items:
+                    coll.children.unlink(item)
+
+
+class Object(ID):
+
+    def __init__(self, name, object_data=None):
+        super().__init__(name)
+        self.data = object_data
+        self.type = object_data.object_type if object_data is not None else 'EMPTY'
+        if object_data is not None:
+            object_data.users += 1
+        self._location = Vector()
+        self._rotation_euler = Vector()
+        self._scale = Vector((1.0, 1.0, 1.0))
+        self.hide_render = False
+        self.selected = False
+        self.users_collection = []
+        self.color = (1.0, 1.0, 1.0, 1.0)
+        # data path -> sorted list of (frame, value)
+        self.keyframes = {}
+
+    location = property(lambda self: self._location,
+                        lambda self, value: setattr(self, "_location", Vector(value)))
+    rotation_euler = property(lambda self: self._rotation_euler,
+                              lambda self, value: setattr(self, "_rotation_euler", Vector(value)))
+    scale = property(lambda self: self._scale,
+                     lambda self, value: setattr(self, "_scale", Vector(value)))
+
+    @property
+    def matrix_world(self):
+        m = np.eye(4)
+        m[:3, :3] = euler_matrix(np.array(list(self.rotation_euler))) * np.array(list(self.scale))
+        m[:3, 3] = list(self.location)
+        return Matrix(m)
+
+    def select_set(self, state):
+        self.selected = state
+
+    def keyframe_insert(self, data_path, frame=None):
+        if frame is None:
+            frame = _context().scene.frame_current
+        keys = [k for k in self.keyframes.get(data_path, []) if k[0] != frame]
+        keys.append((frame, tuple(getattr(self, data_path))))
+        self.keyframes[data_path] = sorted(keys)
+
+    def evaluate(self, frame):
+        """ Set animated properties to their value at frame, interpolating linearly """
+        for data_path, keys in self.keyframes.items():
+            frames = [k[0] for k in keys]
+            values = np.array([k[1] for k in keys], dtype=np.float64)
+            setattr(self, data_path, [float(np.interp(frame, frames, values[:, c]))
+                                      for c in range(values.shape[1])])
+
+    def release(self):
+        if self.data is not None:
+            self.data.users -= 1
+
+
+class UserList(list):
+    """ List of data-blocks that counts as a user of each of them """
+
+    def append(self, item):
+        list.append(self, item)
+        item.users += 1
+
+    def __setitem__(self, i, item):
+        self[i].users -= 1
+        list.__setitem__(self, i, item)
+        item.users += 1
+
+
+class Mesh(ID):
+    object_type = 'MESH'
+
+    def release(self):
+        for mat in self.materials:
+            mat.users -= 1
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.materials = UserList()
+        self.vertices = [Namespace(normal=Vector((0.0, 0.0, 1.0)))]
+
+
+class Camera(ID):
+    object_type = 'CAMERA'
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.type = 'PERSP'
+        self.lens = 50.0
+        self.sensor_width = 36.0
+        self.shift_x = 0.0
+        self.shift_y = 0.0
+
+    def view_frame(self, scene=None):
+        """ Corners of the view frame at distance lens (top right, bottom right, bottom left, top left) """
+        render = scene.render
+        rx = render.resolution_x * render.pixel_aspect_x
+        ry = render.resolution_y * render.pixel_aspect_y
+        half = self.sensor_width / 2.0
+        hw, hh = (half, half * ry / rx) if rx >= ry else (half * rx / ry, half)
+        ox, oy = self.shift_x * 2 * half, self.shift_y * 2 * half
+        z = -self.lens
+        return [Vector((hw + ox, hh + oy, z)), Vector((hw + ox, -hh + oy, z)),
+                Vector((-hw + ox, -hh + oy, z)), Vector((-hw + ox, hh + oy, z))]
+
+
+class Light(ID):
+    object_type = 'LIGHT'
+
+    def __init__(self, name, type='POINT'):
+        super().__init__(name)
+        self.type = type
+        self.energy = 10.0
+        self.size = 0.25
+        self.color = [1.0, 1.0, 1.0]
+
+
+class Socket:
+
+    def __init__(self, name, default_value=None):
+        self.name = name
+        self.default_value = default_value
+
+
+class Node:
+
+    def __init__(self, name, inputs=(), outputs=()):
+        self.name = name
+        self.inputs = SocketList(Socket(n) for n in inputs)
+        self.outputs = SocketList(Socket(n) for n in outputs)
+        self._node_tree = None
+
+    @property
+    def node_tree(self):
+        return self._node_tree
+
+    @node_tree.setter
+    def node_tree(self, tree):
+        if self._node_tree is not None:
+            self._node_tree.users -= 1
+        self._node_tree = tree
+        if tree is not None:
+            tree.users += 1
+
+
+class SocketList(list):
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for socket in self:
+                if socket.name == key:
+                    return socket
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+
+class NodeTree(ID):
+
+    def __init__(self, name, type='ShaderNodeTree'):
+        super().__init__(name)
+        self.nodes = NodeList()
+        self.links = LinkList()
+
+
+class NodeList(list):
+
+    def new(self, type):
+        node = Node(type, inputs=['Color'], outputs=['Shader'])
+        self.append(node)
+        return node
+
+
+class LinkList(list):
+
+    def new(self, output, input):
+        self.append((output, input))
+
+
+class Material(ID):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.node_tree = NodeTree(name)
+        self.node_tree.nodes.append(Node('Material Output', inputs=['Surface']))
+        self.diffuse_color = (0.8, 0.8, 0.8, 1.0)
+
+    def release(self):
+        for node in self.node_tree.nodes:
+            node.node_tree = None
+
+
+class Image(ID):
+
+    def __init__(self, name, size=(0, 0), pixels=None):
+        super().__init__(name)
+        self.size = size
+        self._pixels = pixels
+        self.pixels = Namespace(foreach_get=self._foreach_get)
+
+    def _foreach_get(self, out):
+        if self._pixels is None:
+            out.fill(0.0)
+        else:
+            out[:] = self._pixels
+
+
+def decode_png_pixels(data):
+    """
+    Pixels of an RGBA PNG without scanline filters, as written by
+    multires.encode_png, as floats in Blender order (bottom row first).
+    Returns None for any other PNG.
+    """
+    pos, idat = 8, []
+    w = h = None
+    while pos < len(data):
+        length, tag = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        if tag == b"IHDR":
+            w, h, depth, color_type = struct.unpack(">IIBB", chunk[:10])
+            if depth != 8 or color_type != 6:
+                return None
+        elif tag == b"IDAT":
+            idat.append(chunk)
+        pos += 12 + length
+    raw = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(h, w * 4 + 1)
+    if raw[:, 0].any():
+        return None
+    return (raw[::-1, 1:].astype(np.float32) / 255.0).ravel()
+
+
+class ImageCollection(DataCollection):
+
+    def load(self, filepath, **kwargs):
+        with open(filepath, "rb") as f:
+            data = f.read()
+        return self.new(os.path.basename(filepath), size=validate.png_size(data[:24]),
+                        pixels=decode_png_pixels(data))
+
+
+class ObjectList:
+    """ Collection.objects / Collection.children """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.items = []
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.items[key]
+        for item in self.items:
+            if item.name == key:
+                return item
+        raise KeyError(key)
+
+    def link(self, item):
+        self.items.append(item)
+        item.users += 1
+        if isinstance(item, Object):
+            item.users_collection.append(self.owner)
+
+    def unlink(self, item):
+        self.items.remove(item)
+        item.users -= 1
+        if isinstance(item, Object):
+            item.users_collection.remove(self.owner)
+
+
+class Collection(ID):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.objects = ObjectList(self)
+        self.children = ObjectList(self)
+
+    @property
+    def all_objects(self):
+        objects = list(self.objects)
+        for child in self.children:
+            objects.extend(child.all_objects)
+        return objects
+
+
+class LayerCollection:
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    @property
+    def children(self):
+        return ObjectListView([LayerCollection(c) for c in self.collection.children])
+
+
+class ObjectListView(list):
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for item in self:
+                if item.name == key:
+                    return item
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+
+class Backend:
+    """
+    State of the fake Blender session. renders keeps the placements of the
+    most recent renders (name, location, rotation, scale and hide_render of
+    every mesh object) and num_renders counts all of them.
+    """
+
+    def __init__(self, render_log_size=100):
+        self.data = Namespace(
+            objects=DataCollection(Object),
+            meshes=DataCollection(Mesh),
+            cameras=DataCollection(Camera),
+            lights=DataCollection(Light),
+            materials=DataCollection(Material),
+            node_groups=DataCollection(NodeTree),
+            images=ImageCollection(Image),
+            collections=DataCollection(Collection),
+            worlds=DataCollection(lambda name: Namespace(name=name, cycles=Namespace())),
+            textures=DataCollection(ID),
+        )
+        self.data.worlds.new("World")
+        scene_collection = Collection("Scene Collection")
+        render = Namespace(engine='CYCLES', filepath='', resolution_x=1920, resolution_y=1080,
+                           resolution_percentage=100, pixel_aspect_x=1.0, pixel_aspect_y=1.0,
+                           film_transparent=False, dither_intensity=1.0)
+        shading = Namespace(light='STUDIO', color_type='MATERIAL', show_object_outline=False,
+                            show_cavity=False, show_shadows=False, show_xray=False)
+        scene = Namespace(render=render, cycles=Namespace(), eevee=Namespace(),
+                          display=Namespace(shading=shading, render_aa='8'),
+                          view_settings=Namespace(view_transform='Filmic', look='None', exposure=0.0,
+                                                  gamma=1.0), camera=None,
+                          collection=scene_collection, frame_start=1, frame_end=250,
+                          frame_current=1, frame_set=_frame_set)
+        view_layer = Namespace(active_layer_collection=LayerCollection(scene_collection),
+                               layer_collection=LayerCollection(scene_collection),
+                               objects=Namespace(active=None), update=lambda: None)
+        self.context = ContextProxy(scene, view_layer)
+        self.context.preferences = Namespace(edit=Namespace(keyframe_new_interpolation_type='BEZIER'))
+        self.renders = deque(maxlen=render_log_size)
+        self.num_renders = 0
+        self._png_cache = {}
+
+    def blank_png(self, w, h):
+        if (w, h) not in self._png_cache:
+            self._png_cache[(w, h)] = multires.encode_png(np.zeros((h, w, 4), dtype=np.uint8))
+        return self._png_cache[(w, h)]
+
+
+class ContextProxy:
+
+    def __init__(self, scene, view_layer):
+        self.scene = scene
+        self.view_layer = view_layer
+
+    @property
+    def collection(self):
+        return self.view_layer.active_layer_collection.collection
+
+    @property
+    def object(self):
+        return self.view_layer.objects.active
+
+    active_object = object
+
+
+_backend = None
+
+
+def _data():
+    return _backend.data
+
+
+def _context():
+    return _backend.context
+
+
+def _frame_set(frame):
+    _context().scene.frame_current = frame
+    for obj in _data().objects:
+        if obj.keyframes:
+            obj.evaluate(frame)
+
+
+# --- bpy.ops ------------------------------------------------------------------
+
+def _link_new_object(name, data):
+    obj = _data().objects.new(name, data)
+    _context().collection.objects.link(obj)
+    _context().view_layer.objects.active = obj
+    return obj
+
+
+def op_primitive_plane_add(size=2.0, **kwargs):
+    mesh = _data().meshes.new("Plane")
+    obj = _link_new_object("Plane", mesh)
+    obj.scale = (size / 2.0, size / 2.0, 1.0)
+    return {'FINISHED'}
+
+
+def op_append(filename=None, **kwargs):
+    kind, name = filename.replace(os.sep, "/").split("/")[-2:]
+    if kind == "Object":
+        obj = _data().objects.new(name, _data().meshes.new(name))
+        _context().collection.objects.link(obj)
+        obj.select_set(True)
+    elif kind == "NodeTree":
+        _data().node_groups.new(name)
+    return {'FINISHED'}
+
+
+def op_material_new(**kwargs):
+    _data().materials.new("Material")
+    return {'FINISHED'}
+
+
+def op_resize(value=(1.0, 1.0, 1.0), **kwargs):
+    obj = _context().object
+    obj.scale = [s * v for s, v in zip(obj.scale, value)]
+    return {'FINISHED'}
+
+
+def op_translate(value=(0.0, 0.0, 0.0), **kwargs):
+    obj = _context().object
+    obj.location = [l + v for l, v in zip(obj.location, value)]
+    return {'FINISHED'}
+
+
+def op_object_delete(**kwargs):
+    for obj in list(_data().objects):
+        if obj.selected:
+            _data().objects.remove(obj, do_unlink=True)
+    return {'FINISHED'}
+
+
+def op_render(write_still=False, animation=False, **kwargs):
+    scene = _context().scene
+    render = scene.render
+    scale = render.resolution_percentage / 100.0
+    w, h = int(scale * render.resolution_x), int(scale * render.resolution_y)
+    frames = range(scene.frame_start, scene.frame_end + 1) if animation else [None]
+    for frame in frames:
+        if frame is not None:
+            scene.frame_set(frame)
+        _backend.num_renders += 1
+        _backend.renders.append([(obj.name, tuple(obj.location), tuple(obj.rotation_euler),
+                                  tuple(obj.scale), obj.hide_render)
+                                 for obj in scene.collection.all_objects if obj.type == 'MESH'])
+        if write_still or animation:
+            path = render.filepath
+            if frame is not None:
+                # like Blender, replace the last run of "#" by the frame number
+                # or append the number, and add a missing extension
+                hashes = path.rfind("#")
+                if hashes >= 0:
+                    width = len(path[:hashes + 1]) - len(path[:hashes + 1].rstrip("#"))
+                    path = path[:hashes + 1 - width] + str(frame).zfill(width) + path[hashes + 1:]
+                else:
+                    path = path + str(frame).zfill(4)
+                if not path.endswith(".png"):
+                    path += ".png"
+            # like Blender, create missing output directories
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "wb") as f:
+                color_type = scene.display.shading.color_type
+                if render.engine == 'BLENDER_WORKBENCH' and color_type in ('OBJECT', 'MATERIAL'):
+                    f.write(multires.encode_png(_rasterize_object_colors(scene, w, h, color_type)))
+                else:
+                    f.write(_backend.blank_png(w, h))
+    return {'FINISHED'}
+
+
+def _rasterize_object_colors(scene, w, h, color_type='OBJECT'):
+    """
+    Flat color render: every visible mesh object is drawn as a disc of its
+    projected size in its object color, or with color_type 'MATERIAL' in the
+    diffuse color of its first material, nearest objects last
+    """
+    img = np.zeros((h, w, 4), dtype=np.uint8)
+    discs = []
+    for obj in scene.collection.all_objects:
+        if obj.type != 'MESH' or obj.hide_render:
+            continue
+        center = world_to_camera_view(scene, scene.camera, Vector(obj.location))
+        top = world_to_camera_view(scene, scene.camera, obj.location + Vector((0.0, 0.0, obj.scale[2])))
+        radius = abs(top.y - center.y) * h
+        color = obj.color
+        if color_type == 'MATERIAL':
+            materials = obj.data.materials if obj.data is not None else []
+            color = materials[0].diffuse_color if len(materials) else (0.8, 0.8, 0.8, 1.0)
+        discs.append((center.z, center.x * w, (1.0 - center.y) * h, radius, color))
+    rows, cols = np.mgrid[0:h, 0:w] + 0.5
+    for _, x, y, radius, color in sorted(discs, key=lambda d: -d[0]):
+        inside = (cols - x) ** 2 + (rows - y) ** 2 <= radius ** 2
+        img[inside] = np.round(np.array(color) * 255.0).astype(np.uint8)
+    return img
+
+
+def op_orphans_purge(**kwargs):
+    """ Remove data-blocks without users, repeated until nothing changes """
+    removed = True
+    while removed:
+        removed = False
+        for name in ["meshes", "materials", "node_groups", "images", "cameras", "lights"]:
+            coll = getattr(_data(), name)
+            for item in list(coll):
+                if item.users == 0 and not item.use_fake_user:
+                    coll.remove(item)
+                    removed = True
+    return {'FINISHED'}
+
+
+# --- bpy_extras ---------------------------------------------------------------
+
+def world_to_camera_view(scene, obj, coord):
+    """ Same computation as bpy_extras.object_utils.world_to_camera_view """
+    co_local = obj.matrix_world.normalized().inverted() @ coord
+    z = -co_local.z
+    camera = obj.data
+    frame = [v for v in camera.view_frame(scene=scene)[:3]]
+    if camera.type != 'ORTHO':
+        if z == 0.0:
+            return Vector((0.5, 0.5, 0.0))
+        frame = [-(v / (v.z / z)) for v in frame]
+    min_x, max_x = frame[2].x, frame[1].x
+    min_y, max_y = frame[1].y, frame[0].y
+    x = (co_local.x - min_x) / (max_x - min_x)
+    y = (co_local.y - min_y) / (max_y - min_y)
+    return Vector((x, y, z))
+
+
+def install():
+    """
+    Register the fake bpy, bpy_extras and mathutils modules and start a new
+    fake Blender session. Returns the Backend holding the session state.
+    """
+    global _backend
+    _backend = Backend()
+
+    bpy = types.ModuleType("bpy")
+    bpy.data = _backend.data
+    bpy.context = _backend.context
+    bpy.app = Namespace(version=(2, 93, 0), background=True)
+    bpy.ops = Namespace(
+        mesh=Namespace(primitive_plane_add=op_primitive_plane_add),
+        wm=Namespace(append=op_append),
+        material=Namespace(new=op_material_new),
+        transform=Namespace(resize=op_resize, translate=op_translate),
+        object=Namespace(delete=op_object_delete),
+        render=Namespace(render=op_render),
+        outliner=Namespace(orphans_purge=op_orphans_purge),
+    )
+    bpy_extras = types.ModuleType("bpy_extras")
+    bpy_extras.object_utils = Namespace(world_to_camera_view=world_to_camera_view)
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Vector = Vector
+    mathutils.Matrix = Matrix
+    sys.modules.update({"bpy": bpy, "bpy_extras": bpy_extras, "mathutils": mathutils})
+    return _backend
@@ -0,0 +1,123 @@
+import math, os, tempfile
+
+import numpy as np
+
+import bpy
+import multires
+import utils
+
+"""
+Incremental re-rendering of scenes in which only a few objects changed, e.g.
+a counterfactual variant with one object hidden or an object with swapped
+attributes. Instead of path tracing the full image again, the screen bounds
+of the changed objects before and after the change are projected with the
+scene camera, padded for shadows and reflections, and only that region is
+rendered with the Cycles render border. The region is then composited into
+the cached base image.
+
+Effects of the change outside the padded region (e.g. reflections on distant
+metal objects) are lost; verify=True renders the full image as well and
+reports the difference, to tune the padding for a setup.
+"""
+
+
+def frame_size():
+    """ Width and height in pixels of the rendered images """
+    render_args = bpy.context.scene.render
+    render_scale = render_args.resolution_percentage / 100.0
+    return int(render_scale * render_args.resolution_x), int(render_scale * render_args.resolution_y)
+
+
+def object_corners(obj_struct):
+    """
+    World-space corners of a box enclosing an annotated object. Objects stand
+    on the ground plane with their center at 3d_coords and z equal to their
+    scale, so the box spans [0, 2z] vertically and the circumscribed square of
+    any rotation horizontally.
+    """
+    x, y, z = obj_struct["3d_coords"]
+    half = z * math.sqrt(2)
+    return [(x + dx, y + dy, zz) for dx in (-half, half) for dy in (-half, half) for zz in (0.0, 2 * z)]
+
+
+def changed_region(cam, changed_objects, pad=0.5, min_pad=4):
+    """
+    Pixel box (x0, y0, x1, y1), rows counted from the top, covering the given
+    object annotations (old and new states of the changed objects). Each side
+    is padded by pad times the box size and at least min_pad pixels. Returns
+    None if there are no changed objects.
+    """
+    if not changed_objects:
+        return None
+    corners = [c for obj in changed_objects for c in object_corners(obj)]
+    coords = np.array([c[:2] for c in utils.get_camera_coords_batch(cam, corners)], dtype=np.float64)
+    w, h = frame_size()
+    (x0, y0), (x1, y1) = coords.min(axis=0), coords.max(axis=0)
+    pad_x = max(pad * (x1 - x0), min_pad)
+    pad_y = max(pad * (y1 - y0), min_pad)
+    x0, x1 = int(np.clip(math.floor(x0 - pad_x), 0, w)), int(np.clip(math.ceil(x1 + pad_x), 0, w))
+    y0, y1 = int(np.clip(math.floor(y0 - pad_y), 0, h)), int(np.clip(math.ceil(y1 + pad_y), 0, h))
+    return x0, y0, x1, y1
+
+
+def render_region(region, path, retries=3, backoff=1.0):
+    """ Render only a pixel box of the full frame to path, using the render border """
+    render_args = bpy.context.scene.render
+    w, h = frame_size()
+    x0, y0, x1, y1 = region
+    filepath = render_args.filepath
+    render_args.filepath = str(path)
+    render_args.use_border = True
+    render_args.use_crop_to_border = False
+    # the border is given in normalized coordinates with the origin at the bottom
+    render_args.border_min_x, render_args.border_max_x = x0 / w, x1 / w
+    render_args.border_min_y, render_args.border_max_y = 1.0 - y1 / h, 1.0 - y0 / h
+    try:
+        utils.render_with_retries(retries, backoff)
+    finally:
+        render_args.use_border = False
+        render_args.filepath = filepath
+
+
+def composite(base_img, region_img, region):
+    """ Copy of base_img with the pixel box region taken from region_img """
+    x0, y0, x1, y1 = region
+    img = base_img.copy()
+    img[y0:y1, x0:x1] = region_img[y0:y1, x0:x1]
+    return img
+
+
+def rerender(cam, changed_objects, base_img, path, args, pad=0.5, verify=False):
+    """
+    Render the current scene to path by re-rendering only the region of the
+    changed objects on top of base_img, the (H, W, 4) render before the change.
+    Returns a dict with the rendered region and, with verify, the pixel
+    difference to a full render.
+    """
+    region = changed_region(cam, changed_objects, pad)
+    info = {"region": list(region) if region is not None else None}
+    if region is None or region[0] == region[2] or region[1] == region[3]:
+        # nothing visible changed
+        img = base_img
+    else:
+        render_region(region, path, args.render_retries, args.render_backoff)
+        img = composite(base_img, utils.load_image_array(path), region)
+        area = (region[2] - region[0]) * (region[3] - region[1])
+        info["fraction"] = area / float(base_img.shape[0] * base_img.shape[1])
+    with open(str(path), "wb") as f:
+        f.write(multires.encode_png(img))
+
+    if verify:
+        render_args = bpy.context.scene.render
+        filepath = render_args.filepath
+        full_path = os.path.join(tempfile.gettempdir(), "verify_" + os.path.basename(str(path)))
+        render_args.filepath = full_path
+        try:
+            utils.render_with_retries(args.render_retries, args.render_backoff)
+        finally:
+            render_args.filepath = filepath
+        diff = np.abs(utils.load_image_array(full_path).astype(np.int16) - img.astype(np.int16))
+        os.remove(full_path)
+        info["max_abs_diff"] = int(diff.max())
+        info["mean_abs_diff"] = float(diff.mean())
+    return info
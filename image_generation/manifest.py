@@ -0,0 +1,90 @@
+import json, os, re, time
+from pathlib import Path
+
+import shards
+
+"""
+Dataset manifest for extending an existing dataset. manifest.json in the
+output directory records the index high-water mark (the first index that has
+not been rendered yet), the base seed and the list of runs that produced the
+dataset:
+
+    {"next_index": 550000, "seed": 7, "runs": [{"start": 0, "stop": 500000, ...}, ...]}
+
+An extension renders the indices from next_index on with the same base seed,
+and only appends to the outputs: new tar shards and lines of the shard index,
+new rows of the columnar store and new entries at the end of an aggregated
+scenes JSON file. Its cost depends on the number of added images only.
+"""
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def discover_next_index(output_dir):
+    """
+    High-water mark of a dataset without manifest, from its shard index or its
+    per-image scene files (00000.scene.json or CLEVR_new_000000.json). Returns
+    0 for an empty or missing directory.
+    """
+    output_dir = Path(output_dir)
+    if shards.is_shard_dir(output_dir):
+        indices = shards.ShardReader(output_dir).indices()
+    elif output_dir.is_dir():
+        matches = [re.search(r"(\d+)(\.scene)?\.json$", fn) for fn in os.listdir(str(output_dir))]
+        indices = [int(m.group(1)) for m in matches if m is not None]
+    else:
+        indices = []
+    return max(indices, default=-1) + 1
+
+
+def load_manifest(output_dir):
+    """ Manifest of a dataset; it is created from the existing outputs if missing """
+    path = Path(output_dir) / MANIFEST_FILENAME
+    if path.is_file():
+        with open(str(path), "r") as f:
+            return json.load(f)
+    return {"next_index": discover_next_index(output_dir), "seed": None, "runs": []}
+
+
+def record_run(output_dir, start, stop, seed, failed=()):
+    """
+    Add a finished run of the indices [start, stop) to the manifest and move the
+    high-water mark; failed lists indices of the run that were not rendered.
+    The manifest is replaced atomically.
+    """
+    manifest = load_manifest(output_dir)
+    manifest["next_index"] = max(manifest["next_index"], stop)
+    if manifest["seed"] is None:
+        manifest["seed"] = seed
+    manifest["runs"].append({"start": start, "stop": stop, "seed": seed, "failed": list(failed),
+                             "time": time.time()})
+    path = Path(output_dir) / MANIFEST_FILENAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(str(tmp_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(str(tmp_path), str(path))
+    return manifest
+
+
+def append_scene_file(scene_file, scenes):
+    """
+    Append scene structs to an aggregated scenes JSON file as written by
+    copy.py ({"info": ..., "scenes": [...]}) without rewriting it: the closing
+    "]}" is overwritten with the new entries. Creates the file if it is missing.
+    """
+    if not os.path.isfile(scene_file):
+        with open(scene_file, "w") as f:
+            json.dump({"info": {}, "scenes": scenes}, f)
+        return
+    if not scenes:
+        return
+    with open(scene_file, "r+b") as f:
+        f.seek(-3, os.SEEK_END)
+        tail = f.read(3)
+        if tail[1:] != b"]}":
+            raise ValueError('"%s" does not end with the scene list' % scene_file)
+        f.seek(-2, os.SEEK_END)
+        separator = b"" if tail[:1] == b"[" else b", "
+        data = b", ".join(json.dumps(scene).encode("utf-8") for scene in scenes)
+        f.write(separator + data + b"]}")
@@ -0,0 +1,83 @@
+import struct, zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+"""
+Multi-resolution outputs from a single render. The scene is path-traced once at
+the highest configured resolution; the lower resolutions are produced by area
+averaging in NumPy. Label images (e.g. object index masks) are downsampled by
+taking the center sample of every block instead, so that labels are never mixed.
+
+PNG encoding only needs zlib, so this module also works inside Blender's
+bundled Python.
+"""
+
+
+def level_factor(full_resolution, resolution):
+    if full_resolution % resolution != 0:
+        raise ValueError("Resolution %d does not divide the render resolution %d"
+                         % (resolution, full_resolution))
+    return full_resolution // resolution
+
+
+def downsample(img, factor):
+    """ Area-average an (H, W, C) uint8 image by an integer factor """
+    if factor == 1:
+        return img
+    h, w, c = img.shape
+    blocks = img.reshape(h // factor, factor, w // factor, factor, c).astype(np.float32)
+    return np.round(blocks.mean(axis=(1, 3))).astype(np.uint8)
+
+
+def downsample_labels(labels, factor):
+    """ Downsample (..., H, W) label images or masks by picking the center sample of each block """
+    return labels[..., factor // 2::factor, factor // 2::factor]
+
+
+def rescale_pixel_coords(pixel_coords, factor):
+    """
+    Map (px, py, pz) of the full resolution render to a level downsampled by
+    factor: the pixel of the level whose block contains the full resolution
+    pixel, so the last pixel maps to the last pixel of the level
+    """
+    return [(int(px // factor), int(py // factor), pz) for px, py, pz in pixel_coords]
+
+
+def encode_png(img):
+    """ Encode an (H, W, 4) uint8 image as PNG bytes """
+    h, w, c = img.shape
+
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data +
+                struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    # every scanline starts with filter type 0 (none)
+    raw = np.zeros((h, w * c + 1), dtype=np.uint8)
+    raw[:, 1:] = img.reshape(h, w * c)
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) +
+            chunk(b"IEND", b""))
+
+
+def write_level(img, factor, path):
+    with open(str(path), "wb") as f:
+        f.write(encode_png(downsample(img, factor)))
+
+
+class LevelWriter:
+    """
+    Downsample and write resolution levels on a thread pool, so that encoding
+    overlaps with the next render (zlib and NumPy release the GIL).
+    """
+
+    def __init__(self, num_workers=2):
+        self.pool = ThreadPoolExecutor(max_workers=num_workers)
+
+    def submit(self, img, levels):
+        """ levels is a list of (factor, path); returns futures to wait on """
+        return [self.pool.submit(write_level, img, factor, path) for factor, path in levels]
+
+    def close(self):
+        self.pool.shutdown(wait=True)
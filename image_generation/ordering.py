@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+
+import placement
+
+"""
+Render order of pre-planned scenes for object pooling. With a seed, the
+layout of every image index is known before rendering, since it only depends
+on seed + index. With --object_pool 1, objects of the previous scene whose
+shape and material are needed again are kept and only moved and recolored;
+the others are removed and new ones appended. order_layouts reorders the
+scenes within windows so that consecutive scenes share as many (shape,
+material) slots as possible, which minimizes those rebuilds. Every scene keeps
+its image index, only the order in which the indices are rendered changes.
+"""
+
+
+def plan_layouts(directions, indices, seed, props, num_objects=3, **options):
+    """
+    Layouts of seeded images, from the same random calls as render_scene;
+    options are the placement keyword arguments of placement.sample_layout
+    """
+    return [placement.sample_layout(directions, num_objects, props, rng=random.Random(seed + i),
+                                    **options)
+            for i in indices]
+
+
+def slot_counts(layouts, props):
+    """ Number of objects of every (shape, material) combination, one row per layout """
+    counts = np.zeros((len(layouts), len(props.shapes) * len(props.materials)), dtype=np.int64)
+    for k, layout in enumerate(layouts):
+        for spec in layout:
+            counts[k, spec['shape'] * len(props.materials) + spec['material']] += 1
+    return counts
+
+
+def edit_distances(counts_a, counts_b):
+    """
+    Number of object slots that have to be rebuilt to go from each scene of
+    counts_a to each scene of counts_b: the larger object count minus the
+    number of objects with a (shape, material) match
+    """
+    common = np.minimum(counts_a[:, None, :], counts_b[None, :, :]).sum(axis=2)
+    sizes = np.maximum(counts_a.sum(axis=1)[:, None], counts_b.sum(axis=1)[None, :])
+    return sizes - common
+
+
+def order_layouts(layouts, props, window=64):
+    """
+    Greedy nearest-neighbor order of the layouts within consecutive windows of
+    the given size: starting from the last scene rendered, the next scene is
+    always the remaining one of the window with the fewest slot edits. Returns
+    the positions of the layouts in render order.
+    """
+    counts = slot_counts(layouts, props)
+    order = []
+    for start in range(0, len(layouts), window):
+        remaining = list(range(start, min(start + window, len(layouts))))
+        distances = edit_distances(counts[remaining], counts[remaining])
+        alive = np.ones(len(remaining), dtype=bool)
+        if order:
+            current = int(np.argmin(edit_distances(counts[order[-1:]], counts[remaining])[0]))
+        else:
+            current = 0
+        while True:
+            order.append(remaining[current])
+            alive[current] = False
+            if not alive.any():
+                break
+            current = int(np.argmin(np.where(alive, distances[current], np.iinfo(np.int64).max)))
+    return order
+
+
+def total_edits(layouts, props, order):
+    """ Slot edits of rendering the layouts in the given order """
+    counts = slot_counts(layouts, props)[order]
+    return int(sum(edit_distances(counts[k:k + 1], counts[k + 1:k + 2])[0, 0]
+                   for k in range(len(order) - 1)))
@@ -0,0 +1,264 @@
+import math, random
+
+import numpy as np
+
+import spatial
+
+"""
+Scene layout logic that does not depend on Blender: choosing object attributes
+and non-intersecting positions on the ground plane, and computing spatial
+relationships. utils.py instantiates the planned layouts in Blender; keeping
+this part separate allows it to run, be profiled and be tested without Blender.
+
+A layout is a list of object specs, one dict per object with the attribute
+codes of the property catalog (shape, color, material, size), the position
+(x, y) on the ground plane, the radius r and the rotation theta in degrees.
+"""
+
+
+def sample_layout(directions, num_objects, props, object_codes=None, min_dist=0.25,
+                  margin=0.4, max_tries=50, rng=random, extent=3.0, neighbor_radius=None):
+    """
+    Plan num_objects random objects in [-extent, extent]^2. Every object is
+    further than min_dist from all others and further than margin from them
+    along the four cardinal directions; if an object cannot be placed after
+    max_tries attempts, all objects are placed again. object_codes optionally
+    fixes the attributes.
+
+    For crowded scenes, neighbor_radius limits the margin check to objects
+    closer than that radius, whose directional relations are annotated (see
+    spatial.neighbor_relationships), and uses a grid of the placed objects.
+    """
+    while True:
+        layout = try_layout(directions, num_objects, props, object_codes, min_dist, margin,
+                            max_tries, rng, extent, neighbor_radius)
+        if layout is not None:
+            return layout
+
+
+def try_layout(directions, num_objects, props, object_codes=None, min_dist=0.25, margin=0.4,
+               max_tries=50, rng=random, extent=3.0, neighbor_radius=None):
+    """ One attempt of sample_layout; returns None if an object could not be placed """
+    if neighbor_radius is None:
+        positions = []
+    else:
+        positions = spatial.OccupancyGrid(max(neighbor_radius, 2 * max(props.size_values) + min_dist))
+    layout = []
+    for i in range(num_objects):
+        # Choose a random size
+        if object_codes is None:
+            size = rng.randrange(len(props.sizes))
+        else:
+            size = object_codes[i]['size']
+        r = float(props.size_values[size])
+
+        # Try to place the object, ensuring that we don't intersect any existing
+        # objects and that we are more than the desired margin away from all existing
+        # objects along all cardinal directions.
+        num_tries = 0
+        while True:
+            num_tries += 1
+            if num_tries > max_tries:
+                return None
+            x = rng.uniform(-extent, extent)
+            y = rng.uniform(-extent, extent)
+            if neighbor_radius is None:
+                if position_is_free(x, y, r, positions, directions, min_dist, margin):
+                    break
+            elif position_is_free_near(x, y, r, positions, directions, min_dist, margin,
+                                       neighbor_radius):
+                break
+
+        # Choose random color and shape
+        if object_codes is None:
+            shape = rng.randrange(len(props.shapes))
+            color = rng.randrange(len(props.colors))
+        else:
+            shape, color = object_codes[i]['shape'], object_codes[i]['color']
+
+        # For cube, adjust the size a bit
+        if props.shape_files[shape] == 'Cube':
+            r /= math.sqrt(2)
+
+        # Choose random orientation for the object.
+        theta = 360.0 * rng.random()
+        if neighbor_radius is None:
+            positions.append((x, y, r))
+        else:
+            positions.add(x, y, r)
+
+        # Choose a random material
+        if object_codes is None:
+            material = rng.randrange(len(props.materials))
+        else:
+            material = object_codes[i]['material']
+
+        layout.append({
+            'shape': shape,
+            'color': color,
+            'material': material,
+            'size': size,
+            'x': x,
+            'y': y,
+            'r': r,
+            'theta': theta,
+        })
+    return layout
+
+
+def position_is_free(x, y, r, positions, directions, min_dist=0.25, margin=0.4):
+    """
+    Check that a new object is further than min_dist from all placed (x, y, r)
+    positions, and further than margin along the four cardinal directions
+    """
+    for (xx, yy, rr) in positions:
+        dx, dy = x - xx, y - yy
+        dist = math.sqrt(dx * dx + dy * dy)
+        if dist - r - rr < min_dist:
+            return False
+        for direction_name in ['left', 'right', 'front', 'behind']:
+            direction_vec = directions[direction_name]
+            assert direction_vec[2] == 0
+            m = dx * direction_vec[0] + dy * direction_vec[1]
+            if 0 < m < margin:
+                return False
+    return True
+
+
+def position_is_free_near(x, y, r, grid, directions, min_dist=0.25, margin=0.4,
+                          neighbor_radius=1.0):
+    """
+    position_is_free against the placed objects of an OccupancyGrid, with the
+    margin only enforced for objects closer than neighbor_radius
+    """
+    reach = max(neighbor_radius, r + grid.max_r + min_dist)
+    for (xx, yy, rr) in grid.near(x, y, reach):
+        dx, dy = x - xx, y - yy
+        dist = math.sqrt(dx * dx + dy * dy)
+        if dist - r - rr < min_dist:
+            return False
+        if dist >= neighbor_radius:
+            continue
+        for direction_name in ['left', 'right', 'front', 'behind']:
+            direction_vec = directions[direction_name]
+            m = dx * direction_vec[0] + dy * direction_vec[1]
+            if 0 < m < margin:
+                return False
+    return True
+
+
+def compute_all_relationships(scene_struct, eps=0.2):
+    """
+    Computes relationships between all pairs of objects in the scene.
+
+    Returns a dictionary mapping string relationship names to lists of
+    integers, where output[rel][i] gives a list of object indices that have the
+    relationship rel with object i. For example if j is in output['left'][i] then
+    object j is left of object i.
+    """
+    all_relationships = {}
+    for name, direction_vec in scene_struct['directions'].items():
+        if name == 'above' or name == 'below': continue
+        all_relationships[name] = []
+        for i, obj1 in enumerate(scene_struct['objects']):
+            coords1 = obj1['3d_coords']
+            related = set()
+            for j, obj2 in enumerate(scene_struct['objects']):
+                if obj1 == obj2: continue
+                coords2 = obj2['3d_coords']
+                diff = [coords2[k] - coords1[k] for k in [0, 1, 2]]
+                dot = sum(diff[k] * direction_vec[k] for k in [0, 1, 2])
+                if dot > eps:
+                    related.add(j)
+            all_relationships[name].append(sorted(list(related)))
+    return all_relationships
+
+
+def compute_relationships_batch(positions, directions, eps=0.2):
+    """
+    Vectorized version of compute_all_relationships for an array of 3D object
+    positions and a dictionary of directions, e.g. of one camera view. Returns
+    the same dictionary of lists of object indices.
+    """
+    coords = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    # diff[i, j] = coords[j] - coords[i]
+    diff = coords[None, :, :] - coords[:, None, :]
+    all_relationships = {}
+    for name, direction_vec in directions.items():
+        if name == 'above' or name == 'below': continue
+        related = (diff @ np.asarray(direction_vec, dtype=np.float64)) > eps
+        np.fill_diagonal(related, False)
+        all_relationships[name] = [np.flatnonzero(row).tolist() for row in related]
+    return all_relationships
+
+
+def sample_trajectories(layout, num_frames, max_travel=1.5, min_dist=0.25, max_tries=50,
+                        rng=random):
+    """
+    Plan straight-line motions for the objects of a layout over num_frames
+    frames, starting at their layout positions. Every object moves at most
+    max_travel, stays on the [-3, 3] placement area and keeps further than
+    min_dist from all other objects during the whole motion (the margin of
+    sample_layout only applies to the first frame, since objects passing each
+    other is the point of a sequence). An object without a free motion after
+    max_tries attempts stays in place.
+
+    Returns an array of shape (num_frames, num_objects, 2) with the ground
+    plane positions in every frame.
+    """
+    n = len(layout)
+    start = np.array([[spec['x'], spec['y']] for spec in layout], dtype=np.float64).reshape(n, 2)
+    radius = np.array([spec['r'] for spec in layout], dtype=np.float64)
+    motion = np.zeros((n, 2))
+    for i in range(n):
+        # objects after i have not moved yet and are checked at their start
+        others = np.arange(n) != i
+        for _ in range(max_tries):
+            angle = rng.uniform(0, 2 * math.pi)
+            dist = rng.uniform(0, max_travel)
+            v = dist * np.array([math.cos(angle), math.sin(angle)])
+            end = start[i] + v
+            if np.any(np.abs(end) > 3):
+                continue
+            gap = min_track_distance(start[i], v, start[others], motion[others]) \
+                - radius[i] - radius[others]
+            if np.all(gap >= min_dist):
+                motion[i] = v
+                break
+    t = np.linspace(0.0, 1.0, num_frames)
+    return start[None, :, :] + t[:, None, None] * motion[None, :, :]
+
+
+def min_track_distance(p, v, q, w):
+    """
+    Closest distance between a point moving from p by v and points moving from
+    q[k] by w[k] over the same time interval, for all k at once
+    """
+    # relative motion d(t) = d0 + t * dv for t in [0, 1]
+    d0 = p[None, :] - q
+    dv = v[None, :] - w
+    speed = np.einsum('ij,ij->i', dv, dv)
+    t = np.where(speed > 0, -np.einsum('ij,ij->i', d0, dv) / np.where(speed > 0, speed, 1.0), 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.linalg.norm(d0 + t[:, None] * dv, axis=1)
+
+
+def compute_relationships_frames(positions, directions, eps=0.2):
+    """
+    Relationships of every frame of a sequence, for an array of object
+    positions of shape (num_frames, num_objects, 3). All frames are computed in
+    one vectorized step; returns a list with one dictionary per frame in the
+    format of compute_all_relationships.
+    """
+    coords = np.asarray(positions, dtype=np.float64)
+    # diff[f, i, j] = coords[f, j] - coords[f, i]
+    diff = coords[:, None, :, :] - coords[:, :, None, :]
+    n = coords.shape[1]
+    frames = [{} for _ in range(coords.shape[0])]
+    for name, direction_vec in directions.items():
+        if name == 'above' or name == 'below': continue
+        related = (diff @ np.asarray(direction_vec, dtype=np.float64)) > eps
+        related[:, np.arange(n), np.arange(n)] = False
+        for f, frame_related in enumerate(related):
+            frames[f][name] = [np.flatnonzero(row).tolist() for row in frame_related]
+    return frames
@@ -0,0 +1,123 @@
+import argparse, json
+
+import numpy as np
+
+import columnar
+
+"""
+Indexed queries over generated scene graphs. SceneIndex is built on top of a
+columnar store (see columnar.py) and keeps
+
+- an inverted index from every (attribute, value) pair to the sorted object
+  rows that have it, and
+- for every relationship a bitset per object row, where bit j of row r is set
+  if scene-local object j is in relationships[name][r] of that row,
+
+so that queries such as "a large metal cube left of a red sphere" are answered
+with a few vectorized NumPy operations instead of a scan over the JSON.
+
+Example:
+
+    index = SceneIndex(columnar.ColumnarStore("output/columnar"))
+    index.scenes(shape="cube", size="large")
+    index.scenes_related(dict(size="large", material="metal", shape="cube"),
+                         "left", dict(color="red", shape="sphere"))
+"""
+
+WORD_BITS = 64
+
+
+class SceneIndex:
+
+    def __init__(self, store):
+        self.store = store
+        objects = store.objects
+        self.object_scene = np.asarray(objects["scene"], dtype=np.int64)
+        self.local_index = (np.arange(len(objects), dtype=np.int64) -
+                            np.asarray(store.scene_indptr, dtype=np.int64)[self.object_scene])
+        max_objects = int(np.diff(store.scene_indptr).max()) if len(store) else 0
+        self.num_words = max(1, -(-max_objects // WORD_BITS))
+
+        # inverted index: attribute -> list of posting lists, one per value code
+        self.postings = {}
+        for attr, names in store.vocabularies.items():
+            codes = np.asarray(objects[attr])
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+            self.postings[attr] = [order[bounds[c]:bounds[c + 1]] for c in range(len(names))]
+
+        # relation adjacency bitsets: relation -> (num_objects, num_words) uint64
+        self.bitsets = {}
+        for name, (indptr, indices) in store.relations.items():
+            rows = np.repeat(np.arange(len(objects), dtype=np.int64), np.diff(indptr))
+            indices = np.asarray(indices, dtype=np.int64)
+            bits = np.zeros((len(objects), self.num_words), dtype=np.uint64)
+            np.bitwise_or.at(bits, (rows, indices // WORD_BITS),
+                             np.left_shift(np.uint64(1), (indices % WORD_BITS).astype(np.uint64)))
+            self.bitsets[name] = bits
+
+    def objects(self, **attrs):
+        """ Sorted object rows matching all given attribute values """
+        rows = None
+        for attr, name in attrs.items():
+            posting = self.postings[attr][self.store.code(attr, name)]
+            rows = posting if rows is None else np.intersect1d(rows, posting, assume_unique=True)
+        if rows is None:
+            return np.arange(len(self.object_scene))
+        return np.sort(rows)
+
+    def scene_bitsets(self, rows):
+        """ Per-scene bitsets of the scene-local indices of the given object rows """
+        bits = np.zeros((len(self.store), self.num_words), dtype=np.uint64)
+        local = self.local_index[rows]
+        np.bitwise_or.at(bits, (self.object_scene[rows], local // WORD_BITS),
+                         np.left_shift(np.uint64(1), (local % WORD_BITS).astype(np.uint64)))
+        return bits
+
+    def image_indices(self, scenes):
+        return np.asarray(self.store.image_index)[np.unique(scenes)]
+
+    def scenes(self, **attrs):
+        """ image_index of all scenes containing an object with the given attributes """
+        return self.image_indices(self.object_scene[self.objects(**attrs)])
+
+    def related_rows(self, subject, relation, anchor):
+        """
+        Object rows of the anchors that have at least one subject in the given
+        relation, i.e. some object matching subject is in relationships[relation]
+        of the anchor. For example subject=dict(shape="cube"), relation="left",
+        anchor=dict(shape="sphere") gives spheres that have a cube left of them.
+        """
+        subject_bits = self.scene_bitsets(self.objects(**subject))
+        anchors = self.objects(**anchor)
+        hits = self.bitsets[relation][anchors] & subject_bits[self.object_scene[anchors]]
+        return anchors[hits.any(axis=1)]
+
+    def scenes_related(self, subject, relation, anchor):
+        """ image_index of scenes where an object matching subject is relation of anchor """
+        return self.image_indices(self.object_scene[self.related_rows(subject, relation, anchor)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store', help="Columnar store directory written by columnar.py")
+    parser.add_argument('--subject', default='{}',
+                        help="JSON object with the attributes of the subject, e.g. " +
+                             "'{\"shape\": \"cube\", \"size\": \"large\"}'")
+    parser.add_argument('--relation', default=None,
+                        help="Relationship name (left, right, front, behind); without it, " +
+                             "scenes containing the subject are returned.")
+    parser.add_argument('--anchor', default='{}',
+                        help="JSON object with the attributes of the anchor object")
+    args = parser.parse_args()
+    index = SceneIndex(columnar.ColumnarStore(args.store))
+    if args.relation is None:
+        result = index.scenes(**json.loads(args.subject))
+    else:
+        result = index.scenes_related(json.loads(args.subject), args.relation,
+                                      json.loads(args.anchor))
+    print(json.dumps(result.tolist()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse, collections, io, json, os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import columnar
+import shards
+
+"""
+Memory-mapped image reader for training pipelines. Rendered PNGs are decoded
+once by pack_images and stored as uint8 arrays of shape (N, H, W, 4) in one or
+more chunk files:
+
+    images_00000.npy ... images_<k>.npy     image chunks (at most chunk_size rows each)
+    images.json                             image shape, chunk size and image_index per row
+
+ImageReader memory-maps the chunks, so indexing returns NumPy views into the
+page cache instead of decoding a PNG per sample. Object masks stored in the
+columnar annotations are decoded in batches from their RLE strings.
+"""
+
+META_FILENAME = "images.json"
+
+
+def iter_images(source):
+    """
+    Iterate over (image_index, encoded png bytes) of a dataset. source can be a
+    shard directory or a directory with *.render.png files.
+    """
+    source = Path(source)
+    if shards.is_shard_dir(source):
+        with shards.ShardReader(source) as reader:
+            for index in reader.indices():
+                yield index, reader.read_image(index)
+    else:
+        for fn in sorted(os.listdir(str(source))):
+            # skip counterfactual variants such as 00000.v0.render.png
+            if not fn.endswith(".render.png") or fn.count(".") != 2: continue
+            with open(str(source / fn), "rb") as f:
+                yield int(fn.split(".")[0]), f.read()
+
+
+def decode_png(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+
+def pack_images(images, out_dir, num_images, shape=(320, 320, 4), chunk_size=None):
+    """
+    Decode num_images (image_index, png bytes) pairs into memory-mapped chunk
+    files. With chunk_size=None all images go into a single file.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunk_size = chunk_size or max(num_images, 1)
+    image_index = []
+    chunk = None
+    for row, (index, data) in enumerate(images):
+        if row == num_images:
+            break
+        if row % chunk_size == 0:
+            if chunk is not None:
+                chunk.flush()
+            rows = min(chunk_size, num_images - row)
+            chunk = np.lib.format.open_memmap(
+                str(out_dir / ("images_%s.npy" % str(row // chunk_size).zfill(5))),
+                mode="w+", dtype=np.uint8, shape=(rows,) + tuple(shape))
+        img = decode_png(data)
+        if img.shape != tuple(shape):
+            raise ValueError("Image %d has shape %s, expected %s" % (index, img.shape, tuple(shape)))
+        chunk[row % chunk_size] = img
+        image_index.append(index)
+    if chunk is not None:
+        chunk.flush()
+    if len(image_index) != num_images:
+        raise ValueError("Expected %d images, found %d" % (num_images, len(image_index)))
+    meta = {
+        "shape": list(shape),
+        "chunk_size": chunk_size,
+        "num_images": num_images,
+        "image_index": image_index,
+    }
+    with open(str(out_dir / META_FILENAME), "w") as f:
+        json.dump(meta, f)
+
+
+class ImageReader:
+    """
+    Zero-copy, index-based access to packed images. If a columnar annotation
+    store is given (see columnar.py), scene(i) returns the annotation of row i.
+    """
+
+    def __init__(self, pack_dir, annotations=None):
+        pack_dir = Path(pack_dir)
+        with open(str(pack_dir / META_FILENAME), "r") as f:
+            self.meta = json.load(f)
+        self.chunk_size = self.meta["chunk_size"]
+        num_chunks = -(-self.meta["num_images"] // self.chunk_size)
+        self.chunks = [np.load(str(pack_dir / ("images_%s.npy" % str(c).zfill(5))), mmap_mode="r")
+                       for c in range(num_chunks)]
+        self.image_index = np.array(self.meta["image_index"], dtype=np.int64)
+        self.annotations = None
+        if annotations is not None:
+            self.annotations = columnar.ColumnarStore(annotations)
+            # rows of the annotation store are matched to images by image_index,
+            # -1 for images without an annotation
+            order = np.argsort(self.annotations.image_index)
+            pos = np.searchsorted(self.annotations.image_index, self.image_index, sorter=order)
+            self.scene_rows = np.full(len(self.image_index), -1, dtype=np.int64)
+            if len(order):
+                rows = order[np.minimum(pos, len(order) - 1)]
+                found = self.annotations.image_index[rows] == self.image_index
+                self.scene_rows[found] = rows[found]
+
+    def __len__(self):
+        return self.meta["num_images"]
+
+    def __getitem__(self, i):
+        """ View of image row i with shape (H, W, 4) """
+        if i < 0:
+            i += len(self)
+        return self.chunks[i // self.chunk_size][i % self.chunk_size]
+
+    def batch(self, start, stop):
+        """
+        Images [start, stop) as one array. This is a view whenever the range
+        lies inside a single chunk and a copy otherwise.
+        """
+        c0, c1 = start // self.chunk_size, (stop - 1) // self.chunk_size
+        if c0 == c1:
+            return self.chunks[c0][start - c0 * self.chunk_size:stop - c0 * self.chunk_size]
+        return np.concatenate([self.batch(max(start, c * self.chunk_size),
+                                          min(stop, (c + 1) * self.chunk_size))
+                               for c in range(c0, c1 + 1)])
+
+    def take(self, indices):
+        """
+        Images at arbitrary row indices. Consecutive indices are served as a view
+        via batch(); anything else is gathered into a new array.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) > 0 and np.all(np.diff(indices) == 1):
+            return self.batch(int(indices[0]), int(indices[-1]) + 1)
+        out = np.empty((len(indices),) + tuple(self.meta["shape"]), dtype=np.uint8)
+        for k, i in enumerate(indices):
+            out[k] = self[int(i)]
+        return out
+
+    def scene(self, i):
+        """ Scene annotation of image row i, decoded from the columnar store """
+        return self.annotations.decode_scene(self._scene_row(i))
+
+    def masks(self, i, field="mask"):
+        """ Boolean masks (N, H, W) of the objects of image row i, "mask" or "amodal_mask" """
+        return self.annotations.scene_masks(self._scene_row(i), field)
+
+    def index_maps(self, indices):
+        """ Object index maps (B, H, W) of image rows, decoded in one batch """
+        return self.annotations.index_maps([self._scene_row(i) for i in indices])
+
+    def _scene_row(self, i):
+        row = int(self.scene_rows[i])
+        if row < 0:
+            raise KeyError("Image %d has no annotation in the columnar store"
+                           % self.image_index[i])
+        return row
+
+    def prefetch(self, batch_size, indices=None, num_workers=4, depth=None):
+        """
+        Iterate over batches of images, gathering the next batches on a thread
+        pool while the current one is being consumed. Gathering touches the
+        memory-mapped pages, so disk reads overlap with training.
+        """
+        if indices is None:
+            indices = np.arange(len(self))
+        depth = depth or 2 * num_workers
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            pending = collections.deque()
+            for start in range(0, len(indices), batch_size):
+                pending.append(pool.submit(self._load, indices[start:start + batch_size]))
+                if len(pending) >= depth:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _load(self, indices):
+        batch = self.take(indices)
+        # fault the pages in on the worker thread instead of the consumer
+        np.ascontiguousarray(batch).sum(dtype=np.uint64)
+        return batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help="Shard directory or directory with *.render.png files")
+    parser.add_argument('out_dir', help="Directory where the packed image chunks are written")
+    parser.add_argument('--num_images', type=int, required=True,
+                        help="Number of images to pack")
+    parser.add_argument('--resolution', default=320, type=int,
+                        help="Width and height of the rendered images")
+    parser.add_argument('--chunk_size', default=None, type=int,
+                        help="Maximum number of images per chunk file; default is one file")
+    args = parser.parse_args()
+    pack_images(iter_images(args.source), args.out_dir, args.num_images,
+                shape=(args.resolution, args.resolution, 4), chunk_size=args.chunk_size)
+    print('==> Packed %d images into "%s".' % (args.num_images, args.out_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json, os, resource, time
+
+import bpy
+
+"""
+Resource tracking for long generation runs. After every image the number of
+data-blocks in each bpy.data collection, the number of orphan data-blocks
+(no users left) and the resident set size of the process are recorded. A
+warning is printed when a count or the RSS grows past a threshold relative to
+the first image, and orphans can optionally be purged every N images. The
+records are written as JSON Lines, one per image, so a test run shows whether
+memory stays bounded before committing to a long job.
+"""
+
+COLLECTIONS = ["objects", "meshes", "materials", "node_groups", "images", "textures",
+               "cameras", "lights", "collections"]
+
+
+def process_rss():
+    """ Current resident set size of this process in bytes """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # peak instead of current RSS, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def count_blocks():
+    """ Number of data-blocks and orphan data-blocks per bpy.data collection """
+    counts, orphans = {}, {}
+    for name in COLLECTIONS:
+        coll = getattr(bpy.data, name, None)
+        if coll is None:
+            continue
+        counts[name] = len(coll)
+        orphans[name] = sum(1 for item in coll if item.users == 0 and not item.use_fake_user)
+    return counts, orphans
+
+
+def purge_orphans():
+    """ Remove all data-blocks without users, including ones orphaned by the removal """
+    if hasattr(bpy.data, "orphans_purge"):
+        bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+    else:
+        bpy.ops.outliner.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+
+
+class ResourceTracker:
+    """
+    Per-image record of bpy.data block counts, orphans and RSS.
+
+    - warn_blocks: warn when a collection holds this many more blocks than after the first image
+    - warn_rss: warn when the RSS exceeds the one after the first image by this many bytes
+    - purge_interval: purge orphans every purge_interval images, 0 to disable
+    """
+
+    def __init__(self, log_path=None, warn_blocks=100, warn_rss=512 << 20, purge_interval=0):
+        self.log_path = log_path
+        self.warn_blocks = warn_blocks
+        self.warn_rss = warn_rss
+        self.purge_interval = purge_interval
+        self.warned = set()
+        self.num_images = 0
+        self.baseline = self.last = None
+
+    def record(self, index):
+        """ Record the resources after image index was finished; returns the record """
+        self.num_images += 1
+        purged = 0
+        if self.purge_interval > 0 and self.num_images % self.purge_interval == 0:
+            before = sum(count_blocks()[0].values())
+            purge_orphans()
+            purged = before - sum(count_blocks()[0].values())
+        counts, orphans = count_blocks()
+        entry = {
+            "index": index,
+            "time": time.time(),
+            "rss": process_rss(),
+            "blocks": counts,
+            "orphans": orphans,
+            "purged": purged,
+        }
+        if self.baseline is None:
+            self.baseline = entry
+        else:
+            self.check(entry)
+        self.last = entry
+        if self.log_path is not None:
+            with open(str(self.log_path), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def check(self, entry):
+        """ Print a warning the first time a threshold is passed """
+        for name, count in entry["blocks"].items():
+            growth = count - self.baseline["blocks"].get(name, 0)
+            if growth > self.warn_blocks and name not in self.warned:
+                self.warned.add(name)
+                print('==> Warning: bpy.data.%s grew by %d blocks (%d orphans) after %d images.'
+                      % (name, growth, entry["orphans"][name], self.num_images))
+        growth = entry["rss"] - self.baseline["rss"]
+        if growth > self.warn_rss and "rss" not in self.warned:
+            self.warned.add("rss")
+            print('==> Warning: RSS grew by %.1f MB after %d images.'
+                  % (growth / (1 << 20), self.num_images))
+
+    def summary(self):
+        """ Average growth per image of the RSS and of every collection """
+        if self.baseline is None or self.num_images < 2:
+            return {}
+        n = self.num_images - 1
+        summary = {"rss_per_image": (self.last["rss"] - self.baseline["rss"]) / n}
+        for name, count in self.last["blocks"].items():
+            summary[name + "_per_image"] = (count - self.baseline["blocks"].get(name, 0)) / n
+        return summary
@@ -0,0 +1,185 @@
+import numpy as np
+
+"""
+COCO-style run-length encoding of object masks, stored inline in the scene
+annotations instead of one mask PNG per object. A mask is encoded as
+{"size": [H, W], "counts": str}: the run lengths of alternating 0 and 1
+pixels in column-major order, starting with 0 pixels, compressed into a string
+exactly like pycocotools does, so the annotations can be used with the COCO
+API directly.
+
+Encoding and decoding handle all objects of a scene in one vectorized NumPy
+pass, without Python loops over pixels, runs or characters:
+
+- encode_index_map encodes the visible masks of all objects from the object
+  index map of masks.render_masks (0 = background, k + 1 = object k),
+- encode_masks encodes a stack of possibly overlapping (e.g. amodal) masks,
+- decode_masks and decode_index_map are the batched inverses.
+"""
+
+
+def runs_to_rles(counts, num_runs, size):
+    """ RLE dicts from the concatenated run lengths of several masks """
+    strings = compress(counts, num_runs)
+    return [{"size": list(size), "counts": s} for s in strings]
+
+
+def encode_index_map(index_map, num_objects):
+    """
+    RLEs of the masks index_map == k + 1 of all num_objects objects. Since
+    the masks are disjoint, the runs of all objects are read off one scan of
+    the changes of the column-major index map.
+    """
+    h, w = index_map.shape
+    flat = np.ascontiguousarray(np.asarray(index_map).T).ravel()
+    # segments of constant value: [starts[s], ends[s]) with label labels[s]
+    starts = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1])
+    ends = np.concatenate([starts[1:], [flat.size]])
+    labels = flat[starts].astype(np.int64) - 1
+    keep = (labels >= 0) & (labels < num_objects)
+    starts, ends, labels = starts[keep], ends[keep], labels[keep]
+    order = np.argsort(labels, kind="stable")
+    return segments_to_rles(starts[order], ends[order], labels[order], num_objects, (h, w))
+
+
+def encode_masks(masks):
+    """ RLEs of a stack of boolean masks of shape (N, H, W), possibly overlapping """
+    masks = np.asarray(masks, dtype=bool)
+    n, h, w = masks.shape
+    # column-major masks separated by 0 pixels in one buffer, so that changes
+    # alternate between the start and the end of a run of 1 pixels
+    stride = h * w + 1
+    flat = np.zeros(n * stride + 1, dtype=bool)
+    flat[1:].reshape(n, stride)[:, :-1] = masks.transpose(0, 2, 1).reshape(n, h * w)
+    changes = np.flatnonzero(flat[1:] != flat[:-1])
+    labels = changes // stride
+    pixels = changes - labels * stride
+    return segments_to_rles(pixels[0::2], pixels[1::2], labels[0::2], n, (h, w))
+
+
+def segments_to_rles(starts, ends, labels, num_masks, size):
+    """
+    RLEs of num_masks masks from their runs of 1 pixels [starts, ends), grouped
+    by mask label and in pixel order within every label
+    """
+    total = size[0] * size[1]
+    first = np.ones(len(labels), dtype=bool)
+    first[1:] = labels[1:] != labels[:-1]
+    # end of the previous run of the same mask, 0 before the first one
+    prev_ends = np.where(first, 0, np.concatenate([[0], ends[:-1]]))
+    segments_per_mask = np.bincount(labels, minlength=num_masks)
+    last = np.cumsum(segments_per_mask) - 1
+    last_ends = np.where(segments_per_mask > 0, ends[np.maximum(last, 0)] if len(ends) else 0, 0)
+
+    # every mask is zeros, ones, zeros, ones, ..., with a last run of zeros
+    # only if the mask does not end with ones
+    trailing = last_ends < total
+    num_runs = 2 * segments_per_mask + trailing
+    run_starts = np.cumsum(num_runs) - num_runs
+    counts = np.empty(num_runs.sum(), dtype=np.int64)
+    position = run_starts[labels] + 2 * (np.arange(len(labels)) - (np.cumsum(segments_per_mask)
+                                                                     - segments_per_mask)[labels])
+    counts[position] = starts - prev_ends
+    counts[position + 1] = ends - starts
+    counts[(run_starts + num_runs - 1)[trailing]] = (total - last_ends)[trailing]
+    return runs_to_rles(counts, num_runs, size)
+
+
+def compress(counts, num_runs):
+    """
+    COCO string compression of several run length lists at once: every count
+    (minus the count two before it, from the fourth on) is written as 5-bit
+    chunks with a continuation bit, offset by 48 into printable characters
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(counts) == 0:
+        return []
+    run_starts = np.cumsum(num_runs) - num_runs
+    local = np.arange(len(counts)) - np.repeat(run_starts, num_runs)
+    x = counts.copy()
+    delta = local > 2
+    x[delta] -= counts[np.flatnonzero(delta) - 2]
+
+    chunks, active = [], np.ones(len(x), dtype=bool)
+    while active.any():
+        c = x & 0x1f
+        x = x >> 5
+        more = np.where(c & 0x10, x != -1, x != 0) & active
+        chunks.append(np.where(more, c | 0x20, c) + 48)
+        chunks[-1][~active] = -1
+        active = more
+    chars = np.stack(chunks, axis=1)
+    valid = chars >= 0
+    data = chars[valid].astype(np.uint8).tobytes().decode("ascii")
+    lengths = np.add.reduceat(valid.sum(axis=1), run_starts)
+    bounds = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    return [data[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def decompress(strings):
+    """ Run length lists of several COCO strings, concatenated, and their lengths """
+    data = np.frombuffer("".join(strings).encode("ascii"), dtype=np.uint8).astype(np.int64) - 48
+    lengths = np.array([len(s) for s in strings], dtype=np.int64)
+    # a count ends at every chunk without the continuation bit
+    ends = np.flatnonzero((data & 0x20) == 0)
+    first = np.concatenate([[0], ends[:-1] + 1])
+    chunk = np.arange(len(data)) - np.repeat(first, ends - first + 1)
+    values = np.zeros(len(ends), dtype=np.int64)
+    np.add.at(values, np.repeat(np.arange(len(ends)), ends - first + 1), (data & 0x1f) << (5 * chunk))
+    # sign extension of the last chunk
+    negative = (data[ends] & 0x10) != 0
+    values[negative] |= -1 << (5 * (ends - first + 1))[negative]
+
+    num_runs = np.bincount(np.searchsorted(np.cumsum(lengths), ends, side="right"),
+                           minlength=len(strings))
+    run_starts = np.cumsum(num_runs) - num_runs
+    local = np.arange(len(values)) - np.repeat(run_starts, num_runs)
+    # undo the deltas: from the fourth count on, counts[i] = delta[i] + counts[i - 2],
+    # so the even and odd counts of a mask form chains (0), (2, 4, ...) and (1, 3, ...)
+    # whose counts are cumulative sums
+    group = 2 * np.repeat(np.arange(len(strings)), num_runs) + local % 2
+    order = np.lexsort((local, group))
+    v = values[order]
+    chain_start = local[order] <= 2
+    sums = np.cumsum(v)
+    counts = np.empty_like(values)
+    counts[order] = sums - (sums - v)[chain_start][np.cumsum(chain_start) - 1]
+    return counts, num_runs
+
+
+def one_runs(rles):
+    """ Mask number, start and end pixel of every run of 1 pixels of the RLEs """
+    counts, num_runs = decompress([r["counts"] for r in rles])
+    run_starts = np.cumsum(num_runs) - num_runs
+    local = np.arange(len(counts)) - np.repeat(run_starts, num_runs)
+    # pixel position where every run ends, within its mask
+    ends = np.cumsum(counts)
+    ends -= np.repeat(ends[run_starts] - counts[run_starts], num_runs)
+    ones = local % 2 == 1
+    return np.repeat(np.arange(len(rles)), num_runs)[ones], (ends - counts)[ones], ends[ones]
+
+
+def decode_masks(rles):
+    """ Boolean masks of shape (N, H, W) of a list of RLEs of the same size """
+    if not rles:
+        return np.zeros((0, 0, 0), dtype=bool)
+    h, w = rles[0]["size"]
+    counts, num_runs = decompress([r["counts"] for r in rles])
+    run_starts = np.cumsum(num_runs) - num_runs
+    local = np.arange(len(counts)) - np.repeat(run_starts, num_runs)
+    # runs alternate between 0 and 1 pixels, starting with 0 in every mask
+    flat = np.repeat(local % 2 == 1, counts)
+    return flat.reshape(len(rles), w, h).transpose(0, 2, 1)
+
+
+def decode_index_map(rles):
+    """ Object index map (0 = background, k + 1 = object k) of disjoint masks """
+    if not rles:
+        return np.zeros((0, 0), dtype=np.int32)
+    h, w = rles[0]["size"]
+    labels, starts, ends = one_runs(rles)
+    # the label is added where a run starts and subtracted where it ends
+    edges = np.zeros(h * w + 1, dtype=np.int32)
+    np.add.at(edges, starts, labels + 1)
+    np.add.at(edges, ends, -(labels + 1))
+    return np.cumsum(edges[:-1], dtype=np.int32).reshape(w, h).T
@@ -0,0 +1,207 @@
+import io, json, os, tarfile, time
+from pathlib import Path
+
+"""
+WebDataset-style tar shard output. Instead of writing one PNG and one JSON per
+image into a flat output directory, rendered images and their scene annotations
+are streamed into fixed-size tar shards with sequential member names:
+
+    shard-00000.tar: 00000.png 00000.json 00001.png 00001.json ...
+    shard-00001.tar: ...
+
+Every member that is written is also appended to the index file of its shard
+prefix, "index.<prefix>.jsonl" (shard, byte offset and size of the member
+data), so that single samples can be read back with one seek instead of
+scanning the tar. Every writer has its own index file, as appends of several
+clients to one file on a network filesystem can interleave; readers merge all
+index files of the directory, including the "index.jsonl" of older datasets.
+"""
+
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def index_filename(prefix):
+    """ Index file of the shards with a prefix, e.g. index.shard-w0.jsonl """
+    return "index.%s.jsonl" % prefix
+
+
+def index_paths(shard_dir):
+    """ Index files of a shard directory, oldest first so that later entries take precedence """
+    shard_dir = Path(shard_dir)
+    if not shard_dir.is_dir():
+        return []
+    paths = [shard_dir / fn for fn in os.listdir(str(shard_dir))
+             if fn.startswith("index.") and fn.endswith(".jsonl")]
+    return sorted(paths, key=lambda path: (path.stat().st_mtime, path.name))
+
+
+def is_shard_dir(path):
+    """ Whether path is a directory of tar shards with at least one index file """
+    return len(index_paths(path)) > 0
+
+
+def member_key(index):
+    """ Sequential member name shared by the image and annotation of a sample """
+    return str(index).zfill(5)
+
+
+def closed_size(offset):
+    """ File size of a tar closed at offset: two end-of-archive blocks, padded to a full record """
+    return -(-(offset + 2 * TAR_BLOCK_SIZE) // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+
+
+class ShardWriter:
+    """
+    Stream samples into tar shards of at most max_shard_bytes each. A sample is
+    never split across two shards; a new shard is started whenever the next
+    sample would not fit into the current one.
+    """
+
+    def __init__(self, shard_dir, max_shard_bytes=1 << 30, prefix="shard"):
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.max_shard_bytes = max_shard_bytes
+        self.prefix = prefix
+        # continue after existing shards, so that re-rendered samples never
+        # overwrite earlier ones; later index entries take precedence. Shards
+        # of other prefixes (e.g. other workers) are left alone
+        numbers = [fn[len(prefix) + 1:-len(".tar")] for fn in os.listdir(str(self.shard_dir))
+                   if fn.startswith(prefix + "-") and fn.endswith(".tar")]
+        existing = [int(number) for number in numbers if number.isdigit()]
+        self.shard_id = max(existing, default=-1)
+        self.tar = None
+        self.index_file = open(str(self.shard_dir / index_filename(prefix)), "a")
+
+    def shard_name(self, shard_id):
+        return "%s-%s.tar" % (self.prefix, str(shard_id).zfill(5))
+
+    def _next_shard(self):
+        if self.tar is not None:
+            self.tar.close()
+        self.shard_id += 1
+        self.tar = tarfile.open(str(self.shard_dir / self.shard_name(self.shard_id)), "w")
+
+    def _header(self, name, size):
+        """ Header blocks tarfile writes for a member """
+        info = tarfile.TarInfo(name=name)
+        info.size = size
+        info.mtime = time.time()
+        return info.tobuf(tarfile.DEFAULT_FORMAT if self.tar is None else self.tar.format)
+
+    def _add_member(self, name, data):
+        info = tarfile.TarInfo(name=name)
+        info.size = len(data)
+        info.mtime = time.time()
+        self.tar.addfile(info, io.BytesIO(data))
+        # addfile leaves the offset behind the block-padded member data
+        padded_size = -(-len(data) // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+        return {
+            "name": name,
+            "shard": self.shard_name(self.shard_id),
+            "offset": self.tar.offset - padded_size,
+            "size": len(data),
+        }
+
+    def write_sample(self, index, members):
+        """
+        Write one sample. members maps an extension (e.g. "png", "json") to the
+        raw bytes of that member.
+        """
+        key = member_key(index)
+        # each member costs its header blocks plus its padded data
+        sample_bytes = sum(len(self._header("%s.%s" % (key, ext), len(d))) +
+                           -(-len(d) // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+                           for ext, d in members.items())
+        if self.tar is None or (self.tar.offset > 0 and
+                                closed_size(self.tar.offset + sample_bytes) > self.max_shard_bytes):
+            self._next_shard()
+        entries = [self._add_member("%s.%s" % (key, ext), data) for ext, data in members.items()]
+        # the member data must be on disk before the index points at it, or a
+        # crash can leave index entries for offsets the tar never received
+        self.tar.fileobj.flush()
+        os.fsync(self.tar.fileobj.fileno())
+        for entry in entries:
+            self.index_file.write(json.dumps(entry) + "\n")
+        self.index_file.flush()
+
+    def write(self, index, image_path, scene_struct, extra_images=None):
+        """
+        Write a rendered image file and its scene annotation as one sample.
+        extra_images maps additional member extensions (e.g. "v0.png") to image
+        files that belong to the same sample.
+        """
+        members = {}
+        for ext, path in [("png", image_path)] + sorted((extra_images or {}).items()):
+            with open(str(path), "rb") as f:
+                members[ext] = f.read()
+        members["json"] = json.dumps(scene_struct, indent=2).encode("utf-8")
+        self.write_sample(index, members)
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardReader:
+    """
+    Random access to samples written by ShardWriter, using the merged index
+    files to seek directly to member data.
+    """
+
+    def __init__(self, shard_dir):
+        self.shard_dir = Path(shard_dir)
+        self.entries = {}
+        for path in index_paths(self.shard_dir):
+            with open(str(path), "r") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    self.entries[entry["name"]] = entry
+        self._files = {}
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def names(self):
+        return list(self.entries.keys())
+
+    def indices(self):
+        """ Sorted sample indices that have at least one member in the shards """
+        return sorted({int(name.split(".")[0]) for name in self.entries})
+
+    def read(self, name):
+        entry = self.entries[name]
+        f = self._files.get(entry["shard"])
+        if f is None:
+            f = open(str(self.shard_dir / entry["shard"]), "rb")
+            self._files[entry["shard"]] = f
+        f.seek(entry["offset"])
+        return f.read(entry["size"])
+
+    def read_image(self, index):
+        """ Return the encoded PNG bytes of a sample """
+        return self.read("%s.png" % member_key(index))
+
+    def read_scene(self, index):
+        """ Return the decoded scene annotation of a sample """
+        return json.loads(self.read("%s.json" % member_key(index)).decode("utf-8"))
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
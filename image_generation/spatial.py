@@ -0,0 +1,190 @@
+import math
+
+import numpy as np
+
+"""
+Spatial index for crowded scenes with many objects. Objects are bucketed into
+a uniform grid on the ground plane, so radius queries only compare objects in
+neighboring cells instead of all pairs, and all pairs within a radius are found
+in one vectorized step. Placement and relationships of scenes with 50 to 200
+objects then cost about n log n instead of n^2 Python steps:
+
+- GridIndex answers radius and k-nearest neighbor queries for a fixed set of
+  (x, y) points,
+- OccupancyGrid holds the objects placed so far while a layout is sampled,
+- neighbor_relationships computes "near" and "touching" relations and the
+  directional relations limited to neighboring objects, in the format of
+  placement.compute_all_relationships.
+"""
+
+
+class GridIndex:
+    """ Uniform grid over a fixed array of (x, y) points """
+
+    def __init__(self, xy, cell_size):
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        self.cell_size = float(cell_size)
+        self.cells = np.floor(self.xy / self.cell_size).astype(np.int64)
+        self.keys = self.cell_keys(self.cells)
+        self.order = np.argsort(self.keys, kind="stable")
+        self.sorted_keys = self.keys[self.order]
+
+    @staticmethod
+    def cell_keys(cells):
+        # cells stay far below 2**31 for any ground plane in meters
+        return (cells[:, 0] << 32) + cells[:, 1]
+
+    def pairs_within(self, radius):
+        """
+        All pairs (i, j) with i < j of points closer than radius, as two index
+        arrays, without comparing points more than one cell apart
+        """
+        n = len(self.xy)
+        if n < 2:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        reach = max(int(math.ceil(radius / self.cell_size)), 1)
+        firsts, seconds = [], []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                # the points of cell (cx + dx, cy + dy) for every point
+                keys = self.cell_keys(self.cells + np.array([dx, dy]))
+                lo = np.searchsorted(self.sorted_keys, keys, side="left")
+                hi = np.searchsorted(self.sorted_keys, keys, side="right")
+                counts = hi - lo
+                first = np.repeat(np.arange(n), counts)
+                # position within each run of candidates
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                second = self.order[np.repeat(lo, counts) + offsets]
+                keep = first < second
+                firsts.append(first[keep])
+                seconds.append(second[keep])
+        first, second = np.concatenate(firsts), np.concatenate(seconds)
+        dist = np.linalg.norm(self.xy[first] - self.xy[second], axis=1)
+        keep = dist < radius
+        return first[keep], second[keep]
+
+    def query_radius(self, radius):
+        """ For every point, the sorted indices of all other points closer than radius """
+        first, second = self.pairs_within(radius)
+        return adjacency_lists(len(self.xy), first, second)
+
+    def knn(self, k):
+        """
+        For every point, the indices of its k nearest other points, nearest
+        first. The search radius grows until every point has k candidates.
+        """
+        n = len(self.xy)
+        k = min(k, n - 1)
+        if k <= 0:
+            return [[] for _ in range(n)]
+        radius = self.cell_size
+        while True:
+            first, second = self.pairs_within(radius)
+            found = np.bincount(first, minlength=n) + np.bincount(second, minlength=n)
+            if found.min() >= k:
+                break
+            radius *= 2
+        i = np.concatenate([first, second])
+        j = np.concatenate([second, first])
+        dist = np.linalg.norm(self.xy[i] - self.xy[j], axis=1)
+        order = np.lexsort((j, dist, i))
+        i, j = i[order], j[order]
+        starts = np.searchsorted(i, np.arange(n))
+        return [j[s:s + k].tolist() for s in starts]
+
+
+class OccupancyGrid:
+    """
+    Objects placed so far, as (x, y, r), bucketed into grid cells. Used by
+    placement.position_is_free to only compare a new object with the placed
+    objects near it.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.max_r = 0.0
+
+    def add(self, x, y, r):
+        key = (int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)))
+        self.cells.setdefault(key, []).append((x, y, r))
+        self.max_r = max(self.max_r, r)
+
+    def near(self, x, y, radius):
+        """ Placed objects whose centers may be closer than radius to (x, y) """
+        reach = int(math.ceil(radius / self.cell_size))
+        cx, cy = int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+        found = []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                found.extend(self.cells.get((cx + dx, cy + dy), ()))
+        return found
+
+
+def adjacency_lists(n, first, second, directed=False):
+    """
+    Sorted lists of related nodes of n nodes: second in the list of first for
+    every pair, and first in the list of second unless directed
+    """
+    if directed:
+        i, j = first, second
+    else:
+        i, j = np.concatenate([first, second]), np.concatenate([second, first])
+    order = np.lexsort((j, i))
+    i, j = i[order], j[order]
+    bounds = np.searchsorted(i, np.arange(n + 1))
+    return [j[a:b].tolist() for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def neighbor_pairs(index, radius, k=0):
+    """
+    Neighboring pairs (i, j) with i < j of the points of a GridIndex: centers
+    closer than radius, or one of the k nearest points of the other
+    """
+    first, second = index.pairs_within(radius)
+    if k > 0:
+        nearest = index.knn(k)
+        i = np.repeat(np.arange(len(index.xy)), [len(js) for js in nearest])
+        j = np.array([j for js in nearest for j in js], dtype=np.int64)
+        pairs = np.stack([np.concatenate([first, np.minimum(i, j)]),
+                          np.concatenate([second, np.maximum(i, j)])], axis=1)
+        pairs = np.unique(pairs, axis=0)
+        first, second = pairs[:, 0], pairs[:, 1]
+    return first, second
+
+
+def neighbor_relationships(positions, directions, radius, k=0, eps=0.2, touch_eps=0.05):
+    """
+    Relationships of a crowded scene, for an array of 3D object positions
+    whose z is the object radius (as in 3d_coords). Objects are neighbors if
+    their centers are closer than radius or one is among the k nearest objects
+    of the other. Returns the dictionary of compute_all_relationships, with
+    the directional relations limited to neighbors, plus:
+
+    - "near": the neighbors of every object,
+    - "touching": objects whose footprints are at most touch_eps apart.
+    """
+    coords = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    n = len(coords)
+    index = GridIndex(coords[:, :2], max(radius, 1e-6))
+    first, second = neighbor_pairs(index, radius, k)
+    # diff[p] = coords[second] - coords[first] of pair p
+    diff = coords[second] - coords[first]
+    all_relationships = {}
+    for name, direction_vec in directions.items():
+        if name == 'above' or name == 'below': continue
+        dot = diff @ np.asarray(direction_vec, dtype=np.float64)
+        # second is in the direction of first if dot > eps, first of second if dot < -eps
+        forward, backward = dot > eps, dot < -eps
+        all_relationships[name] = adjacency_lists(
+            n, np.concatenate([first[forward], second[backward]]),
+            np.concatenate([second[forward], first[backward]]), directed=True)
+    all_relationships['near'] = adjacency_lists(n, first, second)
+    if n > 1:
+        first, second = index.pairs_within(2 * coords[:, 2].max() + touch_eps)
+        gap = (np.linalg.norm(coords[second, :2] - coords[first, :2], axis=1)
+               - coords[first, 2] - coords[second, 2])
+        touching = gap <= touch_eps
+        first, second = first[touching], second[touching]
+    all_relationships['touching'] = adjacency_lists(n, first, second)
+    return all_relationships
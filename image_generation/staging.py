@@ -0,0 +1,203 @@
+import json, os, queue, shutil, socket, threading, time
+from pathlib import Path
+
+import shards
+import tracing
+
+"""
+Output staging for shared (network) storage. Per-file metadata round trips on
+a network filesystem slow the render loop down, so with --scratch_dir a worker
+renders into a directory on local scratch space, and a background thread
+publishes completed images to the output directory in batches:
+
+- files output: the files of a batch are copied under a temporary name and
+  renamed into place, so readers never see partial files,
+- shards output: a batch is packed into one tar shard locally, which is copied
+  and renamed into place before its entries are added to the index file of
+  the worker, "index.batch-<worker>.jsonl".
+
+After a batch is published it is added to the completion manifest of the
+worker, "published.<worker>.jsonl" in the output directory, and only then
+reported as finished through on_published, e.g. to the supervisor progress
+file. Images of a crashed worker that were not published yet are never
+reported, so they are rendered again. The index and the manifest of a worker
+are rewritten under a temporary name and renamed into place for every batch,
+instead of appending to files shared by all workers, since appends of several
+clients on a network filesystem can interleave.
+"""
+
+
+def published_filename(token):
+    """ Completion manifest of a worker, e.g. published.host-1234.jsonl """
+    return "published.%s.jsonl" % token
+
+
+def member_name(index, filename):
+    """
+    Shard member extension of an output file of image index, the inverse of
+    the names create_scene.py uses: 00000.render.png -> png,
+    00000.scene.json -> json, 00000.v0.render.png -> v0.png
+    """
+    parts = filename[len(shards.member_key(index)) + 1:].split(".")
+    if parts == ["render", "png"]:
+        return "png"
+    if parts == ["scene", "json"]:
+        return "json"
+    return "%s.%s" % (parts[0], parts[-1])
+
+
+class Stager:
+    """
+    Publish the outputs of rendered images from scratch_dir to output_dir on a
+    background thread, batch_size images at a time. stage() never waits for
+    the output directory; errors of the flusher are raised by the next stage()
+    or by close().
+    """
+
+    def __init__(self, output_dir, scratch_dir, batch_size=16, pack=False, retries=3, backoff=1.0,
+                 on_published=None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # one directory per worker, so that workers sharing a scratch disk never mix outputs
+        self.token = "%s-%d" % (socket.gethostname(), os.getpid())
+        self.scratch_dir = Path(scratch_dir) / self.token
+        self.scratch_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.pack = pack
+        self.retries = retries
+        self.backoff = backoff
+        self.on_published = on_published
+        self.batch = []
+        self.num_batches = 0
+        self.num_staged = 0
+        self.num_published = 0
+        # lines of the index and manifest files of this worker published so far
+        self.index_lines = []
+        self.published_lines = []
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stage(self, index):
+        """ Hand over the finished outputs of image index in the scratch directory """
+        if self.error is not None:
+            raise self.error
+        key = shards.member_key(index) + "."
+        paths = sorted(p for p in self.scratch_dir.iterdir() if p.name.startswith(key))
+        self.batch.append((index, paths))
+        self.num_staged += 1
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Queue the current batch for publishing """
+        if self.batch:
+            self.queue.put((self.num_batches, self.batch))
+            self.num_batches += 1
+            self.batch = []
+
+    def close(self):
+        """
+        Publish everything that was staged and stop the flusher. The scratch
+        directory is only removed once every staged image is published;
+        otherwise the unpublished outputs are kept and an error is raised.
+        """
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        if self.num_published != self.num_staged:
+            raise RuntimeError('Only %d of %d staged images were published, kept "%s"'
+                               % (self.num_published, self.num_staged, self.scratch_dir))
+        shutil.rmtree(str(self.scratch_dir), ignore_errors=True)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            batch_id, batch = item
+            # any error stops publishing, the flusher itself keeps draining the queue
+            try:
+                self._publish_with_retries(batch_id, batch)
+                for _, paths in batch:
+                    for path in paths:
+                        os.remove(str(path))
+                self.num_published += len(batch)
+                if self.on_published is not None:
+                    self.on_published([index for index, _ in batch])
+            except BaseException as e:
+                self.error = e
+
+    def _publish_with_retries(self, batch_id, batch):
+        """ Publish a batch, retrying errors of the output file system with a backoff """
+        for attempt in range(self.retries + 1):
+            try:
+                with tracing.span("publish", batch=batch_id, num_images=len(batch)):
+                    self._publish(batch_id, batch)
+                return
+            except OSError as e:
+                if attempt == self.retries:
+                    raise
+                print('Publishing batch %d failed (attempt %d of %d): %s'
+                      % (batch_id, attempt + 1, self.retries + 1, e))
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _publish(self, batch_id, batch):
+        if self.pack:
+            files = [self._publish_shard(batch_id, batch)]
+        else:
+            files = []
+            for _, paths in batch:
+                for path in paths:
+                    publish_file(path, self.output_dir / path.name)
+                    files.append(path.name)
+        entry = {"indices": [index for index, _ in batch], "files": files, "worker": self.token,
+                 "time": time.time()}
+        publish_text(self.published_lines + [json.dumps(entry) + "\n"],
+                     self.output_dir / published_filename(self.token))
+        self.published_lines.append(json.dumps(entry) + "\n")
+
+    def _publish_shard(self, batch_id, batch):
+        """ Pack a batch into one shard on scratch and publish it with its index entries """
+        pack_dir = self.scratch_dir / ("pack-%d" % batch_id)
+        shutil.rmtree(str(pack_dir), ignore_errors=True)
+        # one shard of unbounded size, named after the worker and the batch
+        prefix = "batch-%s-%s" % (self.token, str(batch_id).zfill(5))
+        writer = shards.ShardWriter(pack_dir, max_shard_bytes=1 << 62, prefix=prefix)
+        for index, paths in batch:
+            members = {}
+            for path in paths:
+                with open(str(path), "rb") as f:
+                    members[member_name(index, path.name)] = f.read()
+            writer.write_sample(index, members)
+        shard_name = writer.shard_name(writer.shard_id)
+        writer.close()
+        publish_file(pack_dir / shard_name, self.output_dir / shard_name)
+        # the index only ever refers to complete shards
+        with open(str(pack_dir / shards.index_filename(prefix)), "r") as f:
+            entries = f.readlines()
+        publish_text(self.index_lines + entries,
+                     self.output_dir / shards.index_filename("batch-" + self.token))
+        self.index_lines.extend(entries)
+        shutil.rmtree(str(pack_dir))
+        return shard_name
+
+
+def publish_file(src, dst):
+    """ Copy src to dst under a temporary name and rename it into place """
+    tmp = dst.parent / (".%s.tmp" % dst.name)
+    shutil.copyfile(str(src), str(tmp))
+    os.replace(str(tmp), str(dst))
+
+
+def publish_text(lines, dst):
+    """ Write lines to dst under a temporary name and rename it into place """
+    tmp = dst.parent / (".%s.tmp" % dst.name)
+    with open(str(tmp), "w") as f:
+        f.writelines(lines)
+    os.replace(str(tmp), str(dst))
@@ -0,0 +1,142 @@
+import argparse, json, os
+from pathlib import Path
+
+import numpy as np
+
+"""
+Streaming, mergeable dataset statistics. Every worker keeps a DatasetStats
+partial that is updated as scenes are emitted and periodically saved as an
+.npz file. All aggregates are counts or fixed-bin histograms, so partials of
+different workers are combined by adding arrays:
+
+python stats.py merge merged.npz output/stats/*.npz
+python stats.py show merged.npz
+"""
+
+MAX_OBJECTS = 256
+POSITION_BINS = 32
+POSITION_RANGE = 4.0
+OCCLUSION_BINS = 10
+
+
+class DatasetStats:
+    """
+    Partial aggregate of attribute histograms, object counts, ground plane and
+    image position heatmaps, relationship counts and occlusion levels.
+    """
+
+    def __init__(self, props, resolution=320):
+        self.vocabularies = {attr: list(names) for attr, names in props.names.items()}
+        self.codes = props.codes
+        self.resolution = resolution
+        self.arrays = {
+            "num_scenes": np.zeros(1, dtype=np.int64),
+            "object_counts": np.zeros(MAX_OBJECTS + 1, dtype=np.int64),
+            "positions": np.zeros((POSITION_BINS, POSITION_BINS), dtype=np.int64),
+            "pixel_positions": np.zeros((POSITION_BINS, POSITION_BINS), dtype=np.int64),
+            "occlusion": np.zeros(OCCLUSION_BINS, dtype=np.int64),
+        }
+        for attr, names in self.vocabularies.items():
+            self.arrays["attr_" + attr] = np.zeros(len(names), dtype=np.int64)
+
+    def update(self, scene_struct):
+        """ Add one scene annotation """
+        objects = scene_struct["objects"]
+        self.arrays["num_scenes"][0] += 1
+        self.arrays["object_counts"][min(len(objects), MAX_OBJECTS)] += 1
+        if not objects:
+            return
+        for attr in self.vocabularies:
+            np.add.at(self.arrays["attr_" + attr], [self.codes[attr][obj[attr]] for obj in objects], 1)
+
+        coords = np.array([obj["3d_coords"][:2] for obj in objects], dtype=np.float64)
+        bins = ((coords + POSITION_RANGE) / (2 * POSITION_RANGE) * POSITION_BINS).astype(np.int64)
+        np.add.at(self.arrays["positions"], tuple(np.clip(bins, 0, POSITION_BINS - 1).T), 1)
+        pixels = np.array([obj["pixel_coords"][:2] for obj in objects], dtype=np.float64)
+        bins = (pixels / self.resolution * POSITION_BINS).astype(np.int64)
+        np.add.at(self.arrays["pixel_positions"], tuple(np.clip(bins, 0, POSITION_BINS - 1).T), 1)
+
+        ratios = [obj["occlusion_ratio"] for obj in objects if obj.get("occlusion_ratio") is not None]
+        if ratios:
+            bins = np.minimum((np.array(ratios) * OCCLUSION_BINS).astype(np.int64), OCCLUSION_BINS - 1)
+            np.add.at(self.arrays["occlusion"], bins, 1)
+
+        for name, related in scene_struct.get("relationships", {}).items():
+            key = "rel_" + name
+            if key not in self.arrays:
+                self.arrays[key] = np.zeros(1, dtype=np.int64)
+            self.arrays[key][0] += sum(len(js) for js in related)
+
+    def merge(self, other):
+        """ Add the aggregates of another partial into this one """
+        if other.vocabularies != self.vocabularies:
+            raise ValueError("Cannot merge statistics of different property catalogs")
+        for key, array in other.arrays.items():
+            if key in self.arrays:
+                self.arrays[key] += array
+            else:
+                self.arrays[key] = array.copy()
+        return self
+
+    def save(self, path):
+        """ Write the partial atomically, so readers never see a half-written file """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # not named *.npz, so a leftover is never picked up by a merge glob
+        tmp_path = path.with_name(path.name + ".tmp")
+        meta = json.dumps({"vocabularies": self.vocabularies, "resolution": self.resolution})
+        # a file object, since np.savez would append .npz to the name
+        with open(str(tmp_path), "wb") as f:
+            np.savez(f, meta=np.array(meta), **self.arrays)
+        os.replace(str(tmp_path), str(path))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(str(path)) as data:
+            meta = json.loads(str(data["meta"]))
+            stats = cls.__new__(cls)
+            stats.vocabularies = meta["vocabularies"]
+            stats.codes = {attr: {name: i for i, name in enumerate(names)}
+                           for attr, names in stats.vocabularies.items()}
+            stats.resolution = meta["resolution"]
+            stats.arrays = {key: data[key] for key in data.files if key != "meta"}
+        return stats
+
+    def summary(self):
+        """ Human readable totals and attribute distributions """
+        num_objects = int(self.arrays["object_counts"] @ np.arange(MAX_OBJECTS + 1))
+        summary = {
+            "num_scenes": int(self.arrays["num_scenes"][0]),
+            "num_objects": num_objects,
+            "relationships": {key[4:]: int(a[0]) for key, a in self.arrays.items()
+                              if key.startswith("rel_")},
+            "occlusion_histogram": self.arrays["occlusion"].tolist(),
+        }
+        for attr, names in self.vocabularies.items():
+            summary[attr] = dict(zip(names, self.arrays["attr_" + attr].tolist()))
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    merge_parser = subparsers.add_parser('merge', help="Combine partial statistics files")
+    merge_parser.add_argument('output', help="Path of the merged .npz file")
+    merge_parser.add_argument('partials', nargs='+', help="Partial .npz files of the workers")
+    show_parser = subparsers.add_parser('show', help="Print the summary of a statistics file")
+    show_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        merged = DatasetStats.load(args.partials[0])
+        for path in args.partials[1:]:
+            merged.merge(DatasetStats.load(path))
+        merged.save(args.output)
+        print('==> Merged %d partials with %d scenes into "%s".'
+              % (len(args.partials), merged.arrays["num_scenes"][0], args.output))
+    else:
+        print(json.dumps(DatasetStats.load(args.path).summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
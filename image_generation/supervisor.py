@@ -0,0 +1,292 @@
+import argparse, json, os, signal, subprocess, sys, time
+from collections import Counter
+from pathlib import Path
+
+import manifest
+import tracing
+
+"""
+Supervision layer for long generation runs. The requested image indices are
+split across a number of Blender worker processes, each running a generation
+script (create_scene.py by default) with --indices_file and --progress_file.
+The supervisor follows the progress files and
+
+- kills a worker that has not finished or rendered an image within its time
+  budget (a rendered image that waits for publication is reported with a
+  heartbeat line),
+- restarts it with the indices it has not finished yet, after a backoff that
+  doubles with every failure of the same index,
+- gives up on an index after max_retries failures and moves on,
+- restarts a worker that exited with RECYCLE_EXIT_CODE right away, without
+  charging a failure; workers do this after finishing an image when their
+  recycling policy (--recycle_images, --recycle_minutes, --recycle_rss) says
+  the process has run long enough,
+
+and records every failure in a structured JSON Lines log. With --extend_dir,
+the run continues after the high-water mark of an existing dataset (see
+manifest.py). With --trace_dir, the lifetimes and restarts of the workers are
+traced on one track per worker, next to the traces of the workers themselves
+(see tracing.py). Run it with a normal Python interpreter:
+
+python supervisor.py --num_images 1000 --num_workers 4 -- [arguments for the script]
+"""
+
+root = Path(__file__).parents[0]
+
+# exit code of a worker that stopped voluntarily to be replaced by a fresh process
+RECYCLE_EXIT_CODE = 75
+# progress line prefix of an image that was rendered but is not finished yet,
+# e.g. while it waits for publication; it only resets the time budget
+HEARTBEAT = "h"
+
+
+def log_event(log_path, **event):
+    event["time"] = time.time()
+    with open(str(log_path), "a") as f:
+        f.write(json.dumps(event) + "\n")
+
+
+class Worker:
+    """ One Blender process working through its list of indices """
+
+    def __init__(self, worker_id, indices, args):
+        self.worker_id = worker_id
+        self.pending = list(indices)
+        self.args = args
+        self.work_dir = Path(args.work_dir)
+        self.indices_path = self.work_dir / ("worker_%d.indices.json" % worker_id)
+        self.progress_path = self.work_dir / ("worker_%d.progress" % worker_id)
+        self.progress_offset = 0
+        self.attempts = Counter()
+        self.failed = []
+        self.proc = None
+        self.pid = None
+        self.started = 0.0
+        self.last_progress = 0.0
+        self.restart_at = 0.0
+        # trace track of this worker in the supervisor process
+        self.tid = worker_id + 1
+        tracing.thread_name(self.tid, "worker %d" % worker_id)
+
+    def command(self):
+        command = ([self.args.blender, "--background", "--python", self.args.script, "--",
+                    "--indices_file", str(self.indices_path),
+                    "--progress_file", str(self.progress_path)] + self.args.script_args)
+        if self.args.shard_prefix is not None:
+            # workers share the shard directory, so each writes shards of its own
+            command += ["--shard_prefix", "%s-w%d" % (self.args.shard_prefix, self.worker_id)]
+        return command
+
+    def start(self):
+        with open(str(self.indices_path), "w") as f:
+            json.dump(self.pending, f)
+        # own process group, so that a kill also reaches processes Blender spawned
+        self.proc = subprocess.Popen(self.command(), start_new_session=True)
+        self.started = self.last_progress = time.time()
+        self.pid = self.proc.pid
+        log_event(self.args.log, event="start", worker=self.worker_id, pid=self.proc.pid,
+                  next_index=self.pending[0], remaining=len(self.pending))
+
+    def read_progress(self):
+        """ Drop the indices the worker reported as finished since the last call """
+        if not self.progress_path.is_file():
+            return
+        with open(str(self.progress_path), "r") as f:
+            f.seek(self.progress_offset)
+            data = f.read()
+        # only consume complete lines, the worker may be in the middle of a write
+        complete = data[:data.rfind("\n") + 1]
+        self.progress_offset += len(complete)
+        lines = [line.split() for line in complete.splitlines() if line.strip()]
+        done = {int(line[0]) for line in lines if line[0] != HEARTBEAT}
+        if done:
+            self.pending = [i for i in self.pending if i not in done]
+        if lines:
+            self.last_progress = time.time()
+
+    def budget(self):
+        """ Seconds the in-flight image may take; the first one includes startup """
+        budget = self.args.image_timeout
+        if self.last_progress == self.started:
+            budget += self.args.startup_timeout
+        return budget
+
+    def kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.proc.wait()
+
+    def trace_lifetime(self, outcome, **args):
+        """ Trace the worker process from its start until now """
+        tracing.complete("worker", self.started * 1e6, tracing.now_us(), cat="worker", tid=self.tid,
+                         pid=self.pid, outcome=outcome, **args)
+
+    def fail(self, reason, returncode=None):
+        """ Charge a failure to the in-flight index and schedule a restart """
+        self.trace_lifetime(reason, returncode=returncode)
+        self.proc = None
+        if not self.pending:
+            return
+        index = self.pending[0]
+        self.attempts[index] += 1
+        attempt = self.attempts[index]
+        log_event(self.args.log, event="failure", worker=self.worker_id, index=index,
+                  attempt=attempt, reason=reason, returncode=returncode)
+        if attempt > self.args.max_retries:
+            self.pending.pop(0)
+            self.failed.append(index)
+            log_event(self.args.log, event="skip", worker=self.worker_id, index=index)
+            self.restart_at = time.time()
+        else:
+            self.restart_at = time.time() + self.args.backoff * 2 ** (attempt - 1)
+            tracing.complete("backoff", tracing.now_us(), self.restart_at * 1e6, cat="worker",
+                             tid=self.tid, index=index, attempt=attempt)
+
+    def step(self):
+        """ Advance the worker state machine; returns False once all work is done """
+        if self.proc is None:
+            if not self.pending:
+                return False
+            if time.time() >= self.restart_at:
+                self.start()
+            return True
+        self.read_progress()
+        returncode = self.proc.poll()
+        if returncode is None:
+            if time.time() - self.last_progress > self.budget():
+                self.kill()
+                self.read_progress()
+                self.fail("timeout")
+        else:
+            self.read_progress()
+            if self.pending and returncode == RECYCLE_EXIT_CODE:
+                self.trace_lifetime("recycle")
+                self.proc = None
+                self.restart_at = time.time()
+                log_event(self.args.log, event="recycle", worker=self.worker_id,
+                          remaining=len(self.pending))
+            elif self.pending:
+                self.fail("exit", returncode)
+            else:
+                self.trace_lifetime("done")
+                self.proc = None
+        return True
+
+
+def script_options(script_args):
+    """ Options of the generation script that the supervisor depends on """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--output_format', default='files')
+    parser.add_argument('--shard_prefix', default='shard')
+    parser.add_argument('--balanced_sampling', default=0, type=int)
+    parser.add_argument('--seed', default=None, type=int)
+    return parser.parse_known_args(script_args)[0]
+
+
+def supervise(indices, args, schedule=None):
+    """
+    Render indices with args.num_workers workers, round robin or with the
+    given per-worker index lists of a cost-based schedule
+    """
+    Path(args.work_dir).mkdir(parents=True, exist_ok=True)
+    if schedule is None:
+        schedule = [indices[k::args.num_workers] for k in range(args.num_workers)]
+    workers = [Worker(k, worker_indices, args) for k, worker_indices in enumerate(schedule)
+               if worker_indices]
+    try:
+        while True:
+            active = [w.step() for w in workers]
+            if not any(active):
+                break
+            time.sleep(args.poll_interval)
+    finally:
+        for w in workers:
+            if w.proc is not None:
+                w.kill()
+    failed = sorted(i for w in workers for i in w.failed)
+    summary = {"num_indices": len(indices), "failed": failed}
+    with open(str(Path(args.work_dir) / "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    argv = sys.argv[1:]
+    script_args = []
+    if '--' in argv:
+        idx = argv.index('--')
+        argv, script_args = argv[:idx], argv[idx + 1:]
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blender', default='blender', help="Blender executable")
+    parser.add_argument('--script', default=str(root / "create_scene.py"),
+                        help="Generation script accepting --indices_file and --progress_file")
+    parser.add_argument('--start_idx', default=0, type=int)
+    parser.add_argument('--num_images', default=None, type=int)
+    parser.add_argument('--num_workers', default=1, type=int)
+    parser.add_argument('--schedule', default=None,
+                        help="Schedule written by cost.py plan; its per-worker index lists " +
+                             "replace --start_idx, --num_images and --num_workers.")
+    parser.add_argument('--image_timeout', default=600.0, type=float,
+                        help="Seconds a worker may spend on one image before it is killed")
+    parser.add_argument('--startup_timeout', default=300.0, type=float,
+                        help="Extra seconds granted for the first image after a (re)start")
+    parser.add_argument('--max_retries', default=3, type=int,
+                        help="Failures of the same index before it is skipped")
+    parser.add_argument('--backoff', default=5.0, type=float,
+                        help="Initial wait in seconds before restarting a failed worker")
+    parser.add_argument('--extend_dir', default=None,
+                        help="Output directory of a dataset to extend: --start_idx and the seed " +
+                             "are taken from its manifest.json, which is updated after the run.")
+    parser.add_argument('--poll_interval', default=1.0, type=float)
+    parser.add_argument('--trace_dir', default=None,
+                        help="Directory for the Chrome traces of the supervisor and the workers, " +
+                             "which are passed --trace_dir as well; see tracing.py merge.")
+    parser.add_argument('--work_dir', default=str(root / "output" / "supervisor"),
+                        help="Directory for index lists, progress files, the log and summary")
+    args = parser.parse_args(argv)
+    args.script_args = script_args
+    args.log = Path(args.work_dir) / "failures.jsonl"
+    options = script_options(script_args)
+    args.shard_prefix = options.shard_prefix if options.output_format == 'shards' else None
+    if args.num_images is None and args.schedule is None:
+        parser.error("one of --num_images and --schedule is required")
+    if args.trace_dir is not None:
+        args.trace_dir = str(Path(args.trace_dir).resolve())
+        tracing.start(args.trace_dir, "supervisor")
+        if '--trace_dir' not in args.script_args:
+            args.script_args += ['--trace_dir', args.trace_dir]
+
+    seed = options.seed
+    if args.extend_dir is not None:
+        dataset = manifest.load_manifest(args.extend_dir)
+        args.start_idx = dataset["next_index"]
+        if seed is None and dataset["seed"] is not None:
+            seed = dataset["seed"]
+            args.script_args += ['--seed', str(seed)]
+
+    schedule = None
+    if args.schedule is not None:
+        with open(args.schedule, "r") as f:
+            schedule = json.load(f)["workers"]
+        args.num_workers = len(schedule)
+        indices = sorted(i for worker in schedule for i in worker)
+    else:
+        indices = list(range(args.start_idx, args.start_idx + args.num_images))
+    if options.balanced_sampling == 1:
+        # balanced attributes are planned over the whole run, not per worker
+        args.script_args += ['--start_idx', str(indices[0]),
+                             '--num_images', str(indices[-1] + 1 - indices[0])]
+    with tracing.span("supervise", num_indices=len(indices)):
+        summary = supervise(indices, args, schedule)
+    tracing.stop()
+    if args.extend_dir is not None:
+        manifest.record_run(args.extend_dir, indices[0], indices[-1] + 1, seed, summary["failed"])
+    print('==> Rendered %d of %d images, %d failed.'
+          % (len(indices) - len(summary["failed"]), len(indices), len(summary["failed"])))
+
+
+if __name__ == "__main__":
+    main()
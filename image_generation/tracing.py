@@ -0,0 +1,202 @@
+import argparse, json, os, socket, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+"""
+Timeline tracing across worker processes in the Chrome trace event format.
+Every process writes its own trace file into a shared trace directory, one
+JSON event per line, so a killed worker loses at most the span in flight:
+
+    trace_<host>_<pid>.jsonl
+
+Spans cover the stages of create_scene.py (setup, scene build, every render
+with its output file, masks, annotation, level encoding, output, publishing)
+and the supervisor (worker lifetimes with their outcome, restart backoff). The merge command combines all files
+into one trace.json that can be opened in chrome://tracing or
+https://ui.perfetto.dev, with one track per process and thread:
+
+python create_scene.py ... --trace_dir traces    (or supervisor.py --trace_dir traces)
+python tracing.py merge traces trace.json
+
+Timestamps are wall clock time, so processes on different machines line up
+as well as their clocks do.
+"""
+
+_tracer = None
+
+
+def now_us():
+    return time.time() * 1e6
+
+
+class Tracer:
+    """ Writer of the trace events of this process """
+
+    def __init__(self, trace_dir, process_name):
+        trace_dir = Path(trace_dir)
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        self.pid = os.getpid()
+        self.path = trace_dir / ("trace_%s_%d.jsonl" % (socket.gethostname(), self.pid))
+        self.lock = threading.Lock()
+        # line buffered, every event reaches the file right away
+        self.file = open(str(self.path), "a", buffering=1)
+        self.metadata("process_name", name="%s (%s)" % (process_name, self.pid))
+
+    def write(self, event):
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", threading.get_native_id())
+        with self.lock:
+            self.file.write(json.dumps(event) + "\n")
+
+    def metadata(self, kind, tid=None, **args):
+        event = {"ph": "M", "name": kind, "args": args}
+        if tid is not None:
+            event["tid"] = tid
+        self.write(event)
+
+    def complete(self, name, start_us, end_us, cat="stage", tid=None, **args):
+        """ A span that already ended, e.g. tracked across several polls """
+        event = {"ph": "X", "name": name, "cat": cat, "ts": start_us, "dur": end_us - start_us,
+                 "args": args}
+        if tid is not None:
+            event["tid"] = tid
+        self.write(event)
+
+    def instant(self, name, cat="event", tid=None, **args):
+        event = {"ph": "i", "s": "t", "name": name, "cat": cat, "ts": now_us(), "args": args}
+        if tid is not None:
+            event["tid"] = tid
+        self.write(event)
+
+    @contextmanager
+    def span(self, name, cat="stage", **args):
+        start = now_us()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = repr(e)
+            raise
+        finally:
+            self.complete(name, start, now_us(), cat, **args)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def start(trace_dir, process_name):
+    """ Trace this process into trace_dir; without a call all tracing calls are no-ops """
+    global _tracer
+    _tracer = Tracer(trace_dir, process_name)
+    return _tracer
+
+
+def stop():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+@contextmanager
+def span(name, cat="stage", **args):
+    """
+    Trace the enclosed block as a span of the current thread. The yielded dict
+    holds the span arguments, more can be added inside the block.
+    """
+    if _tracer is None:
+        yield args
+    else:
+        with _tracer.span(name, cat, **args) as span_args:
+            yield span_args
+
+
+def instant(name, **args):
+    if _tracer is not None:
+        _tracer.instant(name, **args)
+
+
+def complete(name, start_us, end_us, **args):
+    if _tracer is not None:
+        _tracer.complete(name, start_us, end_us, **args)
+
+
+def thread_name(tid, name):
+    """ Label a track of this process, e.g. a worker slot of the supervisor """
+    if _tracer is not None:
+        _tracer.metadata("thread_name", tid=tid, name=name)
+
+
+def load_events(paths):
+    """ Events of trace files; a line cut off by a killed process is skipped """
+    events = []
+    for path in paths:
+        with open(str(path), "r") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    return events
+
+
+def merge(paths, out_path):
+    """
+    Merge trace files into one Chrome trace with timestamps relative to the
+    first event. Process ids can repeat across hosts, so every file gets its
+    own process id (1, 2, ...) and one process_name with the host of the file.
+    Returns the merged events.
+    """
+    events = []
+    for pid, path in enumerate(paths, 1):
+        file_events = load_events([path])
+        names = [e["args"]["name"] for e in file_events if e["ph"] == "M" and e["name"] == "process_name"]
+        host = Path(path).stem[len("trace_"):].rpartition("_")[0]
+        name = names[0] if names else Path(path).stem
+        events.append({"ph": "M", "name": "process_name", "pid": pid,
+                       "args": {"name": "%s %s" % (name, host) if host else name}})
+        for e in file_events:
+            if e["ph"] == "M" and e["name"] == "process_name":
+                continue
+            e["pid"] = pid
+            events.append(e)
+    timed = [e for e in events if "ts" in e]
+    origin = min((e["ts"] for e in timed), default=0.0)
+    for e in timed:
+        e["ts"] -= origin
+    # metadata first, then by time, which keeps viewers from reordering tracks
+    events.sort(key=lambda e: (e["ph"] != "M", e.get("ts", 0.0)))
+    with open(str(out_path), "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                   "otherData": {"origin_unix_seconds": origin / 1e6}}, f)
+    return events
+
+
+def span_totals(events):
+    """ Number and total seconds of the spans of every name """
+    totals = {}
+    for e in events:
+        if e["ph"] == "X":
+            count, seconds = totals.get(e["name"], (0, 0.0))
+            totals[e["name"]] = (count + 1, seconds + e["dur"] / 1e6)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    merge_parser = subparsers.add_parser('merge', help="Merge per-process traces into trace.json")
+    merge_parser.add_argument('trace_dir', help="Directory with the trace_*.jsonl files")
+    merge_parser.add_argument('out', nargs='?', default='trace.json',
+                              help="Path of the merged Chrome trace")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.trace_dir).glob("trace_*.jsonl"))
+    events = merge(paths, args.out)
+    for name, (count, seconds) in sorted(span_totals(events).items(), key=lambda item: -item[1][1]):
+        print('%-12s %6d spans %10.2fs' % (name, count, seconds))
+    print('==> Merged %d events of %d processes into "%s".' % (len(events), len(paths), args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
-import math, sys, random, argparse, json, os, tempfile
+import math, sys, random, argparse, json, os, tempfile, time
 from collections import Counter
 from pathlib import Path
 
+import numpy as np
 import bpy, bpy_extras
 
+import catalog
+import placement
+import spatial
+import tracing
+from placement import compute_all_relationships, compute_relationships_batch, \
+    compute_relationships_frames
+
 root = Path(__file__).parents[0]
 
 
@@ -33,6 +41,8 @@ def load_materials(material_dir):
         name = os.path.splitext(fn)[0]
         filepath = os.path.join(material_dir, fn, 'NodeTree', name)
         bpy.ops.wm.append(filename=filepath)
+        # keep the unused node group through orphan purges
+        bpy.data.node_groups[name].use_fake_user = True
 
 
 def add_material(name, **properties):
@@ -78,6 +88,9 @@ def add_material(name, **properties):
     for inp in group_node.inputs:
         if inp.name in properties:
             inp.default_value = properties[inp.name]
+    # the viewport color, which draft renders with Workbench display
+    if 'Color' in properties:
+        mat.diffuse_color = properties['Color']
 
     # Wire the output of the new group node to the input of
     # the MaterialOutput node
@@ -108,12 +121,14 @@ def add_object(object_dir, name, scale, loc, theta=0):
     bpy.ops.wm.append(filename=filename)
 
 
-    # Give it a new name to avoid conflicts
+    # Give it a new name to avoid conflicts; with pooled objects the name can
+    # still be taken, so keep the reference instead of looking it up again
     new_name = '%s_%d' % (name, count)
-    bpy.data.objects[name].name = new_name
+    obj = bpy.data.objects[name]
+    obj.name = new_name
     # Set the new object as active, then rotate, scale, and translate it
     x, y = loc
-    bpy.context.view_layer.objects.active = bpy.data.objects[new_name]
+    bpy.context.view_layer.objects.active = obj
     bpy.context.object.rotation_euler[2] = theta
     bpy.ops.transform.resize(value=(scale, scale, scale))
     bpy.ops.transform.translate(value=(x, y, scale))
@@ -127,6 +142,29 @@ def delete_object(obj):
     bpy.ops.object.delete()
 
 
+def render_with_retries(max_retries=3, backoff=1.0, animation=False):
+    """
+    Render the current scene to its filepath, or all frames of the scene with
+    animation=True. A failed render is retried up to max_retries times, waiting
+    backoff * 2 ** attempt seconds in between; after that the last error is
+    raised instead of retrying forever.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            with tracing.span("render", file=os.path.basename(bpy.context.scene.render.filepath),
+                              attempt=attempt):
+                if animation:
+                    bpy.ops.render.render(animation=True)
+                else:
+                    bpy.ops.render.render(write_still=True)
+            return
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            print('Render failed (attempt %d of %d): %s' % (attempt + 1, max_retries + 1, e))
+            time.sleep(backoff * 2 ** attempt)
+
+
 def get_camera_coords(cam, pos):
     """
     For a specified point, get both the 3D coordinates and 2D pixel-space
@@ -150,6 +188,97 @@ def get_camera_coords(cam, pos):
     return (px, py, z)
 
 
+def get_camera_coords_batch(cam, positions):
+    """
+    Vectorized version of get_camera_coords for a list of 3D world-space
+    positions. All points are projected in one step with the camera matrices
+    instead of one world_to_camera_view call per point.
+
+    Returns a list of (px, py, pz) tuples like get_camera_coords.
+    """
+    scene = bpy.context.scene
+    pos = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    world_to_cam = np.array(cam.matrix_world.normalized().inverted())
+    local = pos @ world_to_cam[:3, :3].T + world_to_cam[:3, 3]
+    z = -local[:, 2]
+    frame = [np.array(v) for v in cam.data.view_frame(scene=scene)[:3]]
+    if cam.data.type != 'ORTHO':
+        # the view frame scales with the depth of each point
+        scale = np.where(z == 0.0, 1.0, -z / frame[0][2])
+    else:
+        scale = np.ones_like(z)
+    min_x, max_x = frame[2][0] * scale, frame[1][0] * scale
+    min_y, max_y = frame[1][1] * scale, frame[0][1] * scale
+    x = np.where(z == 0.0, 0.5, (local[:, 0] - min_x) / (max_x - min_x))
+    y = np.where(z == 0.0, 0.5, (local[:, 1] - min_y) / (max_y - min_y))
+
+    render_scale = scene.render.resolution_percentage / 100.0
+    w = int(render_scale * scene.render.resolution_x)
+    h = int(render_scale * scene.render.resolution_y)
+    px = np.round(x * w).astype(int)
+    py = np.round(h - y * h).astype(int)
+    return [(int(a), int(b), float(c)) for a, b, c in zip(px, py, z)]
+
+
+def get_sequence_annotations(cam, positions, directions):
+    """
+    Per-frame annotations of a clip, for object positions of shape
+    (num_frames, num_objects, 3). Pixel coordinates, relationships and
+    visibility of all frames are computed in vectorized steps. Visibility is
+    approximated from projected bounding discs: in_view tells if the object
+    center is inside the image and occluders lists the nearer objects whose
+    disc overlaps the one of the object.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    num_frames, n = positions.shape[:2]
+    # the centers are at the height of the scale, the tops at twice that
+    tops = positions.copy()
+    tops[:, :, 2] *= 2
+    coords = np.array(get_camera_coords_batch(cam, np.concatenate([positions, tops]).reshape(-1, 3)),
+                      dtype=np.float64).reshape(2, num_frames, n, 3)
+    pixel, top = coords
+    radius = np.abs(pixel[:, :, 1] - top[:, :, 1])
+
+    render_args = bpy.context.scene.render
+    render_scale = render_args.resolution_percentage / 100.0
+    w = int(render_scale * render_args.resolution_x)
+    h = int(render_scale * render_args.resolution_y)
+    in_view = ((pixel[:, :, 0] >= 0) & (pixel[:, :, 0] < w) &
+               (pixel[:, :, 1] >= 0) & (pixel[:, :, 1] < h))
+    # occluded[f, i, j]: object j covers part of object i in frame f
+    dist = np.linalg.norm(pixel[:, :, None, :2] - pixel[:, None, :, :2], axis=-1)
+    occluded = ((dist < radius[:, :, None] + radius[:, None, :]) &
+                (pixel[:, None, :, 2] < pixel[:, :, None, 2]))
+    occluded[:, np.arange(n), np.arange(n)] = False
+
+    relationships = compute_relationships_frames(positions, directions)
+    frames = []
+    for f in range(num_frames):
+        frames.append({
+            "frame": f + 1,
+            "3d_coords": [tuple(p) for p in positions[f].tolist()],
+            "pixel_coords": [(int(x), int(y), float(z)) for x, y, z in pixel[f]],
+            "relationships": relationships[f],
+            "in_view": in_view[f].tolist(),
+            "occluders": [np.flatnonzero(row).tolist() for row in occluded[f]],
+        })
+    return frames
+
+
+def load_image_array(path):
+    """
+    Load an image file through Blender and return it as an (H, W, 4) uint8
+    array with the first row at the top.
+    """
+    img = bpy.data.images.load(str(path))
+    w, h = img.size
+    pixels = np.empty(w * h * 4, dtype=np.float32)
+    img.pixels.foreach_get(pixels)
+    bpy.data.images.remove(img)
+    pixels = np.round(pixels * 255.0).astype(np.uint8)
+    return pixels.reshape(h, w, 4)[::-1]
+
+
 def set_layer(obj, layer_idx):
     """ Move an object to a particular layer """
     # Set the target layer to True first because an object must always be on
@@ -248,105 +377,34 @@ def check_visibility(blender_objects, min_pixels_per_object):
 
 
 def load_property_json(file_name):
-    with open(str(root / file_name), 'r') as f:
-        properties = json.load(f)
-        color_name_to_rgba = {}
-        for name, rgb in properties['colors'].items():
-            rgba = [float(c) / 255.0 for c in rgb] + [1.0]
-            color_name_to_rgba[name] = rgba
-        material_mapping = [(v, k) for k, v in properties['materials'].items()]
-        object_mapping = [(v, k) for k, v in properties['shapes'].items()]
-        size_mapping = list(properties['sizes'].items())
+    props = catalog.load_catalog(root / file_name)
+    color_name_to_rgba = {name: props.rgba_list(i) for i, name in enumerate(props.colors)}
+    material_mapping = list(zip(props.material_nodes, props.materials))
+    object_mapping = list(zip(props.shape_files, props.shapes))
+    size_mapping = list(zip(props.sizes, props.size_values.tolist()))
     return material_mapping, object_mapping, size_mapping, color_name_to_rgba
 
 
-def add_random_objects(scene_struct, num_objects, args, camera):
+def add_random_objects(scene_struct, num_objects, args, camera, sampler=None, pool=None):
     """
-    Add random objects to the current blender scene
+    Add random objects to the current blender scene. If a BalancedSampler is
+    given, the attributes of the objects are drawn from it instead of uniformly.
+    With an ObjectPool, objects of the previous scene are reused where possible.
     """
 
-    # Load the property file
-    material_mapping, object_mapping, size_mapping, color_name_to_rgba = load_property_json("properties.json")
-    positions = []
-    objects = []
-    blender_objects = []
-
-    for i in range(num_objects):
-        # Choose a random size
-        size_name, r = random.choice(size_mapping)
-
-        # Try to place the object, ensuring that we don't intersect any existing
-        # objects and that we are more than the desired margin away from all existing
-        # objects along all cardinal directions.
-        num_tries = 0
-        while True:
-            # If we try and fail to place an object too many times, then delete all
-            # the objects in the scene and start over.
-            num_tries += 1
-            if num_tries > 50:
-                for obj in blender_objects:
-                    delete_object(obj)
-                return add_random_objects(scene_struct, num_objects, args, camera)
-            x = random.uniform(-3, 3)
-            y = random.uniform(-3, 3)
-            # Check to make sure the new object is further than min_dist from all
-            # other objects, and further than margin along the four cardinal directions
-            dists_good = True
-            margins_good = True
-            for (xx, yy, rr) in positions:
-                dx, dy = x - xx, y - yy
-                dist = math.sqrt(dx * dx + dy * dy)
-                if dist - r - rr < 0.25:
-                    dists_good = False
-                    break
-                for direction_name in ['left', 'right', 'front', 'behind']:
-                    direction_vec = scene_struct['directions'][direction_name]
-                    assert direction_vec[2] == 0
-                    margin = dx * direction_vec[0] + dy * direction_vec[1]
-                    if 0 < margin < 0.4:
-                        print(margin, 0.4, direction_name)
-                        print('BROKEN MARGIN!')
-                        margins_good = False
-                        break
-                if not margins_good:
-                    break
-
-            if dists_good and margins_good:
-                break
-
-        # Choose random color and shape
-        obj_name, obj_name_out = random.choice(object_mapping)
-        color_name, rgba = random.choice(list(color_name_to_rgba.items()))
-
-        # For cube, adjust the size a bit
-        if obj_name == 'Cube':
-            r /= math.sqrt(2)
-
-        # Choose random orientation for the object.
-        theta = 360.0 * random.random()
-
-        ############## Actually add the object to the scene ########################
-        add_object(str(root / "shape"), obj_name, r, (x, y), theta=int(theta))
-        obj = bpy.context.object
-
-        blender_objects.append(obj)
-        positions.append((x, y, r))
-
-        # Attach a random material
-        mat_name, mat_name_out = random.choice(material_mapping)
-        add_material(mat_name, Color=rgba)
-
-        # Record data about the object in the scene data structure
-        pixel_coords = get_camera_coords(camera, obj.location)
-        objects.append({
-            'shape': obj_name_out,
-            'size': size_name,
-            'material': mat_name_out,
-            '3d_coords': tuple(obj.location),
-            'rotation': theta,
-            'pixel_coords': pixel_coords,
-            'color': color_name,
-        })
+    # The compiled property catalog is built once per process
+    props = catalog.load_catalog(root / "properties.json")
+    object_codes = None
+    if sampler is not None:
+        object_codes = sampler.image_codes(scene_struct['image_index'])
+
+    # Plan the layout without touching blender, then build it
+    layout = placement.sample_layout(scene_struct['directions'], num_objects, props, object_codes,
+                                     **layout_options(args))
+    if pool is not None:
+        objects, blender_objects = pool.build(layout, props, camera)
+    else:
+        objects, blender_objects = add_objects(layout, props, camera)
 
     # Check that all objects are at least partially visible in the rendered image
     # all_visible = check_visibility(blender_objects, 200)
@@ -361,35 +419,291 @@ def add_random_objects(scene_struct, num_objects, args, camera):
     return objects, blender_objects
 
 
-def compute_all_relationships(scene_struct, eps=0.2):
+def layout_options(args):
+    """ Keyword arguments of placement.sample_layout for the placement flags """
+    return {
+        "min_dist": args.min_dist,
+        "margin": args.margin,
+        "extent": args.placement_extent,
+        "neighbor_radius": args.neighbor_radius if args.neighbor_radius > 0 else None,
+    }
+
+
+def scene_relationships(positions, directions, args):
+    """
+    Relationships of objects at the given 3D positions: between all pairs, or
+    between neighbors only with --neighbor_radius
     """
-    Computes relationships between all pairs of objects in the scene.
+    if args.neighbor_radius > 0:
+        return spatial.neighbor_relationships(positions, directions, args.neighbor_radius,
+                                              args.neighbor_k, touch_eps=args.touch_eps)
+    return compute_relationships_batch(positions, directions)
 
-    Returns a dictionary mapping string relationship names to lists of
-    integers, where output[rel][i] gives a list of object indices that have the
-    relationship rel with object i. For example if j is in output['left'][i] then
-    object j is left of object i.
+
+def add_objects(layout, props, camera):
+    """
+    Instantiate a layout planned by placement.sample_layout in the current
+    blender scene. Returns the scene data of the objects and the blender objects.
     """
-    all_relationships = {}
-    for name, direction_vec in scene_struct['directions'].items():
-        if name == 'above' or name == 'below': continue
-        all_relationships[name] = []
-        for i, obj1 in enumerate(scene_struct['objects']):
-            coords1 = obj1['3d_coords']
-            related = set()
-            for j, obj2 in enumerate(scene_struct['objects']):
-                if obj1 == obj2: continue
-                coords2 = obj2['3d_coords']
-                diff = [coords2[k] - coords1[k] for k in [0, 1, 2]]
-                dot = sum(diff[k] * direction_vec[k] for k in [0, 1, 2])
-                if dot > eps:
-                    related.add(j)
-            all_relationships[name].append(sorted(list(related)))
-    return all_relationships
+    objects = []
+    blender_objects = []
+    for spec in layout:
+        ############## Actually add the object to the scene ########################
+        add_object(str(root / "shape"), props.shape_files[spec['shape']], spec['r'],
+                   (spec['x'], spec['y']), theta=int(spec['theta']))
+        obj = bpy.context.object
+        blender_objects.append(obj)
+
+        # Attach the material
+        add_material(props.material_nodes[spec['material']], Color=props.rgba_list(spec['color']))
+
+        # Record data about the object in the scene data structure
+        objects.append(object_annotation(obj, spec, props, camera))
+    return objects, blender_objects
+
+
+def object_annotation(obj, spec, props, camera):
+    """ Scene data of an instantiated object spec """
+    return {
+        'shape': props.shapes[spec['shape']],
+        'size': props.sizes[spec['size']],
+        'material': props.materials[spec['material']],
+        '3d_coords': tuple(obj.location),
+        'rotation': spec['theta'],
+        'pixel_coords': get_camera_coords(camera, obj.location),
+        'color': props.colors[spec['color']],
+    }
+
+
+class ObjectPool:
+    """
+    Objects kept alive between scenes. Building a layout reuses the pooled
+    objects with the same shape and material: they are only moved, scaled,
+    rotated and recolored. Pooled objects that are not needed are removed
+    together with their mesh and material, and missing ones are appended as
+    usual. All pooled objects live in their own collection.
+    """
+
+    def __init__(self):
+        self.collection = bpy.data.collections.new(name="pool_collection")
+        bpy.context.scene.collection.children.link(self.collection)
+        # (shape, material, blender object) of the objects of the last scene
+        self.entries = []
+        self.num_reused = 0
+        self.num_built = 0
+
+    def build(self, layout, props, camera):
+        """ Same as add_objects, reusing pooled objects """
+        free = {}
+        for shape, material, obj in self.entries:
+            free.setdefault((shape, material), []).append(obj)
+        reused = [free[key].pop() if free.get(key) else None
+                  for key in [(spec['shape'], spec['material']) for spec in layout]]
+        for objs in free.values():
+            for obj in objs:
+                self.remove(obj)
+
+        active = bpy.context.view_layer.active_layer_collection
+        bpy.context.view_layer.active_layer_collection = \
+            bpy.context.view_layer.layer_collection.children['pool_collection']
+        objects = []
+        blender_objects = []
+        for spec, obj in zip(layout, reused):
+            if obj is None:
+                add_object(str(root / "shape"), props.shape_files[spec['shape']], spec['r'],
+                           (spec['x'], spec['y']), theta=int(spec['theta']))
+                obj = bpy.context.object
+                add_material(props.material_nodes[spec['material']],
+                             Color=props.rgba_list(spec['color']))
+                self.num_built += 1
+            else:
+                # the same transform as add_object applies to a fresh object
+                obj.rotation_euler[2] = int(spec['theta'])
+                obj.scale = (spec['r'], spec['r'], spec['r'])
+                obj.location = (spec['x'], spec['y'], spec['r'])
+                mat = obj.data.materials[0]
+                for node in mat.node_tree.nodes:
+                    if getattr(node, 'node_tree', None) is not None:
+                        node.inputs['Color'].default_value = props.rgba_list(spec['color'])
+                mat.diffuse_color = props.rgba_list(spec['color'])
+                self.num_reused += 1
+            blender_objects.append(obj)
+            objects.append(object_annotation(obj, spec, props, camera))
+        bpy.context.view_layer.active_layer_collection = active
+        self.entries = [(spec['shape'], spec['material'], obj) for spec, obj in zip(layout, blender_objects)]
+        return objects, blender_objects
+
+    def remove(self, obj):
+        mesh = obj.data
+        materials = list(mesh.materials)
+        bpy.data.objects.remove(obj, do_unlink=True)
+        bpy.data.meshes.remove(mesh)
+        for mat in materials:
+            bpy.data.materials.remove(mat)
 
 
 def args_parser():
     parser = argparse.ArgumentParser()
+
+    # Output settings
+    parser.add_argument('--output_path', default='output',
+                        help="Output directory, relative to the repository root.")
+    parser.add_argument('--start_idx', default=0, type=int,
+                        help="The index of the first image to render")
+    parser.add_argument('--num_images', default=3, type=int,
+                        help="The number of images to render")
+    parser.add_argument('--output_format', default='files', choices=['files', 'shards'],
+                        help="Write one PNG and one JSON file per image ('files'), or stream " +
+                             "images and scene annotations into tar shards ('shards').")
+    parser.add_argument('--shard_max_bytes', default=1 << 30, type=int,
+                        help="Maximum size in bytes of a single tar shard.")
+    parser.add_argument('--shard_prefix', default='shard',
+                        help="Name prefix of the tar shards. Processes writing shards into the " +
+                             "same directory need different prefixes; supervisor.py gives " +
+                             "every worker its own.")
+    parser.add_argument('--scratch_dir', default=None,
+                        help="Local directory to render into when the output directory is on " +
+                             "shared storage; finished images are published to the output " +
+                             "directory in batches by a background thread (see staging.py).")
+    parser.add_argument('--staging_batch', default=16, type=int,
+                        help="Number of images published together with --scratch_dir; with " +
+                             "--output_format shards, every batch becomes one tar shard.")
+    parser.add_argument('--variants', default='none', choices=['none', 'hide_each'],
+                        help="With 'hide_each', every scene is additionally rendered once per " +
+                             "object with that object hidden; the variants are listed in the " +
+                             "\"variants\" field of the parent scene annotation.")
+    parser.add_argument('--incremental_variants', default=0, type=int,
+                        help="Setting --incremental_variants 1 renders each variant only in the " +
+                             "padded screen region of the hidden object and composites it into " +
+                             "the full render of the scene.")
+    parser.add_argument('--incremental_pad', default=0.5, type=float,
+                        help="Padding of the re-rendered region for shadows and reflections, " +
+                             "as a fraction of the size of the changed objects on screen.")
+    parser.add_argument('--verify_incremental', default=0, type=int,
+                        help="Setting --verify_incremental 1 additionally renders every " +
+                             "incremental variant in full and records the pixel difference.")
+    parser.add_argument('--num_objects', default=3, type=int,
+                        help="The number of objects to place in each scene")
+    parser.add_argument('--placement_extent', default=3.0, type=float,
+                        help="Objects are placed in [-extent, extent] along both ground axes; " +
+                             "crowded scenes need a larger area.")
+    parser.add_argument('--min_dist', default=0.25, type=float,
+                        help="The minimum allowed distance between object footprints")
+    parser.add_argument('--margin', default=0.4, type=float,
+                        help="Along all cardinal directions (left, right, front, back), all " +
+                             "objects will be at least this distance apart. This makes resolving " +
+                             "spatial relationships slightly less ambiguous.")
+    parser.add_argument('--neighbor_radius', default=0.0, type=float,
+                        help="For crowded scenes: a positive radius limits directional " +
+                             "relationships and the placement margin to objects closer than " +
+                             "the radius, found with a grid index, and adds the \"near\" and " +
+                             "\"touching\" relationships. 0 relates all pairs of objects.")
+    parser.add_argument('--neighbor_k', default=0, type=int,
+                        help="With --neighbor_radius, the k nearest objects of every object " +
+                             "are its neighbors as well, even if further away.")
+    parser.add_argument('--touch_eps', default=0.05, type=float,
+                        help="Objects whose footprints are at most this far apart are touching.")
+    parser.add_argument('--amodal_masks', default=0, type=int,
+                        help="Setting --amodal_masks 1 renders flat ID color passes of the objects " +
+                             "after each scene and stores the visible and amodal pixel counts, " +
+                             "the occlusion_ratio and the visible and amodal masks (COCO RLE) of " +
+                             "every object in the scene annotation, and in every entry of " +
+                             "\"resolutions\" for the lower resolutions.")
+    parser.add_argument('--num_frames', default=1, type=int,
+                        help="With more than 1 frame, every scene becomes a short clip of " +
+                             "objects moving on collision-free straight lines, rendered as one " +
+                             "animation; per-frame annotations are listed in \"frames\".")
+    parser.add_argument('--max_travel', default=1.5, type=float,
+                        help="Maximum distance an object moves during a clip.")
+    parser.add_argument('--num_views', default=1, type=int,
+                        help="Number of cameras in the camera rig. Every placed layout is " +
+                             "rendered from all of them; the additional views are listed in " +
+                             "the \"views\" field of the scene annotation.")
+    parser.add_argument('--resolutions', default=[320], type=int, nargs='+',
+                        help="Output resolutions. Scenes are rendered once at the largest one; " +
+                             "the others must divide it and are produced by area averaging. " +
+                             "They are listed in the \"resolutions\" field of the annotation.")
+    parser.add_argument('--engine', default='CYCLES',
+                        choices=['CYCLES', 'BLENDER_EEVEE', 'BLENDER_EEVEE_NEXT', 'BLENDER_WORKBENCH'],
+                        help="Render engine. EEVEE and Workbench render fast draft images for " +
+                             "previews and pipeline dry-runs; annotations are the same as with " +
+                             "CYCLES.")
+    parser.add_argument('--draft_samples', default=16, type=int,
+                        help="Samples per pixel for the EEVEE engine; with Workbench, 1 disables " +
+                             "anti-aliasing.")
+    parser.add_argument('--render_retries', default=3, type=int,
+                        help="Number of times a failed render is retried before giving up.")
+    parser.add_argument('--render_backoff', default=1.0, type=float,
+                        help="Initial wait in seconds between render retries; doubles each time.")
+    parser.add_argument('--indices_file', default=None,
+                        help="JSON file with the list of image indices to render, in order. " +
+                             "Used by supervisor.py to resume a worker.")
+    parser.add_argument('--progress_file', default=None,
+                        help="Every finished image index is appended to this file, and a heartbeat " +
+                             "line for every rendered image that is not reported as finished yet.")
+    parser.add_argument('--trace_dir', default=None,
+                        help="Directory to write a Chrome trace of this process into, with spans " +
+                             "for the stages of every image; see tracing.py merge.")
+    parser.add_argument('--timings_file', default=None,
+                        help="If given, the seconds spent on every image and its cost features " +
+                             "are appended to this JSON Lines file; see cost.py fit.")
+    parser.add_argument('--balanced_sampling', default=0, type=int,
+                        help="Setting --balanced_sampling 1 draws object attributes from a " +
+                             "stratified sampler that exactly hits the target distributions " +
+                             "over the rendered images instead of sampling them uniformly. " +
+                             "The targets are planned over --start_idx and --num_images, so a " +
+                             "repair run needs the same values as the original run.")
+    parser.add_argument('--attribute_distributions', default=None,
+                        help="Optional JSON file with target weights per attribute value for " +
+                             "balanced sampling, e.g. {\"color\": {\"red\": 2, \"blue\": 1}}; " +
+                             "attributes that are not listed are uniform.")
+    parser.add_argument('--seed', default=None, type=int,
+                        help="If given, the random state of image i is seeded with seed + i, so " +
+                             "that any single image can be re-rendered identically.")
+    parser.add_argument('--repair_report', default=None,
+                        help="Report written by validate.py; only the indices listed in its " +
+                             "repair_indices are rendered.")
+    parser.add_argument('--extend', default=0, type=int,
+                        help="Setting --extend 1 adds --num_images new images to the dataset in " +
+                             "--output_path, starting at the index high-water mark and with the " +
+                             "seed recorded in its manifest.json.")
+    parser.add_argument('--object_pool', default=0, type=int,
+                        help="Setting --object_pool 1 keeps the objects of a scene and reuses the " +
+                             "ones with the same shape and material in the next scene.")
+    parser.add_argument('--reorder_window', default=0, type=int,
+                        help="With --seed and --object_pool 1, reorder the images within windows " +
+                             "of this many so that consecutive scenes share shapes and " +
+                             "materials; image indices do not change. 0 keeps the order.")
+    parser.add_argument('--stats_dir', default=None,
+                        help="If given, dataset statistics are aggregated while rendering and " +
+                             "saved to stats_<pid>.npz in this directory, relative to the " +
+                             "repository root. Combine the partials with stats.py merge.")
+    parser.add_argument('--resource_log', default=None,
+                        help="If given, the bpy.data block counts, orphan counts and RSS after " +
+                             "every image are appended to this JSON Lines file.")
+    parser.add_argument('--resource_warn_blocks', default=100, type=int,
+                        help="Warn when a bpy.data collection grows by more than this many " +
+                             "blocks over the run.")
+    parser.add_argument('--resource_warn_rss', default=512, type=int,
+                        help="Warn when the RSS grows by more than this many megabytes over " +
+                             "the run.")
+    parser.add_argument('--purge_orphans', default=0, type=int,
+                        help="Purge orphan data-blocks every N images; 0 disables purging.")
+    parser.add_argument('--recycle_images', default=0, type=int,
+                        help="Exit after this many images so that supervisor.py restarts the " +
+                             "worker with a fresh Blender process; 0 disables the limit.")
+    parser.add_argument('--recycle_minutes', default=0.0, type=float,
+                        help="Exit after the first image finished past this many minutes; " +
+                             "0 disables the limit.")
+    parser.add_argument('--recycle_rss', default=0, type=int,
+                        help="Exit after the first image finished with the RSS above this many " +
+                             "megabytes; 0 disables the limit.")
+    parser.add_argument('--stats_interval', default=1, type=int,
+                        help="Number of images between two saves of the statistics partial. " +
+                             "Images are reported as finished to the supervisor only after a " +
+                             "save. With --scratch_dir, the partial is saved whenever a batch " +
+                             "is published instead, and only counts published images.")
+
     argv = extract_args()
     args = parser.parse_args(argv)
 
@@ -398,12 +712,24 @@ def args_parser():
     if os.path.isfile(args_file_path):
         with open(args_file_path, 'r') as fp:
             loaded_args = json.load(fp)
-        # Replace given_args with the loaded default values
+        # Replace given_args with the loaded default values, except for the ones
+        # that were given explicitly on the command line
+        given = {a[2:].split('=')[0] for a in argv if a.startswith('--')}
         for key, value in loaded_args.items():
-            if key not in ["whitelist"]:  # Do not overwrite these keys
+            if key not in ["whitelist"] and key not in given:  # Do not overwrite these keys
                 setattr(args, key, value)
         print('\n==> Args were loaded from file "{}".'.format(args_file_path))
     else:
         print('\n==> Args file "{}" was not found!'.format(args_file_path))
 
+    # motion sequences render one clip per scene from the main camera only
+    if args.num_frames > 1:
+        unsupported = [flag for flag, used in [('--variants', args.variants != 'none'),
+                                               ('--num_views', args.num_views > 1),
+                                               ('--resolutions', len(args.resolutions) > 1),
+                                               ('--amodal_masks', args.amodal_masks == 1),
+                                               ('--object_pool', args.object_pool == 1)] if used]
+        if unsupported:
+            parser.error("%s cannot be combined with --num_frames > 1" % ", ".join(unsupported))
+
     return args
@@ -0,0 +1,254 @@
+import argparse, io, json, os, struct
+from multiprocessing import Pool
+from pathlib import Path
+
+import columnar
+import shards
+
+"""
+Dataset integrity validator. Every image index of a generated dataset (output
+directory or shard directory) is checked for
+
+- a readable image with the expected resolution (only the PNG header is read
+  unless --decode is given),
+- a schema-valid scene annotation whose image_filename matches the index and
+  whose pixel_coords lie inside the image.
+
+Besides the output of create_scene.py (NNNNN.render.png next to
+NNNNN.scene.json), the output of copy.py is supported with --image_dir: the
+scenes <prefix>_<split>_NNNNNN.json in path and the images of the same name
+with .png in image_dir.
+
+Indices are checked in chunks on a process pool. The report groups problems
+into "missing", "corrupt" and "inconsistent" entries and lists all affected
+indices under "repair_indices"; create_scene.py re-renders exactly those when
+it is given the report as repair_report.
+"""
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+OBJECT_KEYS = ["shape", "size", "material", "3d_coords", "rotation", "pixel_coords", "color"]
+SCENE_KEYS = ["image_index", "image_filename", "objects", "relationships", "directions"]
+
+# per-process state set up by init_worker
+_source = None
+
+
+def image_filename(index):
+    return f"{str(index).zfill(5)}.render.png"
+
+
+def scene_filename(index):
+    return f"{str(index).zfill(5)}.scene.json"
+
+
+class Source:
+    """ Read-only access to the images and annotations of a dataset """
+
+    def __init__(self, path, image_dir=None):
+        self.path = Path(path)
+        self.image_dir = Path(image_dir) if image_dir else None
+        self.reader = None
+        self.template = None
+        if shards.is_shard_dir(self.path):
+            self.reader = shards.ShardReader(self.path)
+        elif self.image_dir is not None:
+            # copy.py names files like CLEVR_new_000000, the prefix and number
+            # of digits are taken from the files found
+            for fn in sorted(os.listdir(str(self.path))) + sorted(os.listdir(str(self.image_dir))):
+                stem, ext = os.path.splitext(fn)
+                prefix, _, number = stem.rpartition("_")
+                if ext in (".json", ".png") and prefix and number.isdigit():
+                    self.template = "%s_%%0%dd" % (prefix, len(number))
+                    break
+
+    def indices(self):
+        if self.reader is not None:
+            return self.reader.indices()
+        if self.image_dir is not None:
+            found = set()
+            for d, ext in [(self.path, ".json"), (self.image_dir, ".png")]:
+                for fn in os.listdir(str(d)):
+                    number = os.path.splitext(fn)[0].rpartition("_")[2]
+                    if fn.endswith(ext) and number.isdigit():
+                        found.add(int(number))
+            return sorted(found)
+        return sorted({int(fn.split(".")[0]) for fn in os.listdir(str(self.path))
+                       if fn.endswith(".render.png") or fn.endswith(".scene.json")})
+
+    def image_filename(self, index):
+        """ Expected image_filename of the annotation of index """
+        if self.template is not None:
+            return self.template % index + ".png"
+        return image_filename(index)
+
+    def image_path(self, index):
+        if self.template is not None:
+            return self.image_dir / self.image_filename(index)
+        return self.path / image_filename(index)
+
+    def scene_path(self, index):
+        if self.template is not None:
+            return self.path / (self.template % index + ".json")
+        return self.path / scene_filename(index)
+
+    def read_image(self, index):
+        """ Encoded image bytes, or None if the image does not exist """
+        if self.reader is not None:
+            name = "%s.png" % shards.member_key(index)
+            return self.reader.read(name) if name in self.reader else None
+        path = self.image_path(index)
+        if not path.is_file():
+            return None
+        with open(str(path), "rb") as f:
+            return f.read()
+
+    def read_scene(self, index):
+        """ Raw annotation bytes, or None if the annotation does not exist """
+        if self.reader is not None:
+            name = "%s.json" % shards.member_key(index)
+            return self.reader.read(name) if name in self.reader else None
+        path = self.scene_path(index)
+        if not path.is_file():
+            return None
+        with open(str(path), "rb") as f:
+            return f.read()
+
+
+def png_size(data):
+    """ (width, height) from the IHDR chunk of a PNG, or None if it is not a PNG """
+    if len(data) < 24 or data[:8] != PNG_SIGNATURE or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def check_scene(index, scene, width, height, vocabularies, expected_filename=None):
+    """
+    Return a list of consistency problems of one scene annotation.
+    expected_filename defaults to the image name create_scene.py uses.
+    """
+    problems = ["missing key %s" % k for k in SCENE_KEYS if k not in scene]
+    if problems:
+        return problems
+    if scene["image_index"] != index:
+        problems.append("image_index is %s" % scene["image_index"])
+    if scene["image_filename"] != (expected_filename or image_filename(index)):
+        problems.append("image_filename is %s" % scene["image_filename"])
+    num_objects = len(scene["objects"])
+    for i, obj in enumerate(scene["objects"]):
+        missing = [k for k in OBJECT_KEYS if k not in obj]
+        if missing:
+            problems.append("object %d misses %s" % (i, ", ".join(missing)))
+            continue
+        for attr, names in vocabularies.items():
+            if obj[attr] not in names:
+                problems.append("object %d has unknown %s %s" % (i, attr, obj[attr]))
+        px, py = obj["pixel_coords"][:2]
+        if not (0 <= px < width and 0 <= py < height):
+            problems.append("object %d pixel_coords (%s, %s) outside image" % (i, px, py))
+    for name, related in scene["relationships"].items():
+        if len(related) != num_objects or any(j < 0 or j >= num_objects
+                                              for js in related for j in js):
+            problems.append("relationship %s does not match objects" % name)
+    return problems
+
+
+def init_worker(path, image_dir, width, height, decode, vocabularies):
+    global _source
+    _source = (Source(path, image_dir), width, height, decode, vocabularies)
+
+
+def check_indices(indices):
+    """ Check a chunk of indices; returns (kind, index, reason) tuples """
+    source, width, height, decode, vocabularies = _source
+    results = []
+    for index in indices:
+        image = source.read_image(index)
+        if image is None:
+            results.append(("missing", index, "image"))
+        else:
+            size = png_size(image)
+            if size is None:
+                results.append(("corrupt", index, "image is not a PNG"))
+            elif size != (width, height):
+                results.append(("corrupt", index, "image size is %dx%d" % size))
+            elif decode:
+                from PIL import Image
+                try:
+                    Image.open(io.BytesIO(image)).load()
+                except Exception as e:
+                    results.append(("corrupt", index, "image does not decode: %s" % e))
+
+        data = source.read_scene(index)
+        if data is None:
+            results.append(("missing", index, "annotation"))
+            continue
+        try:
+            scene = json.loads(data.decode("utf-8"))
+        except ValueError as e:
+            results.append(("corrupt", index, "annotation is not valid JSON: %s" % e))
+            continue
+        for problem in check_scene(index, scene, width, height, vocabularies,
+                                   source.image_filename(index)):
+            results.append(("inconsistent", index, problem))
+    return results
+
+
+def validate(path, indices, width=320, height=320, decode=False, vocabularies=None,
+             num_workers=None, chunk_size=256, image_dir=None):
+    """
+    Validate the given indices of a dataset and return the report dict. With
+    image_dir, path is the scene directory of copy.py output.
+    """
+    report = {"num_checked": len(indices), "missing": [], "corrupt": [], "inconsistent": []}
+    chunks = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+    with Pool(num_workers, initializer=init_worker,
+              initargs=(str(path), image_dir and str(image_dir), width, height, decode,
+                        vocabularies or {})) as pool:
+        for results in pool.imap_unordered(check_indices, chunks):
+            for kind, index, reason in results:
+                report[kind].append({"index": index, "reason": reason})
+    for kind in ["missing", "corrupt", "inconsistent"]:
+        report[kind].sort(key=lambda entry: entry["index"])
+    report["repair_indices"] = sorted({entry["index"] for kind in ["missing", "corrupt", "inconsistent"]
+                                       for entry in report[kind]})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help="Output directory or shard directory to validate, or the " +
+                                     "scene directory of copy.py output")
+    parser.add_argument('--image_dir', default=None,
+                        help="Image directory of copy.py output; the images are named like the " +
+                             "scenes in path, with .png instead of .json")
+    parser.add_argument('--report', default='validation_report.json',
+                        help="Path of the JSON report to write")
+    parser.add_argument('--num_images', default=None, type=int,
+                        help="Expected number of images (indices 0 .. num_images - 1); by " +
+                             "default all indices up to the largest one found are checked.")
+    parser.add_argument('--resolution_x', default=320, type=int)
+    parser.add_argument('--resolution_y', default=320, type=int)
+    parser.add_argument('--decode', action='store_true',
+                        help="Fully decode every image instead of reading only its header")
+    parser.add_argument('--properties_json', default=str(Path(__file__).parent / "properties.json"),
+                        help="JSON file defining the valid attribute values")
+    parser.add_argument('--num_workers', default=None, type=int,
+                        help="Number of worker processes; defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    num_images = args.num_images
+    if num_images is None:
+        found = Source(args.path, args.image_dir).indices()
+        num_images = found[-1] + 1 if found else 0
+    report = validate(args.path, list(range(num_images)), args.resolution_x, args.resolution_y,
+                      decode=args.decode, vocabularies=columnar.load_vocabularies(args.properties_json),
+                      num_workers=args.num_workers, image_dir=args.image_dir)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print('==> Checked %d indices: %d missing, %d corrupt, %d inconsistent entries.'
+          % (report["num_checked"], len(report["missing"]), len(report["corrupt"]),
+             len(report["inconsistent"])))
+
+
+if __name__ == "__main__":
+    main()
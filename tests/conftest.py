@@ -0,0 +1,25 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+IMAGE_GENERATION = Path(__file__).parents[1] / "image_generation"
+sys.path.insert(0, str(IMAGE_GENERATION))
+
+import fake_bpy
+
+# the modules importing bpy run on the fake Blender backend
+fake_bpy.install()
+
+
+@pytest.fixture
+def generate(tmp_path):
+    """ Run create_scene.py on the fake backend through bench.py; returns the output directory """
+    def run(num_images, *script_args, name="output"):
+        output_path = tmp_path / name
+        subprocess.run([sys.executable, str(IMAGE_GENERATION / "bench.py"), "--num_images", str(num_images),
+                        "--output_path", str(output_path), "--"] + [str(a) for a in script_args],
+                       check=True, capture_output=True)
+        return output_path
+    return run
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import catalog
+
+PROPERTIES = Path(catalog.__file__).parent / "properties.json"
+
+
+def test_quotas_use_the_largest_remainders():
+    assert catalog.quotas([1, 1, 1], 10).tolist() == [4, 3, 3]
+    assert catalog.quotas([0.5, 0.25, 0.25], 7).tolist() == [3, 2, 2]
+    assert catalog.quotas([0, 1], 5).tolist() == [0, 5]
+    with pytest.raises(ValueError):
+        catalog.quotas([0, 0], 5)
+    with pytest.raises(ValueError):
+        catalog.quotas([1, -1], 5)
+
+
+def test_balanced_sampler_hits_the_targets_deterministically():
+    props = catalog.load_catalog(PROPERTIES)
+    distributions = {"shape": {"cube": 2, "sphere": 1, "cylinder": 1}}
+    sampler = catalog.BalancedSampler(props, 10, 4, distributions, seed=3, first_index=100)
+    codes = [sampler.image_codes(i) for i in range(100, 110)]
+    shapes = np.bincount([obj["shape"] for image in codes for obj in image], minlength=3)
+    assert shapes.tolist() == [20, 10, 10]
+
+    # the codes of an image only depend on the seed and its index, not on the
+    # other images a sampler was asked for before
+    other = catalog.BalancedSampler(props, 10, 4, distributions, seed=3, first_index=100)
+    for i in [107, 120, 101, 100]:
+        expected = codes[i - 100] if i < 110 else sampler.image_codes(i)
+        assert other.image_codes(i) == expected
+    different = catalog.BalancedSampler(props, 10, 4, distributions, seed=4, first_index=100)
+    assert [different.image_codes(i) for i in range(100, 110)] != codes
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+import columnar
+
+
+def test_append_npy_rewrites_the_header_in_place(tmp_path):
+    path = tmp_path / "column.npy"
+    first = np.arange(6, dtype=np.float32).reshape(3, 2)
+    np.save(str(path), first)
+    size = os.path.getsize(str(path))
+    rows = np.arange(6, 10, dtype=np.float32).reshape(2, 2)
+    columnar.append_npy(path, rows)
+    # only the data was added, the header kept its length
+    assert os.path.getsize(str(path)) == size + rows.nbytes
+    assert (np.load(str(path)) == np.concatenate([first, rows])).all()
+    with pytest.raises(ValueError):
+        columnar.append_npy(path, np.zeros((1, 3), dtype=np.float32))
+
+
+def test_append_ragged_offsets_new_rows(tmp_path):
+    np.save(str(tmp_path / "rel_indptr.npy"), np.array([0, 1, 1, 3], dtype=np.int64))
+    np.save(str(tmp_path / "rel.npy"), np.array([7, 8, 9], dtype=np.int64))
+    columns = {"rel_indptr": np.array([0, 2, 2], dtype=np.int64), "rel": np.array([4, 5], dtype=np.int64)}
+    columnar.append_ragged(tmp_path, "rel_indptr", "rel", columns, True, 3, 2)
+    assert np.load(str(tmp_path / "rel_indptr.npy")).tolist() == [0, 1, 1, 3, 5, 5]
+    assert np.load(str(tmp_path / "rel.npy")).tolist() == [7, 8, 9, 4, 5]
+    # new scenes without the column get empty rows
+    columnar.append_ragged(tmp_path, "rel_indptr", "rel", {}, True, 5, 2)
+    assert np.load(str(tmp_path / "rel_indptr.npy")).tolist() == [0, 1, 1, 3, 5, 5, 5, 5]
+
+
+def test_append_ragged_adds_a_new_column(tmp_path):
+    columns = {"rel_indptr": np.array([0, 1, 3], dtype=np.int64), "rel": np.array([1, 0, 2], dtype=np.int64)}
+    columnar.append_ragged(tmp_path, "rel_indptr", "rel", columns, False, 3, 2)
+    # the objects already stored have no entries
+    assert np.load(str(tmp_path / "rel_indptr.npy")).tolist() == [0, 0, 0, 0, 1, 3]
+    assert np.load(str(tmp_path / "rel.npy")).tolist() == [1, 0, 2]
@@ -0,0 +1,31 @@
+import numpy as np
+
+import cost
+
+
+def test_cost_model_recovers_linear_costs(tmp_path):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([np.ones(50), rng.integers(3, 10, 50), rng.random(50), rng.random(50)])
+    model = cost.CostModel.fit(X, X @ np.array([2.0, 0.5, 3.0, 0.0]))
+    model.save(tmp_path / "model.json")
+    assert np.allclose(cost.CostModel.load(tmp_path / "model.json").coefficients, [2.0, 0.5, 3.0, 0.0])
+    assert model.predict(np.zeros((1, 4)))[0] > 0
+
+
+def test_lpt_schedule_balances_the_workers():
+    rng = np.random.default_rng(1)
+    indices = list(range(100, 160))
+    costs = rng.exponential(1.0, size=len(indices))
+    cost_of = dict(zip(indices, costs))
+    schedule = cost.lpt_schedule(indices, costs, 4)
+    assert sorted(i for worker in schedule for i in worker) == indices
+    # LPT is within 4/3 of the optimum, which is at least the average load
+    assert cost.makespan(schedule, cost_of) <= 4 / 3 * max(costs.sum() / 4, costs.max()) + 1e-9
+    round_robin = [indices[k::4] for k in range(4)]
+    assert cost.makespan(schedule, cost_of) <= cost.makespan(round_robin, cost_of)
+
+
+def test_balanced_shards_are_contiguous():
+    costs = [1, 1, 1, 1, 4, 4]
+    shards = cost.balanced_shards(list(range(6)), costs, 3)
+    assert shards == [[0, 1, 2, 3], [4], [5]]
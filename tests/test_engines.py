@@ -0,0 +1,6 @@
+def test_draft_engines_give_the_same_annotations(generate):
+    outputs = [generate(2, "--seed", 7, "--engine", engine, name=engine)
+               for engine in ["CYCLES", "BLENDER_EEVEE", "BLENDER_WORKBENCH"]]
+    for fn in ["00000.scene.json", "00001.scene.json"]:
+        scenes = [(output / fn).read_text() for output in outputs]
+        assert scenes[1] == scenes[0] and scenes[2] == scenes[0]
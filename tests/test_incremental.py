@@ -0,0 +1,27 @@
+import json
+
+import numpy as np
+
+import incremental
+
+
+def test_composite_only_replaces_the_region():
+    base = np.zeros((4, 6, 4), dtype=np.uint8)
+    region_img = np.full((4, 6, 4), 9, dtype=np.uint8)
+    img = incremental.composite(base, region_img, (1, 2, 4, 4))
+    assert (img[2:4, 1:4] == 9).all()
+    assert img.sum() == 9 * 2 * 3 * 4
+    assert base.sum() == 0
+
+
+def test_incremental_variants_match_full_renders(generate):
+    output = generate(2, "--num_objects", 4, "--variants", "hide_each", "--incremental_variants", 1,
+                      "--verify_incremental", 1, "--engine", "BLENDER_WORKBENCH", "--seed", 1)
+    for fn in ["00000.scene.json", "00001.scene.json"]:
+        with open(str(output / fn), "r") as f:
+            variants = json.load(f)["variants"]
+        assert len(variants) == 4
+        for v in variants:
+            # only a part of the frame is rendered again, with the same result
+            assert 0 < v["incremental"]["fraction"] < 1
+            assert v["incremental"]["max_abs_diff"] == 0
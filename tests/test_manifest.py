@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import manifest
+import shards
+
+
+def test_append_scene_file_extends_the_scene_list(tmp_path):
+    scene_file = str(tmp_path / "scenes.json")
+    manifest.append_scene_file(scene_file, [])
+    manifest.append_scene_file(scene_file, [{"image_index": 0}])
+    manifest.append_scene_file(scene_file, [{"image_index": 1}, {"image_index": 2}])
+    with open(scene_file, "r") as f:
+        data = json.load(f)
+    assert [scene["image_index"] for scene in data["scenes"]] == [0, 1, 2]
+
+    other = tmp_path / "other.json"
+    other.write_text(json.dumps({"scenes": [], "info": {}}))
+    with pytest.raises(ValueError):
+        manifest.append_scene_file(str(other), [{"image_index": 0}])
+
+
+def test_discover_next_index_of_file_layouts(tmp_path):
+    assert manifest.discover_next_index(tmp_path / "missing") == 0
+    assert manifest.discover_next_index(tmp_path) == 0
+    for fn in ["00000.scene.json", "00004.scene.json", "00004.render.png", manifest.MANIFEST_FILENAME]:
+        (tmp_path / fn).write_text("{}")
+    assert manifest.discover_next_index(tmp_path) == 5
+
+    templated = tmp_path / "templated"
+    templated.mkdir()
+    (templated / "CLEVR_new_000007.json").write_text("{}")
+    assert manifest.discover_next_index(templated) == 8
+
+
+def test_discover_next_index_of_shards(tmp_path):
+    with shards.ShardWriter(tmp_path, prefix="shard-w0") as writer:
+        writer.write_sample(2, {"json": b"{}"})
+    with shards.ShardWriter(tmp_path, prefix="shard-w1") as writer:
+        writer.write_sample(9, {"json": b"{}"})
+    assert manifest.discover_next_index(tmp_path) == 10
@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+
+import masks
+import multires
+import rle
+
+
+def test_occlusion_counts_hidden_pixels():
+    index_map = np.array([[0, 1, 1, 2],
+                          [0, 1, 2, 2]])
+    amodal = np.zeros((3, 2, 4), dtype=bool)
+    amodal[0, :, 1:3] = True
+    amodal[1, :, 2:4] = True
+    occlusion = masks.occlusion(index_map, amodal)
+    assert occlusion[0] == {"visible_pixels": 3, "amodal_pixels": 4, "occlusion_ratio": 0.25}
+    assert occlusion[1] == {"visible_pixels": 3, "amodal_pixels": 4, "occlusion_ratio": 0.25}
+    # an object outside of the image has no ratio
+    assert occlusion[2] == {"visible_pixels": 0, "amodal_pixels": 0, "occlusion_ratio": None}
+
+
+def test_masks_of_every_resolution_level(generate):
+    output = generate(1, "--amodal_masks", 1, "--resolutions", 320, 160, 80, "--seed", 3)
+    with open(str(output / "00000.scene.json"), "r") as f:
+        scene = json.load(f)
+    objects = scene["objects"]
+    visible = rle.decode_masks([obj["mask"] for obj in objects])
+    amodal = rle.decode_masks([obj["amodal_mask"] for obj in objects])
+    assert visible.any() and (amodal | ~visible).all()
+    for obj, v, a in zip(objects, visible, amodal):
+        assert obj["visible_pixels"] == v.sum() and obj["amodal_pixels"] == a.sum()
+    for level in scene["resolutions"]:
+        factor = 320 // level["resolution"]
+        assert (rle.decode_masks(level["masks"]) == multires.downsample_labels(visible, factor)).all()
+        assert (rle.decode_masks(level["amodal_masks"]) == multires.downsample_labels(amodal, factor)).all()
@@ -0,0 +1,32 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import multires
+
+
+def test_levels_average_blocks_and_keep_labels():
+    img = np.arange(4 * 4 * 4, dtype=np.uint8).reshape(4, 4, 4)
+    level = multires.downsample(img, 2)
+    assert level.shape == (2, 2, 4)
+    assert (level[0, 0] == np.round(img[:2, :2].reshape(-1, 4).mean(axis=0))).all()
+    labels = np.arange(16).reshape(4, 4)
+    # the center sample of every block, never a mix of labels
+    assert multires.downsample_labels(labels, 2).tolist() == [[5, 7], [13, 15]]
+    assert multires.downsample_labels(np.stack([labels, labels]), 2).shape == (2, 2, 2)
+
+
+def test_pixel_coords_map_into_the_level():
+    coords = multires.rescale_pixel_coords([(0, 0, 1.0), (319, 160, 2.0), (3, 5, 3.0)], 4)
+    assert coords == [(0, 0, 1.0), (79, 40, 2.0), (0, 1, 3.0)]
+    assert multires.level_factor(320, 80) == 4
+    with pytest.raises(ValueError):
+        multires.level_factor(320, 100)
+
+
+def test_encoded_levels_are_valid_pngs():
+    img = np.random.default_rng(0).integers(0, 256, size=(8, 6, 4), dtype=np.uint8)
+    decoded = np.asarray(Image.open(io.BytesIO(multires.encode_png(img))))
+    assert (decoded == img).all()
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import catalog
+import ordering
+
+PROPERTIES = Path(catalog.__file__).parent / "properties.json"
+DIRECTIONS = {"left": (-1.0, 0.0, 0.0), "right": (1.0, 0.0, 0.0), "front": (0.0, -1.0, 0.0),
+              "behind": (0.0, 1.0, 0.0), "above": (0.0, 0.0, 1.0), "below": (0.0, 0.0, -1.0)}
+
+
+def test_reordering_stays_within_windows_and_saves_edits():
+    props = catalog.load_catalog(PROPERTIES)
+    layouts = ordering.plan_layouts(DIRECTIONS, range(100), 0, props, num_objects=5)
+    order = ordering.order_layouts(layouts, props, window=16)
+    assert sorted(order) == list(range(100))
+    assert [k // 16 for k in order] == sorted(k // 16 for k in order)
+    assert ordering.total_edits(layouts, props, order) < ordering.total_edits(layouts, props, list(range(100)))
+
+
+def test_reordered_pooled_run_keeps_every_annotation(generate):
+    plain = generate(12, "--seed", 5, name="plain")
+    pooled = generate(12, "--seed", 5, "--object_pool", 1, "--reorder_window", 8, name="pooled")
+    for k in range(12):
+        fn = "%05d.scene.json" % k
+        assert (pooled / fn).read_text() == (plain / fn).read_text()
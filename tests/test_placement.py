@@ -0,0 +1,64 @@
+import json
+import math
+import random
+from pathlib import Path
+
+import catalog
+import placement
+
+PROPERTIES = Path(catalog.__file__).parent / "properties.json"
+DIRECTIONS = {"left": (-0.8, -0.6, 0.0), "right": (0.8, 0.6, 0.0), "front": (0.6, -0.8, 0.0),
+              "behind": (-0.6, 0.8, 0.0), "above": (0.0, 0.0, 1.0), "below": (0.0, 0.0, -1.0)}
+
+
+def baseline_layout(rng, num_objects):
+    """ The random calls of the original utils.add_random_objects, without Blender """
+    with open(str(PROPERTIES), "r") as f:
+        properties = json.load(f)
+    object_mapping = [(v, k) for k, v in properties["shapes"].items()]
+    size_mapping = list(properties["sizes"].items())
+    colors = list(properties["colors"].items())
+    material_mapping = [(v, k) for k, v in properties["materials"].items()]
+    positions, layout = [], []
+    for i in range(num_objects):
+        size_name, r = rng.choice(size_mapping)
+        num_tries = 0
+        while True:
+            num_tries += 1
+            if num_tries > 50:
+                return baseline_layout(rng, num_objects)
+            x = rng.uniform(-3, 3)
+            y = rng.uniform(-3, 3)
+            good = True
+            for (xx, yy, rr) in positions:
+                dx, dy = x - xx, y - yy
+                if math.sqrt(dx * dx + dy * dy) - r - rr < 0.25:
+                    good = False
+                    break
+                if any(0 < dx * DIRECTIONS[d][0] + dy * DIRECTIONS[d][1] < 0.4
+                       for d in ["left", "right", "front", "behind"]):
+                    good = False
+                    break
+            if good:
+                break
+        obj_name, obj_name_out = rng.choice(object_mapping)
+        color_name, _ = rng.choice(colors)
+        if obj_name == "Cube":
+            r /= math.sqrt(2)
+        theta = 360.0 * rng.random()
+        positions.append((x, y, r))
+        _, mat_name_out = rng.choice(material_mapping)
+        layout.append((obj_name_out, color_name, mat_name_out, size_name, x, y, r, theta))
+    return layout
+
+
+def test_sample_layout_keeps_the_baseline_random_calls():
+    props = catalog.load_catalog(PROPERTIES)
+    for seed in range(5):
+        # crowded enough to restart the layout now and then
+        expected_rng, rng = random.Random(seed), random.Random(seed)
+        expected = baseline_layout(expected_rng, 9)
+        layout = placement.sample_layout(DIRECTIONS, 9, props, rng=rng)
+        assert [(props.shapes[o["shape"]], props.colors[o["color"]], props.materials[o["material"]],
+                 props.sizes[o["size"]], o["x"], o["y"], o["r"], o["theta"]) for o in layout] == expected
+        assert rng.random() == expected_rng.random()
@@ -0,0 +1,52 @@
+import random
+
+import columnar
+import query
+from conftest import IMAGE_GENERATION
+
+
+def random_scenes(rng, vocabularies, num_scenes):
+    scenes = []
+    for s in range(num_scenes):
+        # one scene with more objects than fit into one bitset word
+        n = 70 if s == 3 else rng.randint(0, 6)
+        objects = [{
+            "shape": rng.choice(vocabularies["shape"]),
+            "size": rng.choice(vocabularies["size"]),
+            "material": rng.choice(vocabularies["material"]),
+            "color": rng.choice(vocabularies["color"][:3]),
+            "3d_coords": [rng.uniform(-3, 3), rng.uniform(-3, 3), 0.5],
+            "rotation": 0.0,
+            "pixel_coords": [0, 0, 0.0],
+        } for _ in range(n)]
+        left = [[j for j in range(n) if objects[j]["3d_coords"][0] < objects[i]["3d_coords"][0]]
+                for i in range(n)]
+        scenes.append({"image_index": 100 + s, "objects": objects, "relationships": {"left": left}})
+    return scenes
+
+
+def brute_force_related(scenes, subject, relation, anchor):
+    def matches(obj, attrs):
+        return all(obj[k] == v for k, v in attrs.items())
+    return [scene["image_index"] for scene in scenes
+            if any(matches(obj, anchor) and
+                   any(matches(scene["objects"][j], subject)
+                       for j in scene["relationships"][relation][i])
+                   for i, obj in enumerate(scene["objects"]))]
+
+
+def test_queries_match_a_scan_of_the_scenes(tmp_path):
+    vocabularies = columnar.load_vocabularies(IMAGE_GENERATION / "properties.json")
+    scenes = random_scenes(random.Random(0), vocabularies, 40)
+    columnar.export_scenes(scenes, tmp_path, vocabularies)
+    index = query.SceneIndex(columnar.ColumnarStore(tmp_path))
+
+    expected = [scene["image_index"] for scene in scenes
+                if any(o["shape"] == "cube" and o["size"] == "large" for o in scene["objects"])]
+    assert index.scenes(shape="cube", size="large").tolist() == expected
+
+    for subject, anchor in [(dict(shape="cube"), dict(color="red", shape="sphere")),
+                            (dict(size="large", material="metal"), dict(color="blue")),
+                            (dict(color="gray"), dict(shape="cylinder", size="small"))]:
+        assert index.scenes_related(subject, "left", anchor).tolist() == \
+            brute_force_related(scenes, subject, "left", anchor)
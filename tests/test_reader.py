@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import columnar
+import reader
+import rle
+from conftest import IMAGE_GENERATION
+
+
+def test_packed_images_and_annotations(generate, tmp_path):
+    output = generate(4, "--amodal_masks", 1, "--seed", 1)
+    pngs = dict(reader.iter_images(output))
+    reader.pack_images(reader.iter_images(output), tmp_path / "pack", 4, chunk_size=3)
+    # the last image has no annotation in the store
+    scenes = [s for s in columnar.iter_scenes(output) if s["image_index"] < 3]
+    columnar.export_scenes(scenes, tmp_path / "store",
+                           columnar.load_vocabularies(IMAGE_GENERATION / "properties.json"))
+    images = reader.ImageReader(tmp_path / "pack", annotations=tmp_path / "store")
+
+    assert len(images) == 4
+    decoded = np.stack([reader.decode_png(pngs[i]) for i in range(4)])
+    assert (images[-1] == decoded[3]).all()
+    # a batch inside one chunk is a view of the chunk file, across chunks a copy
+    assert isinstance(images.batch(0, 2), np.memmap)
+    assert (images.batch(1, 4) == decoded[1:4]).all()
+    assert (images.take([3, 0]) == decoded[[3, 0]]).all()
+
+    assert images.scene_rows.tolist() == [0, 1, 2, -1]
+    for i in range(3):
+        scene = images.scene(i)
+        assert scene["image_index"] == i
+        assert [obj["shape"] for obj in scene["objects"]] == \
+            [obj["shape"] for obj in scenes[i]["objects"]]
+        expected = rle.decode_masks([obj["amodal_mask"] for obj in scenes[i]["objects"]])
+        assert (images.masks(i, "amodal_mask") == expected).all()
+    with pytest.raises(KeyError):
+        images.scene(3)
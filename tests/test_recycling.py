@@ -0,0 +1,31 @@
+import subprocess
+import time
+from argparse import Namespace
+
+import pytest
+
+import create_scene
+
+
+def test_recycling_policy():
+    args = Namespace(recycle_images=0, recycle_minutes=0.0, recycle_rss=0)
+    now = time.time()
+    assert create_scene.recycle_reason(args, 1000, now - 3600, 10 << 30) is None
+    args.recycle_images = 50
+    assert create_scene.recycle_reason(args, 49, now, 0) is None
+    assert create_scene.recycle_reason(args, 50, now, 0) == "50 images"
+    args = Namespace(recycle_images=0, recycle_minutes=2.0, recycle_rss=0)
+    assert create_scene.recycle_reason(args, 1, now - 60, 0) is None
+    assert create_scene.recycle_reason(args, 1, now - 121, 0) == "2.0 minutes"
+    args = Namespace(recycle_images=0, recycle_minutes=0.0, recycle_rss=512)
+    assert create_scene.recycle_reason(args, 1, now, 511 << 20) is None
+    assert create_scene.recycle_reason(args, 1, now, 600 << 20) == "RSS 600 MB"
+
+
+def test_recycled_worker_exits_with_the_recycle_code(generate, tmp_path):
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        generate(5, "--recycle_images", 2)
+    assert error.value.returncode == create_scene.supervisor.RECYCLE_EXIT_CODE
+    # the worker stops between images, after the images of the policy
+    assert sorted(p.name for p in (tmp_path / "output").glob("*.scene.json")) == \
+        ["00000.scene.json", "00001.scene.json"]
@@ -0,0 +1,26 @@
+import json
+
+import bpy
+import resources
+
+
+def test_tracker_reports_leaking_collections(tmp_path, capsys):
+    log_path = tmp_path / "resources.jsonl"
+    tracker = resources.ResourceTracker(log_path, warn_blocks=3, warn_rss=1 << 40)
+    leaked = []
+    for index in range(4):
+        # every image leaks two orphan meshes
+        leaked += [bpy.data.meshes.new("leak") for _ in range(2)]
+        tracker.record(index)
+    out = capsys.readouterr().out
+    assert out.count("Warning: bpy.data.meshes grew by") == 1
+    assert tracker.summary()["meshes_per_image"] == 2.0
+    with open(str(log_path), "r") as f:
+        entries = [json.loads(line) for line in f]
+    assert [e["index"] for e in entries] == [0, 1, 2, 3]
+    assert entries[-1]["orphans"]["meshes"] - entries[0]["orphans"]["meshes"] == 6
+
+    # purging removes the orphans
+    tracker = resources.ResourceTracker(purge_interval=1)
+    assert tracker.record(4)["purged"] >= len(leaked)
+    assert not any(mesh.name in bpy.data.meshes for mesh in leaked)
@@ -0,0 +1,55 @@
+import numpy as np
+
+import rle
+
+
+def coco_encode(mask):
+    """ Reference RLE of one mask, transcribed from rleEncode and rleToString of the COCO API """
+    counts, value, run = [], 0, 0
+    for pixel in np.asarray(mask, dtype=bool).T.ravel():
+        if pixel != value:
+            counts.append(run)
+            run, value = 0, pixel
+        run += 1
+    counts.append(run)
+    chars = []
+    for i, count in enumerate(counts):
+        x = count - counts[i - 2] if i > 2 else count
+        more = True
+        while more:
+            c = x & 0x1f
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return {"size": list(mask.shape), "counts": "".join(chars)}
+
+
+def random_index_map(rng, h, w, num_objects):
+    index_map = np.zeros((h, w), dtype=np.int32)
+    for k in range(num_objects):
+        y, x = rng.integers(0, h), rng.integers(0, w)
+        index_map[max(y - 5, 0):y + 6, max(x - 8, 0):x + 9] = k + 1
+    return index_map
+
+
+def test_encode_index_map_matches_coco_reference():
+    rng = np.random.default_rng(0)
+    index_map = random_index_map(rng, 37, 53, 6)
+    # the last object is outside of the image, its mask is empty
+    rles = rle.encode_index_map(index_map, 7)
+    assert rles == [coco_encode(index_map == k + 1) for k in range(7)]
+    assert (rle.decode_index_map(rles) == index_map).all()
+
+
+def test_encode_masks_matches_coco_reference_and_round_trips():
+    rng = np.random.default_rng(1)
+    masks = rng.random((5, 24, 31)) < 0.4
+    masks[0] = False
+    masks[1] = True
+    # large runs need several 5-bit chunks and negative deltas
+    masks[2, :, :20] = True
+    rles = rle.encode_masks(masks)
+    assert rles == [coco_encode(mask) for mask in masks]
+    assert (rle.decode_masks(rles) == masks).all()
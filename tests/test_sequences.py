@@ -0,0 +1,40 @@
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+
+import catalog
+import placement
+
+PROPERTIES = Path(catalog.__file__).parent / "properties.json"
+DIRECTIONS = {"left": (-1.0, 0.0, 0.0), "right": (1.0, 0.0, 0.0), "front": (0.0, -1.0, 0.0),
+              "behind": (0.0, 1.0, 0.0), "above": (0.0, 0.0, 1.0), "below": (0.0, 0.0, -1.0)}
+
+
+def test_trajectories_never_collide():
+    props = catalog.load_catalog(PROPERTIES)
+    for seed in range(10):
+        rng = random.Random(seed)
+        layout = placement.sample_layout(DIRECTIONS, 6, props, rng=rng)
+        positions = placement.sample_trajectories(layout, 200, max_travel=2.0, rng=rng)
+        start = np.array([[spec["x"], spec["y"]] for spec in layout])
+        radius = np.array([spec["r"] for spec in layout])
+        assert np.allclose(positions[0], start)
+        assert np.all(np.abs(positions) <= 3 + 1e-9)
+        assert np.all(np.linalg.norm(positions[-1] - start, axis=1) <= 2.0 + 1e-9)
+        dist = np.linalg.norm(positions[:, :, None, :] - positions[:, None, :, :], axis=3)
+        gap = dist - radius[:, None] - radius[None, :]
+        off_diagonal = ~np.eye(len(layout), dtype=bool)
+        assert np.all(gap[:, off_diagonal] >= 0.25 - 1e-9)
+
+
+def test_sequence_annotations_list_every_frame(generate):
+    output = generate(1, "--num_frames", 4, "--seed", 2)
+    with open(str(output / "00000.scene.json"), "r") as f:
+        scene = json.load(f)
+    frames = scene["frames"]
+    assert [frame["frame"] for frame in frames] == [1, 2, 3, 4]
+    for frame in frames:
+        assert (output / frame["image_filename"]).is_file()
+        assert len(frame["3d_coords"]) == len(frame["pixel_coords"]) == len(scene["objects"])
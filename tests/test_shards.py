@@ -0,0 +1,30 @@
+import os
+
+import shards
+
+
+def test_shard_writer_resumes_after_its_own_shards(tmp_path):
+    with shards.ShardWriter(tmp_path, max_shard_bytes=1 << 20, prefix="shard-w0") as writer:
+        writer.write_sample(0, {"json": b"{}"})
+    (tmp_path / "shard-w1-00007.tar").write_bytes(b"")
+    # a restarted writer never overwrites a shard, and ignores other prefixes
+    with shards.ShardWriter(tmp_path, max_shard_bytes=1 << 20, prefix="shard-w0") as writer:
+        writer.write_sample(0, {"json": b'{"again": 1}'})
+        writer.write_sample(1, {"json": b"{}"})
+    assert sorted(fn for fn in os.listdir(str(tmp_path)) if fn.startswith("shard-w0")) == \
+        ["shard-w0-00000.tar", "shard-w0-00001.tar"]
+    with shards.ShardReader(tmp_path) as reader:
+        # the later index entry of a sample takes precedence
+        assert reader.read_scene(0) == {"again": 1}
+        assert reader.indices() == [0, 1]
+
+
+def test_shards_stay_below_the_size_limit(tmp_path):
+    limit = 40 * 1024
+    with shards.ShardWriter(tmp_path, max_shard_bytes=limit) as writer:
+        for index in range(20):
+            writer.write_sample(index, {"png": os.urandom(5000 + 300 * index), "json": b"{}"})
+    sizes = [os.path.getsize(str(tmp_path / fn)) for fn in os.listdir(str(tmp_path)) if fn.endswith(".tar")]
+    assert len(sizes) > 1 and max(sizes) <= limit
+    with shards.ShardReader(tmp_path) as reader:
+        assert reader.indices() == list(range(20))
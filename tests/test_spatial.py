@@ -0,0 +1,28 @@
+import numpy as np
+
+import spatial
+
+
+def brute_force_distances(xy):
+    return np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=2)
+
+
+def test_pairs_within_matches_brute_force():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(-4, 4, size=(150, 2))
+    dist = brute_force_distances(xy)
+    for cell_size, radius in [(0.5, 0.5), (0.5, 1.3), (2.0, 0.4)]:
+        first, second = spatial.GridIndex(xy, cell_size).pairs_within(radius)
+        expected = {(i, j) for i, j in zip(*np.nonzero(dist < radius)) if i < j}
+        assert sorted(zip(first.tolist(), second.tolist())) == sorted(expected)
+
+
+def test_knn_matches_brute_force():
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(-4, 4, size=(80, 2))
+    dist = brute_force_distances(xy)
+    np.fill_diagonal(dist, np.inf)
+    nearest = spatial.GridIndex(xy, 0.3).knn(5)
+    assert nearest == np.argsort(dist, axis=1, kind="stable")[:, :5].tolist()
+    # k is capped at the number of other points
+    assert spatial.GridIndex(xy[:3], 0.3).knn(5) == np.argsort(dist[:3, :3], axis=1)[:, :2].tolist()
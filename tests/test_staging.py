@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import shards
+import staging
+
+
+def render(stager, index):
+    """ Outputs of a rendered image in the scratch directory """
+    key = shards.member_key(index)
+    (stager.scratch_dir / (key + ".render.png")).write_bytes(b"png %d" % index)
+    (stager.scratch_dir / (key + ".scene.json")).write_text(json.dumps({"image_index": index}))
+    stager.stage(index)
+
+
+def test_stager_publishes_batches(tmp_path):
+    published = []
+    stager = staging.Stager(tmp_path / "out", tmp_path / "scratch", batch_size=2, pack=True,
+                            on_published=published.extend)
+    for index in range(5):
+        render(stager, index)
+    stager.close()
+    assert sorted(published) == list(range(5))
+    assert not stager.scratch_dir.exists()
+    with shards.ShardReader(tmp_path / "out") as reader:
+        assert reader.indices() == list(range(5))
+        assert reader.read_scene(3) == {"image_index": 3}
+    manifest = (tmp_path / "out" / staging.published_filename(stager.token)).read_text().splitlines()
+    assert [json.loads(line)["indices"] for line in manifest] == [[0, 1], [2, 3], [4]]
+
+
+def test_stager_keeps_scratch_on_failure(tmp_path, monkeypatch):
+    publish_file = staging.publish_file
+    calls = []
+
+    def failing(src, dst):
+        calls.append(src)
+        if len(calls) > 2:
+            raise OSError("output directory is gone")
+        publish_file(src, dst)
+
+    monkeypatch.setattr(staging, "publish_file", failing)
+    published = []
+    stager = staging.Stager(tmp_path / "out", tmp_path / "scratch", batch_size=10, retries=0,
+                            on_published=published.extend)
+    render(stager, 0)
+    stager.flush()
+    render(stager, 1)
+    render(stager, 2)
+    with pytest.raises(OSError):
+        stager.close()
+    # only the first image was published and reported; the others stay on scratch
+    assert published == [0]
+    assert sorted(p.name for p in stager.scratch_dir.iterdir()) == \
+        ["00001.render.png", "00001.scene.json", "00002.render.png", "00002.scene.json"]
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import catalog
+import stats
+
+PROPERTIES = Path(catalog.__file__).parent / "properties.json"
+
+
+def scene(shapes, occlusion=None):
+    objects = [{"shape": shape, "color": "red", "material": "metal", "size": "small",
+                "3d_coords": (0.5 * k, -1.0, 0.35), "pixel_coords": (10 * k, 20, 5.0),
+                "occlusion_ratio": occlusion} for k, shape in enumerate(shapes)]
+    return {"objects": objects, "relationships": {"left": [[1] if k == 0 else [] for k in range(len(shapes))]}}
+
+
+def test_partials_merge_like_one_aggregate(tmp_path):
+    props = catalog.load_catalog(PROPERTIES)
+    scenes = [scene(["cube", "sphere"], 0.5), scene(["cube"]), scene(["cylinder", "cube", "cube"], 0.95)]
+    whole = stats.DatasetStats(props)
+    for s in scenes:
+        whole.update(s)
+    first, second = stats.DatasetStats(props), stats.DatasetStats(props)
+    first.update(scenes[0])
+    for s in scenes[1:]:
+        second.update(s)
+    # partials go through their files, like the partials of the workers
+    first.save(tmp_path / "a.npz")
+    second.save(tmp_path / "b.npz")
+    merged = stats.DatasetStats.load(tmp_path / "a.npz").merge(stats.DatasetStats.load(tmp_path / "b.npz"))
+    assert merged.summary() == whole.summary()
+    summary = merged.summary()
+    assert summary["num_scenes"] == 3 and summary["num_objects"] == 6
+    assert summary["shape"] == {"cube": 4, "sphere": 1, "cylinder": 1}
+    assert summary["relationships"] == {"left": 3}
+    assert summary["occlusion_histogram"][5] == 2 and summary["occlusion_histogram"][9] == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.npz", "b.npz"]
@@ -0,0 +1,91 @@
+import json
+import os
+import sys
+from argparse import Namespace
+
+import supervisor
+
+FAKE_BLENDER = """#!%s
+import json, os, sys, time
+argv = sys.argv[1:]
+with open(argv[argv.index("--python") + 1]) as f:
+    plan = json.load(f)
+with open(argv[argv.index("--indices_file") + 1]) as f:
+    indices = json.load(f)
+progress = argv[argv.index("--progress_file") + 1]
+
+def write(line):
+    with open(progress, "a") as f:
+        f.write(line + "\\n")
+
+unreported = []
+for k, i in enumerate(indices):
+    if i in plan.get("crash", []):
+        sys.exit(1)
+    hang = os.path.join(plan["state_dir"], "hung_%%d" %% i)
+    if i in plan.get("hang", []) and not os.path.exists(hang):
+        open(hang, "w").close()
+        time.sleep(60)
+    time.sleep(plan.get("seconds", 0.0))
+    # like a staging worker: a heartbeat per image, finished in groups
+    unreported.append(i)
+    write("%%s %%d" %% (supervisor_heartbeat, i))
+    if len(unreported) == plan.get("report_every", 1):
+        write("\\n".join(str(j) for j in unreported))
+        unreported = []
+    if plan.get("recycle_every") and (k + 1) %% plan["recycle_every"] == 0 and k + 1 < len(indices):
+        if unreported:
+            write("\\n".join(str(j) for j in unreported))
+        sys.exit(%d)
+if unreported:
+    write("\\n".join(str(j) for j in unreported))
+""".replace("supervisor_heartbeat", repr(supervisor.HEARTBEAT))
+
+
+def run(tmp_path, num_images, image_timeout=5.0, max_retries=3, **plan):
+    blender = tmp_path / "blender"
+    blender.write_text(FAKE_BLENDER % (sys.executable, supervisor.RECYCLE_EXIT_CODE))
+    blender.chmod(0o755)
+    plan["state_dir"] = str(tmp_path)
+    script = tmp_path / "plan.json"
+    script.write_text(json.dumps(plan))
+    args = Namespace(blender=str(blender), script=str(script), script_args=[], shard_prefix=None,
+                     image_timeout=image_timeout, startup_timeout=0.0, max_retries=max_retries,
+                     backoff=0.01, poll_interval=0.05, num_workers=1, work_dir=str(tmp_path / "work"),
+                     log=tmp_path / "work" / "failures.jsonl")
+    summary = supervisor.supervise(list(range(num_images)), args)
+    events = []
+    if os.path.isfile(str(args.log)):
+        with open(str(args.log), "r") as f:
+            events = [json.loads(line) for line in f]
+    return summary, events
+
+
+def test_recycled_workers_restart_without_failures(tmp_path):
+    summary, events = run(tmp_path, 5, recycle_every=2)
+    assert summary["failed"] == []
+    assert [e["event"] for e in events] == ["start", "recycle", "start", "recycle", "start"]
+    assert [e["next_index"] for e in events if e["event"] == "start"] == [0, 2, 4]
+
+
+def test_hung_worker_is_killed_and_restarted(tmp_path):
+    summary, events = run(tmp_path, 4, image_timeout=0.5, hang=[2])
+    assert summary["failed"] == []
+    failures = [e for e in events if e["event"] == "failure"]
+    assert [(e["index"], e["attempt"], e["reason"]) for e in failures] == [(2, 1, "timeout")]
+    assert [e["next_index"] for e in events if e["event"] == "start"] == [0, 2]
+
+
+def test_crashing_index_is_skipped_after_max_retries(tmp_path):
+    summary, events = run(tmp_path, 4, max_retries=1, crash=[1])
+    assert summary["failed"] == [1]
+    failures = [e for e in events if e["event"] == "failure"]
+    assert [(e["index"], e["attempt"], e["reason"]) for e in failures] == [(1, 1, "exit"), (1, 2, "exit")]
+    assert [e["index"] for e in events if e["event"] == "skip"] == [1]
+
+
+def test_heartbeats_keep_a_slow_reporting_worker_alive(tmp_path):
+    # four images are reported together, which takes longer than the timeout
+    summary, events = run(tmp_path, 4, image_timeout=0.6, seconds=0.3, report_every=4)
+    assert summary["failed"] == []
+    assert [e["event"] for e in events] == ["start"]
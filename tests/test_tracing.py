@@ -0,0 +1,35 @@
+import json
+
+import tracing
+
+
+def write_trace(path, pid, ts):
+    events = [{"ph": "M", "name": "process_name", "pid": pid, "args": {"name": "create_scene (%d)" % pid}},
+              {"ph": "X", "name": "image", "cat": "image", "pid": pid, "tid": 1, "ts": ts, "dur": 5.0,
+               "args": {}}]
+    path.write_text("".join(json.dumps(e) + "\n" for e in events) + '{"ph": "X", "na')
+
+
+def test_merge_gives_every_file_its_own_process(tmp_path):
+    # the same pid on two hosts, the second trace cut off by a kill
+    write_trace(tmp_path / "trace_host-a_42.jsonl", 42, 1000.0)
+    write_trace(tmp_path / "trace_host-b_42.jsonl", 42, 1010.0)
+    paths = sorted(tmp_path.glob("trace_*.jsonl"))
+    tracing.merge(paths, tmp_path / "trace.json")
+    with open(str(tmp_path / "trace.json"), "r") as f:
+        events = json.load(f)["traceEvents"]
+    names = {e["pid"]: e["args"]["name"] for e in events if e["name"] == "process_name"}
+    assert names == {1: "create_scene (42) host-a", 2: "create_scene (42) host-b"}
+    spans = [e for e in events if e["ph"] == "X"]
+    assert [(e["pid"], e["ts"]) for e in spans] == [(1, 0.0), (2, 10.0)]
+
+
+def test_spans_are_written_per_process(tmp_path):
+    tracer = tracing.start(tmp_path, "test")
+    with tracing.span("outer", index=3) as args:
+        args["extra"] = 1
+    tracing.stop()
+    events = tracing.load_events([tracer.path])
+    span = [e for e in events if e["ph"] == "X"][0]
+    assert span["name"] == "outer" and span["args"] == {"index": 3, "extra": 1}
+    assert tracing.span_totals(events)["outer"][0] == 1
@@ -0,0 +1,33 @@
+import json
+
+import columnar
+import validate
+from conftest import IMAGE_GENERATION
+
+
+def test_report_groups_broken_indices(generate):
+    output = generate(5, "--seed", 1)
+    vocabularies = columnar.load_vocabularies(IMAGE_GENERATION / "properties.json")
+    assert validate.validate(output, list(range(5)), decode=True, vocabularies=vocabularies,
+                             num_workers=2, chunk_size=2)["repair_indices"] == []
+
+    (output / validate.image_filename(1)).unlink()
+    # a truncated image keeps a valid header, only decoding finds it
+    image = output / validate.image_filename(2)
+    image.write_bytes(image.read_bytes()[:100])
+    (output / validate.scene_filename(3)).write_text('{"objects": [')
+    with open(str(output / validate.scene_filename(4)), "r") as f:
+        scene = json.load(f)
+    scene["objects"][0]["color"] = "pink"
+    with open(str(output / validate.scene_filename(4)), "w") as f:
+        json.dump(scene, f)
+
+    header_only = validate.validate(output, list(range(5)), vocabularies=vocabularies,
+                                    num_workers=2, chunk_size=2)
+    assert header_only["repair_indices"] == [1, 3, 4]
+    report = validate.validate(output, list(range(5)), decode=True, vocabularies=vocabularies,
+                               num_workers=2, chunk_size=2)
+    assert [e["index"] for e in report["missing"]] == [1]
+    assert [e["index"] for e in report["corrupt"]] == [2, 3]
+    assert report["inconsistent"] == [{"index": 4, "reason": "object 0 has unknown color pink"}]
+    assert report["repair_indices"] == [1, 2, 3, 4]
@@ -0,0 +1,25 @@
+import json
+
+import numpy as np
+from PIL import Image
+
+
+def load(path):
+    return np.asarray(Image.open(str(path)))
+
+
+def test_every_object_gets_a_hidden_variant(generate):
+    # the fake backend only draws objects with the Workbench engine
+    output = generate(1, "--num_objects", 3, "--variants", "hide_each", "--engine", "BLENDER_WORKBENCH",
+                      "--seed", 1)
+    with open(str(output / "00000.scene.json"), "r") as f:
+        scene = json.load(f)
+    variants = scene["variants"]
+    assert [v["hidden_objects"] for v in variants] == [[0], [1], [2]]
+    assert [v["image_filename"] for v in variants] == ["00000.v%d.render.png" % k for k in range(3)]
+    full = load(output / "00000.render.png")
+    for v in variants:
+        assert v["parent_image_index"] == 0
+        # the hidden object changes the image, the scene is rendered from the same state
+        image = load(output / v["image_filename"])
+        assert image.shape == full.shape and (image != full).any()
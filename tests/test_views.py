@@ -0,0 +1,18 @@
+import json
+
+
+def test_every_layout_is_rendered_from_all_cameras(generate):
+    output = generate(1, "--num_objects", 4, "--num_views", 3)
+    with open(str(output / "00000.scene.json"), "r") as f:
+        scene = json.load(f)
+    views = scene["views"]
+    assert [v["image_filename"] for v in views] == ["00000.c1.render.png", "00000.c2.render.png"]
+    assert len({v["camera"] for v in views}) == 2
+    for v in views:
+        assert (output / v["image_filename"]).is_file()
+        assert len(v["pixel_coords"]) == len(scene["objects"])
+        # relations are annotated in the frame of every camera
+        assert v["directions"]["left"] != scene["directions"]["left"]
+        left, right = v["relationships"]["left"], v["relationships"]["right"]
+        assert {(i, j) for i, js in enumerate(left) for j in js} == \
+            {(j, i) for i, js in enumerate(right) for j in js}